@@ -1,10 +1,18 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from fastapi.responses import ORJSONResponse, Response
+from datetime import datetime, timezone
 import uvicorn
+import anyio.to_thread
+import asyncio
+import fcntl
+import hashlib
 import os
+import sys
+
+from cors import PrecomputedCORSMiddleware
+from settings import env_int
 
 # Import all routers
 from routers import (
@@ -22,9 +30,9 @@ from routers import (
     workers,
 )
 
-# Import services and models for startup
-from services.service_manager import service_manager
-from models import SessionLocal, PersistentService
+# Models for startup. Docker-backed services are imported lazily.
+from models import SessionLocal, AsyncSessionLocal, PersistentService
+from sqlalchemy import text
 
 
 API_DESCRIPTION = """
@@ -138,12 +146,303 @@ TAG_METADATA = [
 ]
 
 
+# Migration mode.
+#
+# `async` (default) runs migrate_database() in a worker thread after the
+# server starts accepting traffic, so /health answers immediately and a
+# slow or failing migration no longer blocks the lifespan. Everything
+# that needs the schema (admin bootstrap, scheduler, service auto-start)
+# runs once the migration succeeds. `sync` keeps the old behaviour of
+# migrating before serving and exiting if it never succeeds. `skip`
+# assumes the schema is managed out of band.
+MIGRATION_MODE = os.environ.get("MIGRATION_MODE", "async").strip().lower()
+MIGRATION_LOCK_PATH = os.environ.get("MIGRATION_LOCK_PATH", "code_executor.db.migrate.lock")
+
+# Sync endpoints and run_in_threadpool share anyio's default limiter
+# (40 threads). Docker and SQLite calls park a thread each, so raise it.
+THREADPOOL_SIZE = env_int("SUPAKILN_THREADPOOL_SIZE", 100)
+
+
+def _migrate_locked():
+    """Run migrate_database() holding an exclusive file lock.
+
+    SQLite has no advisory locks, so a lock file keeps concurrent
+    processes sharing the same database from migrating at once.
+    """
+    from migrate_database import migrate_database
+
+    with open(MIGRATION_LOCK_PATH, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            migrate_database()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+async def _run_migrations(app: FastAPI) -> bool:
+    """Run the schema migration with retry, tracking progress on app.state."""
+    max_retries = 5
+    retry_delay = 2
+
+    app.state.migration_status = "running"
+    for attempt in range(max_retries):
+        try:
+            print(f"Running database migration (attempt {attempt + 1}/{max_retries})...")
+            await asyncio.to_thread(_migrate_locked)
+            print("✅ Database migration completed successfully")
+            app.state.migration_status = "succeeded"
+            return True
+        except Exception as e:
+            print(f"❌ Database migration failed (attempt {attempt + 1}/{max_retries}): {e}")
+            if attempt < max_retries - 1:
+                print(f"⏳ Retrying in {retry_delay} seconds...")
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 1.5  # Exponential backoff
+
+    print("💥 Failed to migrate database after all retries.")
+    app.state.migration_status = "failed"
+    return False
+
+
+def _bootstrap_admin():
+    """Create the admin user from SUPAKILN_BOOTSTRAP_ADMIN_EMAIL / _PASSWORD.
+
+    Only acts if set and no admin exists yet. Runs after migrations so
+    the users table is guaranteed to exist.
+    """
+    try:
+        from auth import bootstrap_admin
+        bootstrap_admin()
+    except Exception as e:
+        print(f"⚠️ Admin bootstrap failed (non-fatal): {e}")
+
+
+def _cleanup_orphans():
+    """Clean up orphaned containers from previous runs/crashes."""
+    try:
+        from cleanup import reconcile_orphaned_containers, prune_dead_containers
+        from services.code_executor_service import get_code_executor
+
+        # First remove any dead/exited containers
+        dead = prune_dead_containers()
+        if dead:
+            print(f"🧹 Removed {dead} dead containers from previous run")
+
+        # Then reconcile orphans against the executor's tracking state
+        orphans = reconcile_orphaned_containers(get_code_executor())
+        if orphans:
+            print(f"🧹 Removed {orphans} orphaned containers from previous run")
+        else:
+            print("✅ No orphaned containers found")
+    except Exception as e:
+        print(f"⚠️ Startup cleanup failed (non-fatal): {e}")
+
+
+async def _init_scheduler():
+    """Initialize the scheduler once the schema is in place.
+
+    With SUPAKILN_RUN_SCHEDULER=0 no scheduler is created; /jobs writes
+    still land in the database and the scheduling replica loads them on
+    its next start.
+    """
+    from scheduler import RUN_SCHEDULER, start_scheduler
+
+    if not RUN_SCHEDULER:
+        print("Scheduler disabled (SUPAKILN_RUN_SCHEDULER=0)")
+        return
+    try:
+        # Bound to the running loop here so schedule changes made from
+        # threadpool handlers never start APScheduler off the loop.
+        # Loading the jobs from the database then happens on a worker
+        # thread (add_job is thread-safe).
+        scheduler = start_scheduler(asyncio.get_running_loop())
+        await asyncio.to_thread(scheduler.initialize)
+        print("✅ Scheduler initialized successfully")
+    except Exception as e:
+        print(f"❌ Failed to initialize scheduler: {e}")
+
+
+async def _autostart_services():
+    """Start every active service marked for auto-start.
+
+    Services are independent, so they are started concurrently (bounded
+    by SUPAKILN_AUTOSTART_CONCURRENCY), each on its own session since
+    sessions must not be shared across threads.
+    """
+    try:
+        from services.service_manager import service_manager
+
+        print("🚀 Starting auto-start services...")
+        with SessionLocal() as db:
+            auto_start_services = [
+                (row.id, row.name)
+                for row in db.query(PersistentService)
+                .with_entities(PersistentService.id, PersistentService.name)
+                .filter(
+                    PersistentService.auto_start == 1,
+                    PersistentService.is_active == 1
+                )
+                .yield_per(50)
+            ]
+
+        if not auto_start_services:
+            print("No services configured for auto-start")
+            return
+
+        print(f"Found {len(auto_start_services)} services to auto-start")
+        concurrency = env_int("SUPAKILN_AUTOSTART_CONCURRENCY", 4)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        def _start(service_id: int) -> bool:
+            with SessionLocal() as service_db:
+                return service_manager.start_service(service_id, service_db)
+
+        async def _start_one(service_id: int, name: str):
+            async with semaphore:
+                try:
+                    print(f"Starting service: {name}")
+                    await asyncio.to_thread(_start, service_id)
+                    print(f"✅ Service {name} started successfully")
+                except Exception as e:
+                    print(f"❌ Failed to start service {name}: {e}")
+
+        await asyncio.gather(*(_start_one(sid, name) for sid, name in auto_start_services))
+    except Exception as e:
+        print(f"❌ Error during service auto-start: {e}")
+
+
+def _shutdown():
+    """Graceful shutdown: clean up all containers and stop scheduler."""
+    print("🛑 Application shutting down...")
+    try:
+        import scheduler
+        from services import code_executor_service, log_writer
+
+        # Write out queued execution logs before the process goes away.
+        log_writer.close()
+
+        if code_executor_service._executor_instance is not None:
+            code_executor_service._executor_instance.shutdown()
+            # Release the shared Docker client's pooled connections.
+            code_executor_service._executor_instance.client.close()
+        if scheduler._scheduler_instance is not None:
+            scheduler._scheduler_instance.scheduler.shutdown(wait=False)
+        print("✅ Cleanup complete")
+    except Exception as e:
+        print(f"⚠️ Error during shutdown cleanup: {e}")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _health_body(app: FastAPI) -> dict:
+    """The /health body, with status read from the migration state now."""
+    migration = getattr(app.state, "migration_status", "pending")
+    return {
+        "status": "healthy" if migration in ("succeeded", "skipped") else "starting",
+        "migration": migration,
+        "timestamp": getattr(app.state, "health_timestamp", None) or _now_iso(),
+    }
+
+
+async def _tick_health(app: FastAPI):
+    """Refresh the cached /health timestamp once a second.
+
+    Probes hit /health constantly; formatting the timestamp once per
+    tick instead of once per request saves the clock read and format.
+    The status is not cached, so it flips the moment migration ends.
+    """
+    while True:
+        app.state.health_timestamp = _now_iso()
+        await asyncio.sleep(1)
+
+
+async def _init_executor(app: FastAPI):
+    """Connect to Docker and build the shared CodeExecutor off the loop.
+
+    A failure here is logged rather than raised so the API still boots
+    and answers /health; executor-backed endpoints retry the connection
+    on their next call.
+    """
+    from services.code_executor_service import get_code_executor
+
+    try:
+        app.state.executor = await asyncio.to_thread(get_code_executor)
+        print("✅ Code executor initialized")
+    except Exception as e:
+        app.state.executor = None
+        print(f"❌ Failed to initialize code executor: {e}")
+
+
+async def _start_services(app: FastAPI):
+    """Everything that needs the schema in place.
+
+    In async migration mode this runs while requests are already being
+    served, so the blocking steps (password hashing, Docker, database
+    loads) go to worker threads.
+    """
+    await asyncio.to_thread(_bootstrap_admin)
+    await _init_executor(app)
+    if app.state.executor is not None:
+        containers.start_event_watcher()
+    await asyncio.to_thread(_cleanup_orphans)
+    await _init_scheduler()
+    await _autostart_services()
+    print("🎉 Application startup completed")
+
+
+async def _migrate_then_start(app: FastAPI):
+    if await _run_migrations(app):
+        await _start_services(app)
+    else:
+        print("This is a critical error - the application requires a proper database schema.")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup runs before the first request is served; shutdown after the last."""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Persistent services run as tasks on this loop.
+    from services.service_manager import service_manager
+    service_manager.attach_loop(asyncio.get_running_loop())
+    # Read (or generate) the env var key now rather than on the first
+    # request that needs a secret; needs no schema, so it runs here.
+    from env_manager import get_env_manager
+    app.state.env_manager = await asyncio.to_thread(get_env_manager)
+    app.state.migration_status = "pending"
+    app.state.startup_task = None
+    app.state.executor = None
+    app.state.health_timestamp = _now_iso()
+    health_ticker = asyncio.create_task(_tick_health(app))
+
+    if MIGRATION_MODE == "skip":
+        app.state.migration_status = "skipped"
+        await _start_services(app)
+    elif MIGRATION_MODE == "sync":
+        if not await _run_migrations(app):
+            print("This is a critical error - the application requires a proper database schema.")
+            sys.exit(1)
+        await _start_services(app)
+    else:
+        app.state.startup_task = asyncio.create_task(_migrate_then_start(app))
+
+    yield
+
+    health_ticker.cancel()
+    if app.state.startup_task is not None and not app.state.startup_task.done():
+        app.state.startup_task.cancel()
+    _shutdown()
+
+
 app = FastAPI(
     title="supakiln",
     version="0.2.0",
     description=API_DESCRIPTION,
     openapi_tags=TAG_METADATA,
     contact={"name": "supakiln", "url": "https://github.com/Frohrer/supakiln"},
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS.
@@ -177,33 +476,74 @@ if os.environ.get("ENVIRONMENT", "").lower() != "production":
     _allow_origin_regex = r"^https?://(localhost|127\.0\.0\.1)(:\d+)?$"
 
 app.add_middleware(
-    CORSMiddleware,
+    PrecomputedCORSMiddleware,
     allow_origins=_allowed_origins,
     allow_origin_regex=_allow_origin_regex,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
     max_age=86400,  # Cache preflight requests for 24 hours
 )
 
 # Add a health check endpoint that bypasses Cloudflare Access
 @app.get("/health", tags=["system"], summary="Health check")
 async def health_check():
-    """Liveness probe. Returns 200 once the app has started.
+    """Liveness probe. Returns 200 as soon as the server is accepting requests.
+
+    `status` is `healthy` once the schema is migrated (or migrations are
+    skipped) and `starting` until then; `migration` carries the raw state
+    (pending/running/succeeded/failed/skipped).
 
     Designed to bypass Cloudflare Access — configure this path as public
     in your Access rules so uptime checks don't need auth.
     """
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return ORJSONResponse(_health_body(app))
+
+@app.get("/healthz", tags=["system"], summary="Readiness check")
+async def readiness_check():
+    """Readiness probe: 200 once migrated and the database answers `SELECT 1`.
+
+    Unlike /health this checks out a pooled connection, so a probe
+    keeps one warm (pre-pinged) and a broken database shows up as 503
+    here before requests start failing on it.
+    """
+    body = _health_body(app)
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+        body["database"] = "ok"
+    except Exception as e:
+        body["database"] = f"error: {e}"
+        body["status"] = "unavailable"
+    ready = body["status"] == "healthy"
+    return ORJSONResponse(body, status_code=200 if ready else 503)
 
 # Mount static files - update the path to be relative to the current file
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+INDEX_PATH = os.path.join(static_dir, "index.html")
+# (mtime, body, etag) of the last index.html read; refreshed when the
+# file changes on disk (e.g. a frontend rebuild into a mounted volume).
+_index_cache = None
+
+
+def _load_index():
+    global _index_cache
+    mtime = os.stat(INDEX_PATH).st_mtime
+    if _index_cache is None or _index_cache[0] != mtime:
+        with open(INDEX_PATH, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        _index_cache = (mtime, body, etag)
+    return _index_cache
+
+
 @app.get("/", tags=["system"], summary="Serve the frontend shell", include_in_schema=False)
-async def read_root():
+async def read_root(request: Request):
     """Serves the frontend's index.html. Excluded from the OpenAPI schema."""
-    return FileResponse("static/index.html")
+    _, body, etag = _load_index()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="text/html", headers=headers)
 
 # Include all routers
 app.include_router(auth_router.router)
@@ -219,125 +559,9 @@ app.include_router(webhook_execution.router)
 app.include_router(proxy.router)
 app.include_router(workers.router)
 
-async def startup_event():
-    """Initialize services on startup."""
-    import time
-    import sys
-
-    # Run database migration with retry logic
-    max_retries = 5
-    retry_delay = 2
-
-    migration_success = False
-    for attempt in range(max_retries):
-        try:
-            print(f"Running database migration (attempt {attempt + 1}/{max_retries})...")
-            from migrate_database import migrate_database
-            migrate_database()
-            print("✅ Database migration completed successfully")
-            migration_success = True
-            break
-        except Exception as e:
-            print(f"❌ Database migration failed (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                print(f"⏳ Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 1.5  # Exponential backoff
-            else:
-                print("💥 Failed to migrate database after all retries. Application cannot start.")
-                print("This is a critical error - the application requires a proper database schema.")
-                # Exit the application if migration fails
-                sys.exit(1)
-
-    if not migration_success:
-        print("💥 Database migration failed. Application cannot start safely.")
-        sys.exit(1)
-
-    # Create the admin user from SUPAKILN_BOOTSTRAP_ADMIN_EMAIL /
-    # _PASSWORD if set and no admin exists yet. Runs after migrations
-    # so the users table is guaranteed to exist.
-    try:
-        from auth import bootstrap_admin
-        bootstrap_admin()
-    except Exception as e:
-        print(f"⚠️ Admin bootstrap failed (non-fatal): {e}")
-
-    # Clean up orphaned containers from previous runs/crashes
-    try:
-        from cleanup import reconcile_orphaned_containers, prune_dead_containers
-        from scheduler import scheduler
-
-        # First remove any dead/exited containers
-        dead = prune_dead_containers()
-        if dead:
-            print(f"🧹 Removed {dead} dead containers from previous run")
-
-        # Then reconcile orphans against the executor's tracking state
-        orphans = reconcile_orphaned_containers(scheduler.executor)
-        if orphans:
-            print(f"🧹 Removed {orphans} orphaned containers from previous run")
-        else:
-            print("✅ No orphaned containers found")
-    except Exception as e:
-        print(f"⚠️ Startup cleanup failed (non-fatal): {e}")
-
-    # Initialize scheduler after migration is complete
-    try:
-        from scheduler import scheduler
-        scheduler.initialize()
-        print("✅ Scheduler initialized successfully")
-    except Exception as e:
-        print(f"❌ Failed to initialize scheduler: {e}")
-
-    # Auto-start services marked for auto-start
-    try:
-        print("🚀 Starting auto-start services...")
-        db = SessionLocal()
-        try:
-            auto_start_services = db.query(PersistentService).filter(
-                PersistentService.auto_start == 1,
-                PersistentService.is_active == 1
-            ).all()
-
-            if auto_start_services:
-                print(f"Found {len(auto_start_services)} services to auto-start")
-                for service in auto_start_services:
-                    try:
-                        print(f"Starting service: {service.name}")
-                        service_manager.start_service(service.id, db)
-                        print(f"✅ Service {service.name} started successfully")
-                    except Exception as e:
-                        print(f"❌ Failed to start service {service.name}: {e}")
-            else:
-                print("No services configured for auto-start")
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"❌ Error during service auto-start: {e}")
-
-    print("🎉 Application startup completed")
-
-async def shutdown_event():
-    """Graceful shutdown: clean up all containers and stop scheduler."""
-    print("🛑 Application shutting down...")
-    try:
-        from scheduler import scheduler
-        scheduler.executor.shutdown()
-        scheduler.scheduler.shutdown(wait=False)
-        print("✅ Cleanup complete")
-    except Exception as e:
-        print(f"⚠️ Error during shutdown cleanup: {e}")
-
-# Add startup event
-@app.on_event("startup")
-async def on_startup():
-    await startup_event()
-
-@app.on_event("shutdown")
-async def on_shutdown():
-    await shutdown_event()
-
 if __name__ == "__main__":
     # Create static directory if it doesn't exist
     os.makedirs("static", exist_ok=True)
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # uvloop + httptools are pinned in requirements.txt. Stay on one worker:
+    # the executor's container caches and the scheduler live in-process.
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools") 
\ No newline at end of file
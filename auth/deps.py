@@ -111,7 +111,7 @@ def current_user(
             detail="token expired",
         )
 
-    user = db.query(User).filter(User.id == key.user_id).first()
+    user = db.get(User, key.user_id)
     if user is None or user.disabled:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
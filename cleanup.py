@@ -102,7 +102,7 @@ def reconcile_orphaned_containers(executor) -> int:
     labeled_container_ids = set(stdout.splitlines())
 
     # Containers the executor knows about
-    tracked_ids = set(executor.containers.values())
+    tracked_ids = set(executor.containers_by_id)
     tracked_ids.update(executor.web_service_containers.keys())
 
     # Orphans = labeled containers that aren't tracked
@@ -150,5 +150,8 @@ def run_periodic_cleanup() -> dict:
     }
     prune_old_images()
     prune_build_cache()
+    # Pruned images may include ones the executor memoized as built.
+    from services.code_executor_service import get_code_executor
+    get_code_executor().forget_images()
     logger.info("Periodic cleanup complete: %s", results)
     return results
@@ -3,9 +3,9 @@ import os
 import json
 import time
 import hashlib
+import functools
 import secrets
 import threading
-import base64
 import docker
 import random
 import logging
@@ -14,7 +14,7 @@ from time import perf_counter
 from typing import Dict, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from urllib.parse import urlparse
-from services.docker_client import docker_client
+from services.docker_client import docker_client, exec_output
 from languages import get as get_runtime
 from languages.base import Runtime, build_package_install_snippet
 
@@ -119,14 +119,37 @@ def _worker_host_from_env() -> str:
     return "localhost"
 
 
+def _is_missing_image_error(stderr: Optional[str]) -> bool:
+    """True if a failed `docker run` says its image doesn't exist locally."""
+    text = (stderr or "").lower()
+    return ("unable to find image" in text
+            or "no such image" in text
+            or "pull access denied" in text)
+
+
+@functools.lru_cache(maxsize=512)
+def _package_hash(sorted_packages: Tuple[str, ...]) -> str:
+    package_str = "-".join(sorted_packages)
+    return hashlib.md5(package_str.encode()).hexdigest()[:12]
+
+
 class CodeExecutor:
-    def __init__(self, image_name: str = "python-executor"):
+    def __init__(self, image_name: str = "python-executor", client=None):
+        # Docker SDK client. Defaults to the process-wide client so every
+        # executor shares one connection pool instead of opening its own.
+        self.client = client if client is not None else docker_client.connect()
         # Legacy image name retained for the web-service execution path,
         # which still uses the pre-existing `python-executor:*` images.
         self.image_name = image_name
         # Legacy cache: package_hash -> container_id (used by web services
         # and debug endpoints). Kept for backwards compatibility.
         self.containers: Dict[str, str] = {}
+        # Reverse index of `containers`: container_id -> key. Maintained by
+        # track_container/untrack_container so id lookups are O(1).
+        self.containers_by_id: Dict[str, str] = {}
+        # Guards containers/containers_by_id so the two never disagree when
+        # handlers on different threadpool threads track and untrack.
+        self._tracking_lock = threading.Lock()
         self.web_service_containers: Dict[str, Dict] = {}  # container_id -> service_info
 
         # Worker-path cache: "lang:package_hash" -> container_id
@@ -161,7 +184,61 @@ class CodeExecutor:
         self.container_network_mode = os.environ.get('CONTAINER_NETWORK_MODE', 'none')
         print(f"🔒 Container network mode: {self.container_network_mode}")
         self._base_image_ready = False
+        # package_hash (legacy) or "<runtime>:<package_hash>" (workers) ->
+        # image tag known to exist, so repeat builds for the same package
+        # set skip the `docker image inspect` round trip. Cleared by
+        # forget_images() when images may have been pruned.
+        self._built_images: Dict[str, str] = {}
         
+    def track_container(self, key: str, container_id: str) -> None:
+        """Record `container_id` under `key` in the legacy container cache."""
+        with self._tracking_lock:
+            previous = self.containers.get(key)
+            if previous is not None and previous != container_id:
+                self.containers_by_id.pop(previous, None)
+            self.containers[key] = container_id
+            self.containers_by_id[container_id] = key
+
+    def untrack_container(self, container_id: str) -> Optional[str]:
+        """Forget `container_id`; returns the key it was cached under, if any."""
+        with self._tracking_lock:
+            key = self.containers_by_id.pop(container_id, None)
+            if key is not None and self.containers.get(key) == container_id:
+                del self.containers[key]
+        return key
+
+    def package_container(self, packages: List[str]) -> Tuple[str, Optional[dict]]:
+        """Return the shared container for `packages`, starting it if needed.
+
+        Used by POST /containers and persistent services. The check and
+        the `docker run` happen under the package set's lock, so two
+        callers racing on a new package set start one container, not
+        two. Returns (container_id, attrs); attrs is the new container's
+        inspect data, or None when an existing container was reused.
+        """
+        package_hash = self._get_package_hash(packages)
+        with self._get_cache_lock(f"container:{package_hash}"):
+            container_id = self.containers.get(package_hash)
+            if container_id is not None:
+                return container_id, None
+
+            image_tag = self._build_image(packages)
+            container = docker_client.containers.run(
+                image_tag,
+                detach=True,
+                tty=True,
+                labels={"managed-by": "supakiln"},
+                mem_limit="512m",
+                cpu_period=100000,
+                cpu_quota=50000,
+                user="1000:1000",
+                network_mode=self.container_network_mode,  # Configurable network mode
+                cap_drop=["ALL"],  # Remove all capabilities
+                pids_limit=100  # Limit number of processes (keep reasonable limit)
+            )
+            self.track_container(package_hash, container.id)
+            return container.id, container.attrs
+
     @staticmethod
     def _hardening_run_flags() -> List[str]:
         """Return the `docker run` flags that harden a user-code container.
@@ -238,7 +315,13 @@ class CodeExecutor:
         """Ensure the base image exists, build it if it doesn't."""
         if self._base_image_ready:
             return
-            
+
+        with self._get_cache_lock("image:base"):
+            if not self._base_image_ready:
+                self._build_base_image()
+
+    def _build_base_image(self):
+        """Inspect the base image and build it if missing (lock held by caller)."""
         try:
             docker_host = os.environ.get('DOCKER_HOST', 'default')
             print(f"Using Docker daemon at: {docker_host}")
@@ -264,10 +347,23 @@ class CodeExecutor:
         
     def _get_package_hash(self, packages: List[str]) -> str:
         """Generate a valid Docker tag for a list of packages."""
-        sorted_packages = sorted(packages)
-        package_str = "-".join(sorted_packages)
-        hash_obj = hashlib.md5(package_str.encode())
-        return hash_obj.hexdigest()[:12]
+        return _package_hash(tuple(sorted(packages)))
+
+    def forget_images(self, package_hash: Optional[str] = None) -> None:
+        """Drop memoized image tags (all of them, or one package hash).
+
+        Call whenever images may have been removed behind our back —
+        e.g. after an image prune — so the next build re-checks Docker.
+        """
+        if package_hash is None:
+            self._built_images.clear()
+            self._base_image_ready = False
+        else:
+            # Legacy images are keyed by the bare hash, runtime images by
+            # "<runtime>:<hash>".
+            for key in [k for k in self._built_images
+                        if k == package_hash or k.endswith(f":{package_hash}")]:
+                self._built_images.pop(key, None)
     
 
     def _allocate_port(self) -> int:
@@ -330,21 +426,33 @@ class CodeExecutor:
         self._ensure_base_image()
         
         package_hash = self._get_package_hash(packages)
-        image_tag = f"{self.image_name}:{package_hash}"
+        cached = self._built_images.get(package_hash)
+        if cached is not None:
+            return cached
+
+        # Single-flight per package set: concurrent callers for the same
+        # packages wait for the first build instead of starting their own.
+        with self._get_cache_lock(f"image:{package_hash}"):
+            cached = self._built_images.get(package_hash)
+            if cached is not None:
+                return cached
+            image_tag = f"{self.image_name}:{package_hash}"
         
-        # Check if image already exists
-        success, _, _ = self._run_docker_command(["docker", "image", "inspect", image_tag])
-        if success:
-            return image_tag
+            # Check if image already exists
+            success, _, _ = self._run_docker_command(["docker", "image", "inspect", image_tag])
+            if success:
+                self._built_images[package_hash] = image_tag
+                return image_tag
         
-        print(f"Building image {image_tag} with packages {packages}")
+            print(f"Building image {image_tag} with packages {packages}")
         
-        # If no packages to install, just use the base image
-        if not packages:
-            return f"{self.image_name}:base"
+            # If no packages to install, just use the base image
+            if not packages:
+                self._built_images[package_hash] = f"{self.image_name}:base"
+                return f"{self.image_name}:base"
             
-        # Create temporary Dockerfile with better error handling
-        dockerfile_content = f"""
+            # Create temporary Dockerfile with better error handling
+            dockerfile_content = f"""
 FROM {self.image_name}:base
 
 # Switch to root for package installation
@@ -358,29 +466,33 @@ RUN pip install --upgrade pip && \\
 USER codeuser
 """
         
-        with open("Dockerfile.temp", "w") as f:
-            f.write(dockerfile_content)
+            # Per-hash file so builds for different package sets can run
+            # side by side.
+            dockerfile_path = f"Dockerfile.{package_hash}.temp"
+            with open(dockerfile_path, "w") as f:
+                f.write(dockerfile_content)
         
-        try:
-            # Build the image with more detailed output
-            success, output, error = self._run_docker_command([
-                "docker", "build",
-                "--no-cache",  # Don't use cache to get fresh error messages
-                "-t", image_tag,
-                "-f", "Dockerfile.temp",
-                "."
-            ], timeout=300)  # Increase timeout for package installation
+            try:
+                # Build the image with more detailed output
+                success, output, error = self._run_docker_command([
+                    "docker", "build",
+                    "--no-cache",  # Don't use cache to get fresh error messages
+                    "-t", image_tag,
+                    "-f", dockerfile_path,
+                    "."
+                ], timeout=300)  # Increase timeout for package installation
             
-            if not success:
-                # Parse the Docker build error to extract pip installation failures
-                detailed_error = self._parse_docker_build_error(error, packages)
-                raise Exception(detailed_error)
-        finally:
-            # Clean up
-            if os.path.exists("Dockerfile.temp"):
-                os.remove("Dockerfile.temp")
+                if not success:
+                    # Parse the Docker build error to extract pip installation failures
+                    detailed_error = self._parse_docker_build_error(error, packages)
+                    raise Exception(detailed_error)
+            finally:
+                # Clean up
+                if os.path.exists(dockerfile_path):
+                    os.remove(dockerfile_path)
                 
-        return image_tag
+            self._built_images[package_hash] = image_tag
+            return image_tag
     
     def _parse_docker_build_error(self, docker_error: str, packages: List[str]) -> str:
         """Parse Docker build error to extract meaningful package installation errors."""
@@ -506,11 +618,9 @@ USER codeuser
     def _ensure_runtime_base_image(self, runtime: Runtime) -> None:
         """Build the runtime's base image if missing or stale.
 
-        We always hit `docker image inspect` here — caching "ready=True"
-        in-process lets an image get deleted externally (by `docker rmi`,
-        GC, or a cleanup sweep) and leaves us with a stale Yes that
-        fails on the next `docker run`. The inspect is ~5ms, cheap
-        enough to do on the cold-start path.
+        This always hits `docker image inspect`; the per-package memo in
+        `_build_runtime_image` is what skips it, and that memo is dropped
+        when a `docker run` reports the image gone.
 
         Staleness detection: we hash worker.py + the Dockerfile, stamp
         the result as a label at build time, and compare on every
@@ -537,7 +647,40 @@ USER codeuser
         self._remove_derived_images(tag)
 
     def _build_runtime_image(self, runtime: Runtime, packages: List[str]) -> str:
-        """Return an image tag for `runtime + packages`, building if needed."""
+        """Return an image tag for `runtime + packages`, building if needed.
+
+        The tag is memoized per (runtime, package set) in `_built_images`,
+        so repeat cold starts skip the `docker image inspect` calls. A
+        memoized image deleted behind our back is caught by the caller's
+        failed `docker run`, which drops the entry and builds again.
+        """
+        memo_key = self._runtime_image_key(runtime, packages)
+        cached = self._built_images.get(memo_key)
+        if cached is not None:
+            return cached
+        with self._get_cache_lock(f"image:{memo_key}"):
+            cached = self._built_images.get(memo_key)
+            if cached is None:
+                cached = self._build_runtime_image_uncached(runtime, packages)
+                self._built_images[memo_key] = cached
+            return cached
+
+    def prebuild_image(self, packages: List[str], language: str = "python") -> None:
+        """Build the worker image for `language + packages` ahead of its first run.
+
+        Same memo and single-flight lock as the run path, so a run that
+        arrives mid-build waits for this build instead of starting another.
+        """
+        try:
+            self._build_runtime_image(get_runtime(language), packages)
+        except Exception as e:
+            # The first run rebuilds and reports the error to its caller.
+            print(f"Prebuild for {language} {packages} failed: {e}")
+
+    def _runtime_image_key(self, runtime: Runtime, packages: List[str]) -> str:
+        return f"{runtime.name}:{self._get_package_hash(packages)}"
+
+    def _build_runtime_image_uncached(self, runtime: Runtime, packages: List[str]) -> str:
         self._ensure_runtime_base_image(runtime)
         if not packages:
             return runtime.base_image_tag
@@ -578,9 +721,8 @@ USER codeuser
 
     def _read_worker_port(self, container_id: str, worker_port: int) -> int:
         """Read the published host-port for the worker container."""
-        container = docker_client.containers.get(container_id)
-        container.reload()
-        port_info = (container.attrs.get("NetworkSettings", {})
+        attrs = self.client.api.inspect_container(container_id)
+        port_info = (attrs.get("NetworkSettings", {})
                      .get("Ports", {})
                      .get(f"{worker_port}/tcp"))
         if not port_info:
@@ -627,8 +769,7 @@ USER codeuser
             if cur is not None:
                 self.worker_endpoints.pop(container_id, None)
             self.worker_meta.pop(container_id, None)
-            if self.containers.get(cache_key) == container_id:
-                self.containers.pop(cache_key, None)
+            self.untrack_container(container_id)
             try:
                 subprocess.run(
                     ["docker", "rm", "-f", container_id],
@@ -1035,6 +1176,14 @@ USER codeuser
                 image_tag,
             ]
             success, output, error = self._run_docker_command(run_cmd)
+            if not success and _is_missing_image_error(error):
+                # The memoized image was removed (prune, rmi). Forget it,
+                # re-check/rebuild, and try the run once more.
+                memo_key = self._runtime_image_key(runtime, packages)
+                self._built_images.pop(memo_key, None)
+                rebuilt_tag = self._build_runtime_image(runtime, packages)
+                run_cmd[-1] = rebuilt_tag
+                success, output, error = self._run_docker_command(run_cmd)
             timings['docker_run_ms'] = (perf_counter() - t_run) * 1000
             if not success:
                 raise Exception(f"Failed to create worker container: {error}")
@@ -1075,7 +1224,7 @@ USER codeuser
             }
             # Also register in the legacy `containers` dict so existing code
             # (debug endpoints, container_id lookups) still works.
-            self.containers[cache_key] = container_id
+            self.track_container(cache_key, container_id)
             # Mark busy before returning — same rationale as the cache-
             # hit path. The caller's `finally` pairs it with _mark_idle.
             self._mark_busy(container_id)
@@ -1089,9 +1238,12 @@ USER codeuser
         env_vars: Dict[str, str],
         timeout_ms: int,
         token: Optional[str] = None,
+        stdin: Optional[str] = None,
     ) -> Tuple[bool, Optional[str], Optional[str], bool, bool]:
         """POST code to the worker; return (success, stdout, stderr, timed_out, cooked).
 
+        `stdin`, if given, is fed to the program's standard input.
+
         Raises WorkerUnreachableError if the worker HTTP endpoint can't be
         reached at all — the caller should evict cache and retry. Does NOT
         raise for user-code failures (non-zero exit, stderr, timed_out);
@@ -1113,10 +1265,13 @@ USER codeuser
         headers = {}
         if token:
             headers["X-Supakiln-Token"] = token
+        body = {"code": code, "env": env_vars or {}, "timeout_ms": timeout_ms}
+        if stdin is not None:
+            body["stdin"] = stdin
         try:
             r = self._http.post(
                 url,
-                json={"code": code, "env": env_vars or {}, "timeout_ms": timeout_ms},
+                json=body,
                 headers=headers,
                 timeout=http_timeout,
             )
@@ -1173,189 +1328,59 @@ USER codeuser
         )
 
     def _execute_with_timeout(self, container_id: str, command: str, timeout: int) -> Tuple[bool, str, Optional[str]]:
-        """Execute a command in a container with timeout."""
+        """Execute a shell command in a container with timeout.
+
+        Goes through the Docker API on the shared client instead of
+        forking the docker CLI for each check. The deadline is enforced
+        inside the container by coreutils `timeout`, which exits 124.
+        """
+        try:
+            exec_id = self.client.api.exec_create(
+                container_id, ["timeout", str(timeout), "sh", "-c", command]
+            )["Id"]
+            stdout, stderr = self.client.api.exec_start(exec_id, demux=True)
+            exit_code = self.client.api.exec_inspect(exec_id).get("ExitCode")
+        except Exception as e:
+            return False, None, str(e)
+        if exit_code == 124:
+            # Kill and remove the container
+            try:
+                self.client.api.remove_container(container_id, force=True)
+            except Exception:
+                pass
+            # Remove from our tracking
+            self.untrack_container(container_id)
+            return False, None, f"Execution timed out after {timeout} seconds"
+        if exit_code == 0:
+            return True, (stdout or b"").decode("utf-8", errors="replace"), None
+        return False, None, (stderr or b"").decode("utf-8", errors="replace")
+
+    def _write_file(self, container_id: str, path: str, data: bytes, timeout: int, executable: bool = False) -> Tuple[bool, str, Optional[str]]:
+        """Write `data` to `path` inside the container through exec stdin.
+
+        The content goes over the exec's stdin pipe rather than the command
+        line, so there is no base64 round trip and no argv size limit.
+        put_archive isn't an option here: /tmp is a tmpfs inside the
+        container and the archive API writes beneath it.
+        """
+        script = 'cat > "$1" && chmod +x "$1"' if executable else 'cat > "$1"'
         try:
-            # Make sure we pass the current environment including DOCKER_HOST
             env = os.environ.copy()
             result = subprocess.run(
-                ["docker", "exec", container_id, "sh", "-c", command],
+                ["docker", "exec", "-i", container_id, "sh", "-c", script, "sh", path],
+                input=data,
                 capture_output=True,
-                text=True,
                 timeout=timeout,
                 env=env
             )
             if result.returncode == 0:
-                return True, result.stdout, None
-            return False, None, result.stderr
+                return True, "", None
+            return False, None, result.stderr.decode('utf-8', errors='replace')
         except subprocess.TimeoutExpired:
-            # Kill and remove the container
-            env = os.environ.copy()
-            subprocess.run(["docker", "kill", container_id], capture_output=True, env=env)
-            subprocess.run(["docker", "rm", container_id], capture_output=True, env=env)
-            # Remove from our tracking
-            for package_hash, cid in list(self.containers.items()):
-                if cid == container_id:
-                    del self.containers[package_hash]
-            return False, None, f"Execution timed out after {timeout} seconds"
+            return False, None, f"Writing {path} timed out after {timeout} seconds"
         except Exception as e:
             return False, None, str(e)
-    
-    def _execute_with_streaming_timeout(self, container_id: str, command: str, timeout: int) -> Tuple[bool, str, Optional[str], bool]:
-        """Execute a command in a container with streaming output and timeout handling."""
-        import threading
-        import docker
-        
-        output_buffer = []
-        error_buffer = []
-        success = False
-        timed_out = False
-        
-        def collect_output():
-            nonlocal success, timed_out
-            try:
-                container = docker_client.containers.get(container_id)
-                # Execute without streaming to get proper exit code
-                # Need to execute the command in a shell to handle pipes properly
-                result = container.exec_run(
-                    ["sh", "-c", command],
-                    stream=False,  # Don't stream to get proper exit code
-                    demux=True     # Separate stdout and stderr
-                )
-                
-                # Process the output
-                if result.output:
-                    stdout_data, stderr_data = result.output
-                    if stdout_data:
-                        output_buffer.append(stdout_data.decode('utf-8', errors='replace'))
-                    if stderr_data:
-                        error_buffer.append(stderr_data.decode('utf-8', errors='replace'))
-                
-                # Now we can reliably check the exit code
-                success = result.exit_code == 0
-                
-            except Exception as e:
-                error_buffer.append(f"Execution error: {str(e)}")
-                success = False
-        
-        # Start output collection in a separate thread
-        output_thread = threading.Thread(target=collect_output)
-        output_thread.daemon = True
-        output_thread.start()
-        
-        # Wait for completion or timeout
-        output_thread.join(timeout)
-        
-        if output_thread.is_alive():
-            # Thread is still running, so we timed out
-            timed_out = True
-            # Try to stop the execution in the container
-            try:
-                container = docker_client.containers.get(container_id)
-                # Kill the process in the container
-                container.exec_run("pkill -f python", detach=True)
-            except:
-                pass
-            
-            # Give it a moment to clean up
-            output_thread.join(1)
-        
-        # Combine output
-        combined_output = ''.join(output_buffer) if output_buffer else None
-        combined_error = ''.join(error_buffer) if error_buffer else None
-        
-        # If we timed out, add timeout message
-        if timed_out:
-            timeout_msg = f"\n--- Execution timed out after {timeout} seconds ---"
-            if combined_output:
-                combined_output += timeout_msg
-            elif combined_error:
-                combined_error += timeout_msg
-            else:
-                combined_error = f"Execution timed out after {timeout} seconds"
-        
-        return success and not timed_out, combined_output, combined_error, timed_out
-    
-    def _execute_with_streaming_timeout_and_env(self, container_id: str, encoded_code: str, timeout: int, env_vars: Dict[str, str], timings: Optional[Dict[str, float]] = None) -> Tuple[bool, str, Optional[str], bool]:
-        """Execute code in a container with environment variables injected at execution time."""
-        import threading
-        import docker
-
-        output_buffer = []
-        error_buffer = []
-        success = False
-        timed_out = False
-        # Shared timings dict so we can measure phases inside the worker thread
-        t = timings if timings is not None else {}
-
-        def collect_output():
-            nonlocal success, timed_out
-            try:
-                t_get = perf_counter()
-                container = docker_client.containers.get(container_id)
-                t['containers_get_ms'] = (perf_counter() - t_get) * 1000
-                # Execute with environment variables injected at execution time
-                t_exec = perf_counter()
-                result = container.exec_run(
-                    f"python3 -c 'import base64; exec(base64.b64decode(\"{encoded_code}\").decode())'",
-                    environment=env_vars,  # Inject environment variables here
-                    stream=False,  # Don't stream to get proper exit code
-                    demux=True     # Separate stdout and stderr
-                )
-                t['exec_run_ms'] = (perf_counter() - t_exec) * 1000
-                
-                # Process the output
-                if result.output:
-                    stdout_data, stderr_data = result.output
-                    if stdout_data:
-                        output_buffer.append(stdout_data.decode('utf-8', errors='replace'))
-                    if stderr_data:
-                        error_buffer.append(stderr_data.decode('utf-8', errors='replace'))
-                
-                # Check the exit code
-                success = result.exit_code == 0
-                
-            except Exception as e:
-                error_buffer.append(f"Execution error: {str(e)}")
-                success = False
-        
-        # Start output collection in a separate thread
-        output_thread = threading.Thread(target=collect_output)
-        output_thread.daemon = True
-        output_thread.start()
-        
-        # Wait for completion or timeout
-        output_thread.join(timeout)
-        
-        if output_thread.is_alive():
-            # Thread is still running, so we timed out
-            timed_out = True
-            # Try to stop the execution in the container
-            try:
-                container = docker_client.containers.get(container_id)
-                # Kill the process in the container
-                container.exec_run("pkill -f python", detach=True)
-            except:
-                pass
-            
-            # Give it a moment to clean up
-            output_thread.join(1)
-        
-        # Combine output
-        combined_output = ''.join(output_buffer) if output_buffer else None
-        combined_error = ''.join(error_buffer) if error_buffer else None
-        
-        # If we timed out, add timeout message
-        if timed_out:
-            timeout_msg = f"\n--- Execution timed out after {timeout} seconds ---"
-            if combined_output:
-                combined_output += timeout_msg
-            elif combined_error:
-                combined_error += timeout_msg
-            else:
-                combined_error = f"Execution timed out after {timeout} seconds"
-        
-        return success and not timed_out, combined_output, combined_error, timed_out
-    
+
     def execute_code(
         self,
         code: str,
@@ -1364,6 +1389,7 @@ USER codeuser
         env_vars: Dict[str, str] = None,
         language: str = "python",
         user_id: int = 1,
+        stdin: Optional[str] = None,
     ) -> Dict:
         """
         Execute code in a container with the specified packages.
@@ -1381,6 +1407,8 @@ USER codeuser
                      system user (id=1) — callers that haven't been
                      wired through the auth layer yet will all share it,
                      which matches the pre-auth behaviour.
+            stdin: Text fed to the program's standard input. Only the
+                   worker path supports it; web services never read it.
 
         Returns:
             Dict containing execution results
@@ -1467,12 +1495,8 @@ USER codeuser
                 'start_command': web_service['start_command']
             }
             
-            # For web services, save code to file and start the service
-            encoded_code = base64.b64encode(code.encode()).decode()
-            
-            # Save code to app.py in container
-            save_command = f"echo '{encoded_code}' | base64 -d > /tmp/app.py"
-            success, output, error = self._execute_with_timeout(container_id, save_command, 10)
+            # For web services, save code to app.py in the container
+            success, output, error = self._write_file(container_id, "/tmp/app.py", code.encode(), 10)
             
             if not success:
                 return {
@@ -1616,12 +1640,13 @@ print("✅ Modified Dash app for proxy usage")
 print("✅ Proxy path: " + proxy_path)
 '''
                 
-                patcher_script = f"echo '{base64.b64encode(dash_patcher.encode()).decode()}' | base64 -d > /tmp/patch_app.py"
+                success, output, error = self._write_file(container_id, "/tmp/patch_app.py", dash_patcher.encode(), 10)
+                if not success:
+                    print(f"❌ Failed to write Dash patcher: {error}")
                 
                 service_start_script = f'''#!/bin/bash
 cd /tmp
 export PYTHONPATH=/tmp:$PYTHONPATH
-{patcher_script}
 python /tmp/patch_app.py
 if [ -f /tmp/app_proxy.py ]; then
     echo "🚀 Starting patched Dash app..."
@@ -1639,28 +1664,20 @@ export PYTHONPATH=/tmp:$PYTHONPATH
 '''
             
             # Create the startup script
-            script_command = f"echo '{base64.b64encode(service_start_script.encode()).decode()}' | base64 -d > /tmp/start_service.sh && chmod +x /tmp/start_service.sh"
-            success, output, error = self._execute_with_timeout(container_id, script_command, 10)
+            success, output, error = self._write_file(
+                container_id, "/tmp/start_service.sh", service_start_script.encode(), 10, executable=True
+            )
             
             if not success:
                 print(f"❌ Failed to create startup script: {error}")
             else:
                 print(f"✅ Startup script created")
             
-            # Start the service using Docker exec -d (detached mode)
+            # Start the service with a detached exec
             try:
-                env = os.environ.copy()
-                result = subprocess.run([
-                    "docker", "exec", "-d", container_id, "/tmp/start_service.sh"
-                ], capture_output=True, text=True, timeout=10, env=env)
-                
-                if result.returncode == 0:
-                    print(f"✅ Service started in detached mode")
-                    success = True
-                else:
-                    print(f"❌ Failed to start service: {result.stderr}")
-                    success = False
-                    error = result.stderr
+                exec_output(container_id, ["/tmp/start_service.sh"], detach=True)
+                print(f"✅ Service started in detached mode")
+                success = True
             except Exception as e:
                 print(f"❌ Exception starting service: {e}")
                 success = False
@@ -1781,6 +1798,7 @@ export PYTHONPATH=/tmp:$PYTHONPATH
                             host, port, code, env_vars,
                             timeout_ms=int(timeout * 1000),
                             token=meta_for_token.get("worker_token"),
+                            stdin=stdin,
                         )
                         timings['worker_exec_ms'] = (perf_counter() - t_exec) * 1000
                         if attempt == 1:
@@ -1854,7 +1872,9 @@ export PYTHONPATH=/tmp:$PYTHONPATH
                 subprocess.run(["docker", "rm", "-f", container_id], capture_output=True, env=env)
             except Exception:
                 pass
-        self.containers.clear()
+        with self._tracking_lock:
+            self.containers.clear()
+            self.containers_by_id.clear()
         self.web_service_containers.clear()
         self.worker_containers.clear()
         self.worker_endpoints.clear()
@@ -0,0 +1,130 @@
+"""CORS as a thin ASGI wrapper with headers precomputed at startup.
+
+Behaves like Starlette's CORSMiddleware for the configuration supakiln
+uses (credentialed requests, explicit origin list plus an optional dev
+regex), but does its per-request work on raw header bytes: one pass over
+the request headers, a frozenset lookup for the origin (regex verdicts
+are remembered per origin), and a fixed list
+of response headers appended to whatever the app sends. Preflights are
+answered directly without entering the app.
+
+With `allow_credentials`, browsers reject `Access-Control-Allow-Origin: *`,
+so the matching request origin is echoed back and `Vary: Origin` is set.
+"""
+
+import re
+from typing import Iterable, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+# Regex verdicts remembered per origin. A browser sends the same Origin
+# on every request, so past the first one the regex never runs; the
+# map is reset if a flood of distinct origins fills it.
+ORIGIN_CACHE_MAX = 1024
+
+
+class PrecomputedCORSMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        allow_origins: Iterable[str] = (),
+        allow_origin_regex: Optional[str] = None,
+        max_age: int = 600,
+    ) -> None:
+        self.app = app
+        self.allow_origins = frozenset(o.encode("latin-1") for o in allow_origins)
+        self.allow_origin_regex = (
+            re.compile(allow_origin_regex.encode("latin-1"))
+            if allow_origin_regex
+            else None
+        )
+        self._regex_verdicts: dict = {}
+        self._simple_headers = [
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+        self._preflight_headers = [
+            (b"access-control-allow-methods", ", ".join(ALL_METHODS).encode("latin-1")),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+            (b"content-length", b"0"),
+        ]
+
+    def is_allowed_origin(self, origin: bytes) -> bool:
+        if origin in self.allow_origins:
+            return True
+        if self.allow_origin_regex is None:
+            return False
+        verdict = self._regex_verdicts.get(origin)
+        if verdict is None:
+            verdict = self.allow_origin_regex.fullmatch(origin) is not None
+            if len(self._regex_verdicts) >= ORIGIN_CACHE_MAX:
+                self._regex_verdicts.clear()
+            self._regex_verdicts[origin] = verdict
+        return verdict
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed = self.is_allowed_origin(origin)
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self._preflight(origin, allowed, request_headers, send)
+            return
+
+        if not allowed:
+            await self.app(scope, receive, send)
+            return
+
+        extra = [(b"access-control-allow-origin", origin)] + self._simple_headers
+
+        async def send_with_cors(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + extra
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(
+        self,
+        origin: bytes,
+        allowed: bool,
+        request_headers: Optional[bytes],
+        send: Send,
+    ) -> None:
+        if not allowed:
+            body = b"Disallowed CORS origin"
+            await send({
+                "type": "http.response.start",
+                "status": 400,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        headers = [(b"access-control-allow-origin", origin)] + self._preflight_headers
+        if request_headers:
+            headers.append((b"access-control-allow-headers", request_headers))
+        await send({"type": "http.response.start", "status": 204, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
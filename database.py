@@ -1,4 +1,4 @@
-from db_models import SessionLocal
+from db_models import SessionLocal, AsyncSessionLocal
 
 def get_db():
     """Database dependency to provide database sessions."""
@@ -6,4 +6,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Async database dependency for endpoints that use AsyncSession."""
+    async with AsyncSessionLocal() as db:
+        yield db
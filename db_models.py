@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Index, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from datetime import datetime
-import os
+from settings import env_int
 
 Base = declarative_base()
 
@@ -94,6 +95,10 @@ class WebhookJob(Base):
     description = Column(Text)  # Optional description
     language = Column(String(20), default="python")
 
+    __table_args__ = (
+        Index("idx_webhook_jobs_owner", "owner_user_id", "id"),
+    )
+
 class PersistentService(Base):
     __tablename__ = "persistent_services"
 
@@ -114,6 +119,12 @@ class PersistentService(Base):
     auto_start = Column(Integer, default=1)  # 1 to auto-start on system startup
     language = Column(String(20), default="python")
 
+    # Names are unique per owner, not globally (schema v14).
+    __table_args__ = (
+        Index("idx_persistent_services_owner_name", "owner_user_id", "name", unique=True),
+        Index("idx_persistent_services_owner", "owner_user_id", "id"),
+    )
+
 class ExposedPort(Base):
     __tablename__ = "exposed_ports"
     
@@ -129,6 +140,15 @@ class ExposedPort(Base):
     is_active = Column(Integer, default=1)  # 1 for active, 0 for inactive
     description = Column(Text)  # Optional description
 
+class NamedContainer(Base):
+    """A container created through POST /containers, with its user-given name."""
+    __tablename__ = "named_containers"
+
+    container_id = Column(String(100), primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    packages = Column(Text)  # Stored as comma-separated string
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class ExecutionLog(Base):
     __tablename__ = "execution_logs"
 
@@ -147,10 +167,46 @@ class ExecutionLog(Base):
     request_data = Column(Text)  # For webhook jobs: the request payload
     response_data = Column(Text)  # For webhook jobs: the response payload
 
-# Create database engine and session factory
-engine = create_engine('sqlite:///code_executor.db')
+# Create database engine and session factory.
+#
+# LIFO checkout keeps reusing the most recently returned connection, so
+# under light load the idle overflow connections age out instead of
+# being rotated through, and pre-ping transparently replaces connections
+# that went stale. File-backed SQLite gets a QueuePool like any other
+# backend; check_same_thread is off because sessions are handed across
+# FastAPI's threadpool. The 20 persistent connections cover the steady
+# state of concurrent /execute + /logs traffic; overflow absorbs bursts.
+# Both engines below pool separately, so against a server database keep
+# 2 x (pool_size + max_overflow) per process under its max_connections.
+DATABASE_URL = 'sqlite:///code_executor.db'
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=env_int("SUPAKILN_DB_POOL_SIZE", 20),
+    max_overflow=env_int("SUPAKILN_DB_MAX_OVERFLOW", 10),
+    pool_timeout=env_int("SUPAKILN_DB_POOL_TIMEOUT", 30),
+    pool_recycle=env_int("SUPAKILN_DB_POOL_RECYCLE", 1800),
+    pool_pre_ping=True,
+    pool_use_lifo=True,
+)
 SessionLocal = sessionmaker(bind=engine)
 
+# Async twin of the engine above for endpoints that use AsyncSession, so
+# their queries don't pin the event loop. Same file, same pool policy.
+ASYNC_DATABASE_URL = 'sqlite+aiosqlite:///code_executor.db'
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=env_int("SUPAKILN_DB_POOL_SIZE", 20),
+    max_overflow=env_int("SUPAKILN_DB_MAX_OVERFLOW", 10),
+    pool_timeout=env_int("SUPAKILN_DB_POOL_TIMEOUT", 30),
+    pool_recycle=env_int("SUPAKILN_DB_POOL_RECYCLE", 1800),
+    pool_pre_ping=True,
+    pool_use_lifo=True,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 # Note: Tables are created by the migration system in migrate_database.py
 # This ensures proper version tracking and schema migrations
 
@@ -159,4 +215,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
\ No newline at end of file
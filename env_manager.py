@@ -1,12 +1,69 @@
+import asyncio
+from collections import OrderedDict
+from contextlib import contextmanager
 from cryptography.fernet import Fernet
 from datetime import datetime
+from typing import Dict, Optional, Tuple
 import os
+import threading
+import time
 
 # Canonical model + SYSTEM_USER_ID live in db_models; re-import locally so
 # the manager always operates on the same table definition the rest of
 # the app uses (the old duplicate class here caused table-redefinition
 # headaches).
-from db_models import EnvironmentVariable, SYSTEM_USER_ID
+from db_models import EnvironmentVariable, SessionLocal, SYSTEM_USER_ID
+from settings import env_float
+
+KEY_FILE = '.env_key'
+
+# Decrypted get_all_variables() results, most recently used last, keyed
+# by owner. set_variable/delete_variable drop the owner's entry; the TTL
+# bounds how long a write made by another worker process goes unseen.
+ENV_CACHE_TTL = env_float("SUPAKILN_ENV_CACHE_TTL", 30.0)
+ENV_CACHE_MAX_USERS = 256
+
+_variables_cache: "OrderedDict[int, Tuple[float, Dict[str, str]]]" = OrderedDict()
+_variables_cache_lock = threading.Lock()
+# Bumped on every invalidation so a read that raced with a write doesn't
+# put the pre-write values back.
+_variables_cache_generation = 0
+
+
+def _invalidate_variables(owner_user_id: int) -> None:
+    global _variables_cache_generation
+    with _variables_cache_lock:
+        _variables_cache_generation += 1
+        _variables_cache.pop(owner_user_id, None)
+
+
+def load_key() -> Optional[bytes]:
+    """The persisted Fernet key, or None if none has been generated yet."""
+    if os.path.exists(KEY_FILE):
+        with open(KEY_FILE, 'rb') as key_file:
+            return key_file.read()
+    return None
+
+
+_manager: "Optional[EnvironmentManager]" = None
+_manager_lock = threading.Lock()
+
+
+def get_env_manager() -> "EnvironmentManager":
+    """The process-wide EnvironmentManager, built on first use.
+
+    The key file is read once; after that this is a plain global read.
+    The shared manager opens a session per call, so concurrent
+    threadpool callers never share one.
+    """
+    global _manager
+    manager = _manager
+    if manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = EnvironmentManager(encryption_key=load_key())
+            manager = _manager
+    return manager
 
 
 class EnvironmentManager:
@@ -27,7 +84,10 @@ class EnvironmentManager:
     and set_variable will raise on conflict.
     """
 
-    def __init__(self, db_session, encryption_key=None):
+    def __init__(self, db_session=None, encryption_key=None):
+        # With a session, every call runs on it (the caller owns it).
+        # Without one, each call opens and closes its own, which is what
+        # lets get_env_manager() share one manager across threads.
         self.db = db_session
         if encryption_key:
             self.fernet = Fernet(encryption_key)
@@ -36,14 +96,33 @@ class EnvironmentManager:
             key = Fernet.generate_key()
             self.fernet = Fernet(key)
             # Store the key in a file for persistence
-            with open('.env_key', 'wb') as key_file:
+            with open(KEY_FILE, 'wb') as key_file:
                 key_file.write(key)
 
-    def _scoped_query(self, owner_user_id: int):
-        return self.db.query(EnvironmentVariable).filter(
+    @contextmanager
+    def _session(self):
+        if self.db is not None:
+            yield self.db
+            return
+        with SessionLocal() as db:
+            yield db
+
+    @staticmethod
+    def _scoped_query(db, owner_user_id: int):
+        return db.query(EnvironmentVariable).filter(
             EnvironmentVariable.owner_user_id == owner_user_id
         )
 
+    @staticmethod
+    def _metadata_query(db, owner_user_id: int):
+        """`_scoped_query` for just the metadata columns (no ciphertext)."""
+        return db.query(
+            EnvironmentVariable.name,
+            EnvironmentVariable.description,
+            EnvironmentVariable.created_at,
+            EnvironmentVariable.updated_at,
+        ).filter(EnvironmentVariable.owner_user_id == owner_user_id)
+
     def set_variable(
         self,
         name: str,
@@ -53,87 +132,113 @@ class EnvironmentManager:
     ) -> None:
         """Set an environment variable with encryption."""
         encrypted_value = self.fernet.encrypt(value.encode())
-        var = self._scoped_query(owner_user_id).filter(
-            EnvironmentVariable.name == name
-        ).first()
-
-        if var:
-            var.value = encrypted_value.decode()
-            var.updated_at = datetime.utcnow()
-            if description is not None:
-                var.description = description
-        else:
-            var = EnvironmentVariable(
-                name=name,
-                value=encrypted_value.decode(),
-                description=description,
-                owner_user_id=owner_user_id,
-            )
-            self.db.add(var)
+        with self._session() as db:
+            var = self._scoped_query(db, owner_user_id).filter(
+                EnvironmentVariable.name == name
+            ).first()
 
-        self.db.commit()
+            if var:
+                var.value = encrypted_value.decode()
+                var.updated_at = datetime.utcnow()
+                if description is not None:
+                    var.description = description
+            else:
+                var = EnvironmentVariable(
+                    name=name,
+                    value=encrypted_value.decode(),
+                    description=description,
+                    owner_user_id=owner_user_id,
+                )
+                db.add(var)
+
+            db.commit()
+        _invalidate_variables(owner_user_id)
 
     def get_variable(self, name: str, owner_user_id: int = SYSTEM_USER_ID) -> str:
         """Get a decrypted environment variable value."""
-        var = self._scoped_query(owner_user_id).filter(
-            EnvironmentVariable.name == name
-        ).first()
-        if not var:
-            return None
+        with self._session() as db:
+            var = self._scoped_query(db, owner_user_id).filter(
+                EnvironmentVariable.name == name
+            ).first()
+            if not var:
+                return None
+            encrypted = var.value
 
         try:
-            decrypted_value = self.fernet.decrypt(var.value.encode())
+            decrypted_value = self.fernet.decrypt(encrypted.encode())
             return decrypted_value.decode()
         except Exception:
             return None
 
     def get_variable_metadata(
         self, name: str, owner_user_id: int = SYSTEM_USER_ID
-    ) -> dict:
-        """Get environment variable metadata without the value."""
-        var = self._scoped_query(owner_user_id).filter(
-            EnvironmentVariable.name == name
-        ).first()
-        if not var:
-            return None
+    ):
+        """Get environment variable metadata without the value.
 
-        return {
-            "name": var.name,
-            "description": var.description,
-            "created_at": var.created_at.isoformat(),
-            "updated_at": var.updated_at.isoformat(),
-        }
+        Returns a row with name, description, created_at and updated_at,
+        or None.
+        """
+        with self._session() as db:
+            return self._metadata_query(db, owner_user_id).filter(
+                EnvironmentVariable.name == name
+            ).first()
 
     def list_variables_with_metadata(
         self, owner_user_id: int = SYSTEM_USER_ID
     ) -> list:
-        """List all environment variables with metadata but without values."""
-        variables = []
-        for var in self._scoped_query(owner_user_id).all():
-            variables.append({
-                "name": var.name,
-                "description": var.description,
-                "created_at": var.created_at.isoformat(),
-                "updated_at": var.updated_at.isoformat(),
-            })
-        return variables
+        """List all environment variables with metadata but without values.
+
+        Rows as from `get_variable_metadata`; the router's response model
+        reads them directly.
+        """
+        with self._session() as db:
+            return self._metadata_query(db, owner_user_id).all()
 
     def delete_variable(
         self, name: str, owner_user_id: int = SYSTEM_USER_ID
     ) -> bool:
         """Delete an environment variable."""
-        var = self._scoped_query(owner_user_id).filter(
-            EnvironmentVariable.name == name
-        ).first()
-        if var:
-            self.db.delete(var)
-            self.db.commit()
-            return True
-        return False
+        with self._session() as db:
+            var = self._scoped_query(db, owner_user_id).filter(
+                EnvironmentVariable.name == name
+            ).first()
+            if not var:
+                return False
+            db.delete(var)
+            db.commit()
+        _invalidate_variables(owner_user_id)
+        return True
 
     def list_variables(self, owner_user_id: int = SYSTEM_USER_ID) -> list:
         """List all environment variable names."""
-        return [var.name for var in self._scoped_query(owner_user_id).all()]
+        with self._session() as db:
+            return [var.name for var in self._scoped_query(db, owner_user_id).all()]
+
+    def cached_variables(self, owner_user_id: int = SYSTEM_USER_ID) -> Optional[dict]:
+        """A copy of the owner's cached variables, or None on a miss.
+
+        Never touches the database, so async callers can probe the
+        cache without a threadpool hop.
+        """
+        with _variables_cache_lock:
+            cached = _variables_cache.get(owner_user_id)
+            if cached is None or time.monotonic() - cached[0] >= ENV_CACHE_TTL:
+                return None
+            _variables_cache.move_to_end(owner_user_id)
+            return dict(cached[1])
+
+    async def get_all_variables_async(
+        self, owner_user_id: int = SYSTEM_USER_ID
+    ) -> dict:
+        """get_all_variables() for request handlers.
+
+        A cache hit is answered on the event loop; only a miss (DB read
+        and Fernet decrypts) goes to a worker thread.
+        """
+        variables = self.cached_variables(owner_user_id)
+        if variables is None:
+            variables = await asyncio.to_thread(self.get_all_variables, owner_user_id)
+        return variables
 
     def get_all_variables(
         self, owner_user_id: int = SYSTEM_USER_ID
@@ -142,13 +247,30 @@ class EnvironmentManager:
 
         Call this with the executing user's id; the returned dict is what
         the executor injects into the container. Any leak here crosses
-        the per-user isolation boundary.
+        the per-user isolation boundary. Results are cached per owner, so
+        callers get their own copy to modify.
         """
+        variables = self.cached_variables(owner_user_id)
+        if variables is not None:
+            return variables
+        with _variables_cache_lock:
+            generation = _variables_cache_generation
+
+        with self._session() as db:
+            rows = self._scoped_query(db, owner_user_id).with_entities(
+                EnvironmentVariable.name, EnvironmentVariable.value
+            ).all()
         variables = {}
-        for var in self._scoped_query(owner_user_id).all():
+        for name, value in rows:
             try:
-                decrypted_value = self.fernet.decrypt(var.value.encode())
-                variables[var.name] = decrypted_value.decode()
+                variables[name] = self.fernet.decrypt(value.encode()).decode()
             except Exception:
                 continue
-        return variables
+
+        with _variables_cache_lock:
+            if generation == _variables_cache_generation:
+                _variables_cache[owner_user_id] = (time.monotonic(), variables)
+                _variables_cache.move_to_end(owner_user_id)
+                while len(_variables_cache) > ENV_CACHE_MAX_USERS:
+                    _variables_cache.popitem(last=False)
+        return dict(variables)
@@ -52,7 +52,7 @@ interface Log {
   id: number;
   job_id: number | null;
   webhook_job_id: number | null;
-  code: string;
+  code: string | null;
   output: string | null;
   error: string | null;
   container_id: string | null;
@@ -120,6 +120,7 @@ const Logs: React.FC = () => {
           offset: (page - 1) * 20,
           job_id: jobFilter || undefined,
           status: statusFilter || undefined,
+          include_bodies: false,
         },
       });
       setLogs((prevLogs: Log[]) => page === 1 ? response.data : [...prevLogs, ...response.data]);
@@ -132,7 +133,7 @@ const Logs: React.FC = () => {
   const fetchLogStats = async () => {
     try {
       // Since there's no dedicated stats endpoint, we'll calculate from recent logs
-      const response = await api.get('/logs?limit=1000');
+      const response = await api.get('/logs?limit=1000&include_bodies=false');
       const allLogs: Log[] = response.data;
       
       const today = new Date();
@@ -223,8 +224,15 @@ const Logs: React.FC = () => {
     setPage(page + 1);
   };
 
-  const handleLogClick = (log: Log) => {
+  const handleLogClick = async (log: Log) => {
+    // List rows come without code/output; load the full entry.
     setSelectedLog(log);
+    try {
+      const response = await api.get(`/logs/${log.id}`);
+      setSelectedLog(response.data);
+    } catch (error) {
+      console.error('Error fetching log details:', error);
+    }
   };
 
   const handleCloseDialog = () => {
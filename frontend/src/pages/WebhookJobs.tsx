@@ -71,6 +71,9 @@ interface WebhookJobForm {
   language: string;
 }
 
+// Largest page GET /webhook-jobs serves.
+const PAGE_SIZE = 500;
+
 const WebhookJobs: React.FC = () => {
   const [jobs, setJobs] = useState<WebhookJob[]>([]);
   const [containers, setContainers] = useState<Container[]>([]);
@@ -97,8 +100,20 @@ const WebhookJobs: React.FC = () => {
 
   const fetchJobs = async () => {
     try {
-      const response = await api.get('/webhook-jobs');
-      setJobs(response.data);
+      // The API returns at most PAGE_SIZE jobs per call, in id order;
+      // follow the after_id cursor until a short page.
+      const all: WebhookJob[] = [];
+      let afterId: number | undefined;
+      for (;;) {
+        const response = await api.get('/webhook-jobs', {
+          params: { limit: PAGE_SIZE, after_id: afterId },
+        });
+        const page: WebhookJob[] = response.data;
+        all.push(...page);
+        if (page.length < PAGE_SIZE) break;
+        afterId = page[page.length - 1].id;
+      }
+      setJobs(all);
     } catch (error) {
       console.error('Error fetching webhook jobs:', error);
       setError('Failed to fetch webhook jobs');
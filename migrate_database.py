@@ -7,6 +7,9 @@ import sqlite3
 import os
 from datetime import datetime
 
+# Bump together with a new `if current_version < N` block in apply_migrations.
+SCHEMA_VERSION = 15
+
 def migrate_database():
     db_path = "code_executor.db"
     
@@ -22,7 +25,7 @@ def migrate_database():
             # No tables exist (or no schema_info), create complete database schema
             print("🆕 Creating complete database schema...")
             create_complete_schema(cursor)
-            current_version = 10
+            current_version = SCHEMA_VERSION
             print(f"✅ Database created with version {current_version}")
         else:
             # Tables exist, check version and apply migrations
@@ -38,10 +41,10 @@ def migrate_database():
             print(f"Current database version: {current_version}")
 
             # Apply migrations if needed
-            if current_version < 10:
-                print(f"⬆️  Upgrading database from version {current_version} to 10...")
+            if current_version < SCHEMA_VERSION:
+                print(f"⬆️  Upgrading database from version {current_version} to {SCHEMA_VERSION}...")
                 apply_migrations(cursor, current_version)
-                current_version = 10
+                current_version = SCHEMA_VERSION
                 print(f"✅ Database upgraded to version {current_version}")
         
         # Verify the final schema
@@ -221,8 +224,79 @@ def create_complete_schema(cursor):
         )
     """)
 
+    create_execution_log_indexes(cursor)
+
+    create_named_containers_table(cursor)
+
+    create_service_name_index(cursor)
+
+    create_owner_list_indexes(cursor)
+
     # Set version to latest
-    cursor.execute("INSERT INTO schema_info (key, value) VALUES ('version', '10')")
+    cursor.execute(
+        "INSERT INTO schema_info (key, value) VALUES ('version', ?)",
+        (str(SCHEMA_VERSION),),
+    )
+
+def create_execution_log_indexes(cursor):
+    """Indexes backing keyset pagination of /logs: newest first, ties by id.
+
+    One per filter /logs applies: none (admins), job, webhook, and owner
+    (every non-admin listing is scoped to the caller).
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_execution_logs_started_at "
+        "ON execution_logs(started_at DESC, id DESC)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_execution_logs_job_started_at "
+        "ON execution_logs(job_id, started_at DESC, id DESC)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_execution_logs_webhook_started_at "
+        "ON execution_logs(webhook_job_id, started_at DESC, id DESC)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_execution_logs_owner_started_at "
+        "ON execution_logs(owner_user_id, started_at DESC, id DESC)"
+    )
+
+def create_service_name_index(cursor):
+    """Service names are unique per owner; the index also serves the lookup.
+
+    webhook_jobs.endpoint needs nothing extra: it is declared UNIQUE,
+    which SQLite backs with an index of its own.
+    """
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_persistent_services_owner_name "
+        "ON persistent_services(owner_user_id, name)"
+    )
+
+def create_owner_list_indexes(cursor):
+    """Indexes behind the paged per-owner /webhook-jobs and /services lists.
+
+    Rows come back in id order from `after_id` on, so a non-admin page is
+    one range scan instead of a filter over the whole table.
+    """
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_webhook_jobs_owner "
+        "ON webhook_jobs(owner_user_id, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_persistent_services_owner "
+        "ON persistent_services(owner_user_id, id)"
+    )
+
+def create_named_containers_table(cursor):
+    """Names given to containers via POST /containers, shared by all workers."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS named_containers (
+            container_id VARCHAR(100) PRIMARY KEY,
+            name VARCHAR(100) UNIQUE NOT NULL,
+            packages TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
 
 def apply_migrations(cursor, current_version):
     """Apply migrations from current_version to latest."""
@@ -496,8 +570,56 @@ def apply_migrations(cursor, current_version):
         else:
             print("✅ environment_variables already has composite unique")
 
+    # Migration v10 -> v11: indexes for keyset pagination of execution logs.
+    if current_version < 11:
+        print("Adding execution_logs pagination indexes...")
+        create_execution_log_indexes(cursor)
+        print("✅ Added execution_logs pagination indexes")
+
+    # Migration v11 -> v12: owner/webhook-scoped log indexes.
+    if current_version < 12:
+        print("Adding owner/webhook execution_logs indexes...")
+        create_execution_log_indexes(cursor)
+        print("✅ Added owner/webhook execution_logs indexes")
+
+    # Migration v12 -> v13: container names move from process memory
+    # into the database.
+    if current_version < 13:
+        print("Creating named_containers table...")
+        create_named_containers_table(cursor)
+        print("✅ Created named_containers table")
+
+    # Migration v13 -> v14: the per-owner service name check moves into
+    # a unique index. Names that already clash (the API check could be
+    # raced) keep the oldest row's name; later ones get their id appended.
+    if current_version < 14:
+        print("Adding unique index on persistent_services(owner_user_id, name)...")
+        cursor.execute("""
+            UPDATE persistent_services
+            SET name = name || ' (' || id || ')'
+            WHERE EXISTS (
+                SELECT 1 FROM persistent_services AS older
+                WHERE older.owner_user_id IS persistent_services.owner_user_id
+                  AND older.name = persistent_services.name
+                  AND older.id < persistent_services.id
+            )
+        """)
+        if cursor.rowcount > 0:
+            print(f"⚠️  Renamed {cursor.rowcount} duplicate service name(s)")
+        create_service_name_index(cursor)
+        print("✅ Added unique index on persistent_services(owner_user_id, name)")
+
+    # Migration v14 -> v15: owner indexes for the paged list endpoints.
+    if current_version < 15:
+        print("Adding owner indexes on webhook_jobs and persistent_services...")
+        create_owner_list_indexes(cursor)
+        print("✅ Added owner indexes on webhook_jobs and persistent_services")
+
     # Update version
-    cursor.execute("INSERT OR REPLACE INTO schema_info (key, value) VALUES ('version', '10')")
+    cursor.execute(
+        "INSERT OR REPLACE INTO schema_info (key, value) VALUES ('version', ?)",
+        (str(SCHEMA_VERSION),),
+    )
 
 def verify_schema(cursor):
     """Verify that all required tables and columns exist."""
@@ -523,7 +645,7 @@ def verify_schema(cursor):
     required_tables = [
         'schema_info', 'environment_variables', 'scheduled_jobs',
         'webhook_jobs', 'persistent_services', 'exposed_ports',
-        'execution_logs', 'users', 'api_keys'
+        'execution_logs', 'users', 'api_keys', 'named_containers'
     ]
     
     for table in required_tables:
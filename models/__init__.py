@@ -7,10 +7,12 @@ from db_models import (
     PersistentService,
     ExecutionLog,
     ExposedPort,
+    NamedContainer,
     User,
     ApiKey,
     SYSTEM_USER_ID,
     SessionLocal,
+    AsyncSessionLocal,
     Base,
     get_db,
 )
@@ -22,10 +24,12 @@ __all__ = [
     "PersistentService",
     "ExecutionLog",
     "ExposedPort",
+    "NamedContainer",
     "User",
     "ApiKey",
     "SYSTEM_USER_ID",
     "SessionLocal",
+    "AsyncSessionLocal",
     "Base",
     "get_db",
 ]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Optional
 from datetime import datetime
 
@@ -57,6 +57,8 @@ class PackageInstallRequest(BaseModel):
     packages: List[str]
 
 class ContainerResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     container_id: str
     name: str
     packages: List[str]
@@ -85,31 +87,49 @@ class ScheduledJobRequest(BaseModel):
     )
 
 class ScheduledJobResponse(BaseModel):
+    """Validated straight from a `ScheduledJob` row."""
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     name: str
     code: Optional[str] = None
     cron_expression: str
     container_id: Optional[str]
     packages: Optional[str]
-    created_at: str
-    last_run: Optional[str]
+    created_at: datetime
+    last_run: Optional[datetime]
     is_active: bool
     timeout: int
     language: Optional[str] = "python"
 
+    @field_validator("language", mode="before")
+    @classmethod
+    def _default_language(cls, value):
+        # Rows created before multi-language support have NULL here.
+        return value or "python"
+
 class ExecutionLogResponse(BaseModel):
+    """Validated straight from an `ExecutionLog` row.
+
+    The text bodies (code, output, error, request/response data) are
+    null in summary listings (`GET /logs?include_bodies=false`).
+    """
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     job_id: Optional[int]
     webhook_job_id: Optional[int]
-    code: str
-    output: Optional[str]
-    error: Optional[str]
+    code: Optional[str] = None
+    output: Optional[str] = None
+    error: Optional[str] = None
     container_id: Optional[str]
     execution_time: float
-    started_at: str
+    started_at: datetime
     status: str
-    request_data: Optional[str]
-    response_data: Optional[str]
+    request_data: Optional[str] = None
+    response_data: Optional[str] = None
 
 class EnvVarRequest(BaseModel):
     name: str
@@ -117,15 +137,19 @@ class EnvVarRequest(BaseModel):
     description: Optional[str] = None
 
 class EnvVarResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     name: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
 class EnvVarMetadata(BaseModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     name: str
     description: Optional[str]
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
 
 class WebhookJobRequest(BaseModel):
     """Body for `POST /webhook-jobs` and `PUT /webhook-jobs/{id}`.
@@ -156,19 +180,28 @@ class WebhookJobRequest(BaseModel):
     )
 
 class WebhookJobResponse(BaseModel):
+    """Validated straight from a `WebhookJob` row."""
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     name: str
     endpoint: str
     code: str
     container_id: Optional[str]
     packages: Optional[str]
-    created_at: str
-    last_triggered: Optional[str]
+    created_at: datetime
+    last_triggered: Optional[datetime]
     is_active: bool
     timeout: int
     description: Optional[str]
     language: Optional[str] = "python"
 
+    @field_validator("language", mode="before")
+    @classmethod
+    def _default_language(cls, value):
+        return value or "python"
+
 class PersistentServiceRequest(BaseModel):
     name: str
     code: str
@@ -180,14 +213,18 @@ class PersistentServiceRequest(BaseModel):
     language: Optional[str] = "python"
 
 class PersistentServiceResponse(BaseModel):
+    """Validated straight from a `PersistentService` row."""
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     name: str
     code: str
     container_id: Optional[str]
     packages: Optional[str]
-    created_at: str
-    started_at: Optional[str]
-    last_restart: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    last_restart: Optional[datetime]
     is_active: bool
     status: str  # stopped, starting, running, error, restarting
     restart_policy: str
@@ -216,11 +253,15 @@ class LoginResponse(BaseModel):
 
 
 class UserResponse(BaseModel):
+    """Validated straight from a `User` row."""
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     email: str
     is_admin: bool
     disabled: bool
-    created_at: str
+    created_at: Optional[datetime]
 
 
 class UserCreateRequest(BaseModel):
@@ -260,11 +301,15 @@ class ApiKeyCreateResponse(BaseModel):
 
 
 class ApiKeyResponse(BaseModel):
+    """Validated straight from an `ApiKey` row."""
+
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
     id: int
     prefix: str
     label: Optional[str]
-    last_used_at: Optional[str]
-    created_at: str
+    last_used_at: Optional[datetime]
+    created_at: Optional[datetime]
 
 
 LoginResponse.model_rebuild()
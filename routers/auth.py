@@ -11,9 +11,11 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
 from db_models import ApiKey, User
 from models.schemas import LoginRequest, LoginResponse, UserResponse
 from auth import (
@@ -29,26 +31,23 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 def _user_response(user: User) -> UserResponse:
-    return UserResponse(
-        id=user.id,
-        email=user.email,
-        is_admin=bool(user.is_admin),
-        disabled=bool(user.disabled),
-        created_at=user.created_at.isoformat() if user.created_at else "",
-    )
+    return UserResponse.model_validate(user)
 
 
 @router.post("/login", response_model=LoginResponse, summary="Exchange email/password for a session token")
 async def login(
     body: LoginRequest,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = db.query(User).filter(User.email == body.email).first()
+    user = (await db.execute(
+        select(User).where(User.email == body.email)
+    )).scalars().first()
     # Keep the failure path uniform to avoid user-enumeration by timing.
     if user is None or user.disabled or not user.password_hash:
         # Still do a dummy verify to even out timing.
-        verify_password(
+        await run_in_threadpool(
+            verify_password,
             "$argon2id$v=19$m=65536,t=3,p=4$"
             "dummy-salt-for-timing-pad$dummy-hash-for-timing",
             body.password,
@@ -58,7 +57,9 @@ async def login(
             detail="invalid credentials",
         )
 
-    if not verify_password(user.password_hash, body.password):
+    # argon2 verification is deliberately slow (tens of ms of CPU and
+    # 64 MiB); keep it off the event loop.
+    if not await run_in_threadpool(verify_password, user.password_hash, body.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="invalid credentials",
@@ -74,7 +75,7 @@ async def login(
         expires_at=datetime.utcnow() + timedelta(seconds=SESSION_TTL_SECONDS),
     )
     db.add(session)
-    db.commit()
+    await db.commit()
 
     response.set_cookie(
         key="supakiln_session",
@@ -95,7 +96,7 @@ async def login(
 async def logout(
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Look at the same transports as the dep.
     auth = request.headers.get("Authorization") or ""
@@ -107,10 +108,12 @@ async def logout(
 
     if token:
         hashed = hash_token(token)
-        key = db.query(ApiKey).filter(ApiKey.hashed_key == hashed).first()
+        key = (await db.execute(
+            select(ApiKey).where(ApiKey.hashed_key == hashed)
+        )).scalars().first()
         if key is not None and key.revoked_at is None:
             key.revoked_at = datetime.utcnow()
-            db.commit()
+            await db.commit()
 
     response.delete_cookie("supakiln_session")
     return {"ok": True}
@@ -118,4 +121,4 @@ async def logout(
 
 @router.get("/me", response_model=UserResponse, summary="Current authenticated user")
 async def me(user: User = Depends(current_user)):
-    return _user_response(user)
+    return user
@@ -1,60 +1,128 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+import asyncio
 import docker
-import os
+import threading
+import time
+from sqlalchemy.orm import Session
+from database import get_db
 from models.schemas import PackageInstallRequest, ContainerResponse
-from services.docker_client import docker_client
-from code_executor import CodeExecutor
+from services.docker_client import docker_client, exec_output, run_docker
 from services.code_executor_service import get_code_executor
+from services import container_registry
 
 router = APIRouter(prefix="/containers", tags=["containers"])
 
-# Store container names
-container_names = {}  # container_id -> name
+# Short-lived copy of the GET /containers response. Polling clients hit
+# the cache; create/delete/cleanup drop it so changes show up at once.
+LIST_CACHE_TTL = 2.0
+_containers_cache: Optional[Tuple[float, List[ContainerResponse]]] = None
+_containers_cache_lock = asyncio.Lock()
+_containers_cache_generation = 0
+
+
+# Listing entry per container id. Name, packages and creation time never
+# change for a given container, so once known they are served from here
+# and only ids missing from the map cost a Docker round trip. Entries are
+# dropped on delete/cleanup and, for containers removed behind our back,
+# by the events watcher below.
+_container_meta: Dict[str, ContainerResponse] = {}
+
+# Guards _container_meta, the list cache and its generation: threadpool
+# handlers and the events watcher thread change them as well as the loop.
+_meta_lock = threading.Lock()
+
+
+def _drop_list_cache_locked() -> None:
+    global _containers_cache, _containers_cache_generation
+    _containers_cache_generation += 1
+    _containers_cache = None
+
+
+def _invalidate_list_cache() -> None:
+    with _meta_lock:
+        _drop_list_cache_locked()
+
+
+def _remember_meta(container_id: str, entry: ContainerResponse) -> None:
+    with _meta_lock:
+        _container_meta[container_id] = entry
+
+
+def _forget_meta(container_id: str) -> None:
+    with _meta_lock:
+        _container_meta.pop(container_id, None)
+        _drop_list_cache_locked()
+
+
+def _forget_all_meta() -> None:
+    with _meta_lock:
+        _container_meta.clear()
+        _drop_list_cache_locked()
+
+
+def _watch_container_events() -> None:
+    """Drop metadata for managed containers as dockerd destroys them."""
+    backoff = 1
+    while True:
+        try:
+            events = docker_client.events(
+                decode=True,
+                filters={"type": "container", "event": "destroy",
+                         "label": "managed-by=supakiln"},
+            )
+            backoff = 1
+            for event in events:
+                container_id = event.get("id") or event.get("Actor", {}).get("ID")
+                if container_id:
+                    _forget_meta(container_id)
+        except Exception as e:
+            print(f"Container event stream interrupted: {e}")
+        # The stream ended or failed; anything destroyed meanwhile was
+        # missed, so start over from a clean map.
+        _forget_all_meta()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def start_event_watcher() -> None:
+    """Start the background thread that follows `docker events`."""
+    threading.Thread(
+        target=_watch_container_events, name="container-events", daemon=True
+    ).start()
 
 @router.post("", response_model=ContainerResponse)
-async def create_container(request: PackageInstallRequest):
+def create_container(request: PackageInstallRequest, db: Session = Depends(get_db)):
     """
     Create a new container with specified packages installed.
     Returns the container ID for future use.
     """
     try:
-        # Check if name is already in use
-        if request.name in container_names.values():
+        # Check if name is already in use. This only saves building an
+        # image for a name that's taken; record() below enforces it.
+        if container_registry.name_in_use(db, request.name):
             raise HTTPException(status_code=400, detail="Container name already exists")
         
-        package_hash = get_code_executor()._get_package_hash(request.packages)
-        image_tag = get_code_executor()._build_image(request.packages)
-        
-        # Create container if it doesn't exist
-        if package_hash not in get_code_executor().containers:
-            # Get network mode from environment variable (defaults to 'none' for security)
-            container_network_mode = os.environ.get('CONTAINER_NETWORK_MODE', 'none')
-            
-            container = docker_client.containers.run(
-                image_tag,
-                detach=True,
-                tty=True,
-                labels={"managed-by": "supakiln"},
-                mem_limit="512m",
-                cpu_period=100000,
-                cpu_quota=50000,
-                user="1000:1000",
-                network_mode=container_network_mode,  # Configurable network mode
-                cap_drop=["ALL"],  # Remove all capabilities
-                pids_limit=100  # Limit number of processes (keep reasonable limit)
-            )
-            get_code_executor().containers[package_hash] = container.id
-        
-        container_id = get_code_executor().containers[package_hash]
-        container_names[container_id] = request.name
-        
-        return ContainerResponse(
+        container_id, attrs = get_code_executor().package_container(request.packages)
+        created_at = (attrs or docker_client.api.inspect_container(container_id))['Created']
+        try:
+            container_registry.record(db, container_id, request.name, request.packages)
+        except container_registry.NameInUse:
+            raise HTTPException(status_code=400, detail="Container name already exists")
+        response = ContainerResponse(
             container_id=container_id,
             name=request.name,
             packages=request.packages,
-            created_at=container.attrs['Created']
+            created_at=created_at
         )
+        _remember_meta(container_id, response)
+        _invalidate_list_cache()
+        
+        return response
+    except HTTPException:
+        raise
     except docker.errors.ImageNotFound:
         raise HTTPException(
             status_code=500,
@@ -63,35 +131,101 @@ async def create_container(request: PackageInstallRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _packages_from_image(image_tag: str) -> List[str]:
+    """Extract the package list encoded in an image tag, if any."""
+    packages = []
+    if image_tag and ":" in image_tag:
+        tag_part = image_tag.split(":")[-1]
+        if tag_part and "," in tag_part:
+            packages = [pkg.strip() for pkg in tag_part.split(",") if pkg.strip()]
+        elif tag_part:
+            packages = [tag_part.strip()]
+    return packages
+
+
+def _created_iso(created) -> str:
+    """The list API reports `Created` as epoch seconds; inspect uses ISO."""
+    if isinstance(created, (int, float)):
+        return datetime.fromtimestamp(created, tz=timezone.utc).isoformat()
+    return created or ''
+
+
 @router.get("", response_model=List[ContainerResponse])
 async def list_containers():
     """
     List all active containers and their installed packages.
     """
-    containers = []
-    for package_hash, container_id in get_code_executor().containers.items():
-        try:
-            container = docker_client.containers.get(container_id)
-            # Extract packages from image tag safely
-            packages = []
-            if container.image.tags and len(container.image.tags) > 0:
-                image_tag = container.image.tags[0]
-                if ":" in image_tag:
-                    tag_part = image_tag.split(":")[-1]
-                    if tag_part and "," in tag_part:
-                        packages = [pkg.strip() for pkg in tag_part.split(",") if pkg.strip()]
-                    elif tag_part:
-                        packages = [tag_part.strip()]
-            
-            containers.append(ContainerResponse(
-                container_id=container_id,
-                name=container_names.get(container_id, "Unnamed"),
-                packages=packages,
-                created_at=container.attrs.get('Created', '')
-            ))
-        except Exception:
+    global _containers_cache
+    async with _containers_cache_lock:
+        with _meta_lock:
+            cached = _containers_cache
+            generation = _containers_cache_generation
+        if cached is not None and time.monotonic() - cached[0] < LIST_CACHE_TTL:
+            return list(cached[1])
+        containers = await _fetch_containers()
+        # Don't cache a listing that raced with a create/delete.
+        with _meta_lock:
+            if generation == _containers_cache_generation:
+                _containers_cache = (time.monotonic(), containers)
+        return list(containers)
+
+
+async def _fetch_containers() -> List[ContainerResponse]:
+    container_ids = list(get_code_executor().containers.values())
+    with _meta_lock:
+        missing = [cid for cid in container_ids if cid not in _container_meta]
+    if missing:
+        await _fetch_meta(missing)
+    # .get: the events watcher may have dropped an entry since the fetch.
+    with _meta_lock:
+        entries = [_container_meta.get(cid) for cid in container_ids]
+    return [entry for entry in entries if entry is not None]
+
+
+async def _fetch_meta(container_ids: List[str]) -> None:
+    """Describe `container_ids` from Docker and the registry into the meta map."""
+    # The registry lookup doesn't depend on Docker's answer; run it
+    # alongside the daemon calls rather than after them.
+    lookup = asyncio.ensure_future(run_in_threadpool(container_registry.lookup, container_ids))
+    # One list call filtered to our ids instead of an inspect per container.
+    try:
+        raw = await run_docker(
+            docker_client.api.containers, all=True, filters={"id": container_ids}
+        )
+        found = {
+            c["Id"]: (c.get("Image", ""), _created_iso(c.get("Created")))
+            for c in raw
+        }
+    except Exception:
+        results = await asyncio.gather(
+            *(run_docker(docker_client.api.inspect_container, cid) for cid in container_ids),
+            return_exceptions=True,
+        )
+        found = {}
+        for cid, attrs in zip(container_ids, results):
+            if isinstance(attrs, BaseException):
+                continue
+            found[cid] = (attrs.get('Config', {}).get('Image', ''), attrs.get('Created', ''))
+
+    named = await lookup
+
+    for container_id in container_ids:
+        if container_id not in found:
             continue
-    return containers
+        image_tag, created_at = found[container_id]
+        entry = named.get(container_id)
+        if entry is not None:
+            name = entry.name
+            packages = container_registry.split_packages(entry.packages)
+        else:
+            name = container_registry.UNNAMED
+            packages = _packages_from_image(image_tag)
+        _remember_meta(container_id, ContainerResponse(
+            container_id=container_id,
+            name=name,
+            packages=packages,
+            created_at=created_at
+        ))
 
 @router.get("/{container_id}", response_model=ContainerResponse)
 async def get_container(container_id: str):
@@ -99,62 +233,66 @@ async def get_container(container_id: str):
     Get details of a specific container including its code.
     """
     try:
-        if container_id not in get_code_executor().containers.values():
+        if container_id not in get_code_executor().containers_by_id:
             raise HTTPException(status_code=404, detail="Container not found")
         
-        container = docker_client.containers.get(container_id)
-        image_tag = container.image.tags[0]
-        packages = image_tag.split(":")[-1].split(",")
-        
-        # Try to get the code from the container
-        code = None
-        try:
-            result = container.exec_run("cat /tmp/code.py")
-            if result.exit_code == 0:
-                code = result.output.decode()
-        except Exception:
-            pass
+        # Name, packages and creation time come from the listing map;
+        # only a container not described yet costs a daemon round trip,
+        # and that one overlaps the read of its code.
+        if container_id in _container_meta:
+            code = await _read_code(container_id)
+        else:
+            _, code = await asyncio.gather(_fetch_meta([container_id]), _read_code(container_id))
+        meta = _container_meta.get(container_id)
+        if meta is None:
+            raise HTTPException(status_code=404, detail="Container not found")
         
-        return ContainerResponse(
-            container_id=container_id,
-            name=container_names.get(container_id, "Unnamed"),
-            packages=packages,
-            created_at=container.attrs['Created'],
-            code=code
-        )
+        return meta.model_copy(update={"code": code})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+async def _read_code(container_id: str) -> Optional[str]:
+    """The last code submitted to the container, if it has any."""
+    try:
+        exit_code, output = await run_docker(exec_output, container_id, ["cat", "/tmp/code.py"])
+    except Exception:
+        return None
+    return output.decode() if exit_code == 0 else None
+
 @router.delete("/{container_id}")
-async def delete_container(container_id: str):
+def delete_container(container_id: str, db: Session = Depends(get_db)):
     """
     Delete a specific container.
     """
     try:
-        if container_id in get_code_executor().containers.values():
-            container = docker_client.containers.get(container_id)
-            container.stop()
-            container.remove()
-            # Remove from our tracking
-            for package_hash, cid in list(get_code_executor().containers.items()):
-                if cid == container_id:
-                    del get_code_executor().containers[package_hash]
+        if container_id in get_code_executor().containers_by_id:
+            docker_client.api.stop(container_id)
+            docker_client.api.remove_container(container_id)
+            # Remove from our tracking. The image is now unused and may be
+            # pruned, so stop treating it as known-built.
+            package_hash = get_code_executor().untrack_container(container_id)
+            if package_hash is not None:
+                get_code_executor().forget_images(package_hash)
             # Remove from names
-            if container_id in container_names:
-                del container_names[container_id]
+            container_registry.forget(db, container_id)
+            _forget_meta(container_id)
             return {"message": f"Container {container_id} deleted successfully"}
         raise HTTPException(status_code=404, detail="Container not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("")
-async def cleanup_all():
+def cleanup_all(db: Session = Depends(get_db)):
     """
     Clean up all containers.
     """
     try:
         get_code_executor().cleanup()
-        container_names.clear()
+        container_registry.forget_all(db)
+        _forget_all_meta()
         return {"message": "All containers cleaned up successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
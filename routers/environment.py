@@ -1,37 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from models.schemas import EnvVarRequest, EnvVarResponse, EnvVarMetadata
 from models import EnvironmentVariable, User
-from database import get_db
-from env_manager import EnvironmentManager
+from database import get_async_db
+from env_manager import get_env_manager
 from auth import current_user
-import os
 
 router = APIRouter(prefix="/env", tags=["environment"])
 
 
-def get_env_manager():
-    """Get environment manager instance."""
-    from models import SessionLocal
-    db = SessionLocal()
-    try:
-        # Try to load existing key
-        if os.path.exists('.env_key'):
-            with open('.env_key', 'rb') as key_file:
-                key = key_file.read()
-        else:
-            key = None
-        env_manager = EnvironmentManager(db, key)
-        return env_manager
-    finally:
-        db.close()
-
-
 @router.post("", response_model=EnvVarResponse)
 async def set_environment_variable(
     request: EnvVarRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Set one of the caller's encrypted environment variables.
@@ -39,34 +23,36 @@ async def set_environment_variable(
     Each user has their own namespace — the same `name` can exist for
     several users and will resolve independently.
     """
+    # Fernet encryption and the manager's own session are blocking work;
+    # run them on the threadpool like the other env var handlers.
     manager = get_env_manager()
-    manager.set_variable(
+    await run_in_threadpool(
+        manager.set_variable,
         request.name, request.value,
         owner_user_id=user.id, description=request.description,
     )
-    var = db.query(EnvironmentVariable).filter(
-        EnvironmentVariable.name == request.name,
-        EnvironmentVariable.owner_user_id == user.id,
-    ).first()
-    return EnvVarResponse(
-        name=var.name,
-        created_at=var.created_at.isoformat(),
-        updated_at=var.updated_at.isoformat(),
-    )
+    var = (await db.execute(
+        select(EnvironmentVariable).where(
+            EnvironmentVariable.name == request.name,
+            EnvironmentVariable.owner_user_id == user.id,
+        )
+    )).scalars().first()
+    # Validated once by the response model; see routers/jobs.py.
+    return var
 
 
 @router.get("", response_model=List[str])
 async def list_environment_variables(user: User = Depends(current_user)):
     """List names of the caller's environment variables."""
     manager = get_env_manager()
-    return manager.list_variables(owner_user_id=user.id)
+    return await run_in_threadpool(manager.list_variables, owner_user_id=user.id)
 
 
 @router.get("/metadata", response_model=List[EnvVarMetadata])
 async def list_environment_variable_metadata(user: User = Depends(current_user)):
     """List metadata for the caller's environment variables."""
     manager = get_env_manager()
-    return manager.list_variables_with_metadata(owner_user_id=user.id)
+    return await run_in_threadpool(manager.list_variables_with_metadata, owner_user_id=user.id)
 
 
 @router.get("/metadata/{name}", response_model=EnvVarMetadata)
@@ -76,7 +62,7 @@ async def get_environment_variable_metadata(
 ):
     """Get metadata of a specific env var (no value)."""
     manager = get_env_manager()
-    metadata = manager.get_variable_metadata(name, owner_user_id=user.id)
+    metadata = await run_in_threadpool(manager.get_variable_metadata, name, owner_user_id=user.id)
     if metadata is None:
         raise HTTPException(status_code=404, detail="Environment variable not found")
     return metadata
@@ -89,7 +75,7 @@ async def get_environment_variable(
 ):
     """Get the decrypted value of the caller's env var by name."""
     manager = get_env_manager()
-    value = manager.get_variable(name, owner_user_id=user.id)
+    value = await run_in_threadpool(manager.get_variable, name, owner_user_id=user.id)
     if value is None:
         raise HTTPException(status_code=404, detail="Environment variable not found")
     return {"name": name, "value": value}
@@ -102,6 +88,6 @@ async def delete_environment_variable(
 ):
     """Delete one of the caller's env vars."""
     manager = get_env_manager()
-    if not manager.delete_variable(name, owner_user_id=user.id):
+    if not await run_in_threadpool(manager.delete_variable, name, owner_user_id=user.id):
         raise HTTPException(status_code=404, detail="Environment variable not found")
     return {"message": f"Environment variable {name} deleted successfully"}
@@ -1,45 +1,48 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.concurrency import run_in_threadpool
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import socket
 import time
-import base64
 from datetime import datetime
 import docker
+from docker.utils.socket import STDERR, frames_iter
 from models.schemas import CodeExecutionRequest
-from models import ScheduledJob, ExecutionLog, User
-from database import get_db
-from services.docker_client import docker_client
-from code_executor import CodeExecutor
-from env_manager import EnvironmentManager
+from models import ScheduledJob, User
+from database import get_async_db
+from services.docker_client import docker_client, exec_output, run_docker, start_docker_exec, tar_archive
+from env_manager import get_env_manager
 from services.code_executor_service import get_code_executor
+from services import container_registry, log_writer
 from auth import current_user
-import os
+from settings import env_int
+from typing import Optional
 
 router = APIRouter(tags=["execution"])
 
-# Container names (should be shared with containers router, but for now duplicated)
-container_names = {}  # container_id -> name
+# Upper bound on stdout+stderr read back from a legacy container exec.
+MAX_OUTPUT_BYTES = env_int("SUPAKILN_MAX_OUTPUT_BYTES", 1 << 20)
 
-def get_env_manager():
-    """Get environment manager instance."""
-    from models import SessionLocal
-    db = SessionLocal()
-    try:
-        # Try to load existing key
-        if os.path.exists('.env_key'):
-            with open('.env_key', 'rb') as key_file:
-                key = key_file.read()
-        else:
-            key = None
-        env_manager = EnvironmentManager(db, key)
-        return env_manager
-    finally:
-        db.close()
+# `timeout -s KILL` exits 128 + SIGKILL when the deadline fires.
+TIMEOUT_KILLED_EXIT_CODE = 137
+# How long past the deadline to keep waiting for the exec stream to close.
+EXEC_DEADLINE_GRACE = 2
+
+def _cap_text(text: Optional[str]) -> Optional[str]:
+    """Trim a log column to MAX_OUTPUT_BYTES, marking the cut."""
+    if text is None or len(text) <= MAX_OUTPUT_BYTES:
+        return text
+    return text[:MAX_OUTPUT_BYTES] + f"\n--- Truncated at {MAX_OUTPUT_BYTES} characters ---"
+
+def _persist_log(values: dict) -> None:
+    """Cap the output columns and queue the row for the batched log writer."""
+    for column in ("output", "error"):
+        values[column] = _cap_text(values.get(column))
+    log_writer.submit(values)
 
 @router.post("/execute-web-service", summary="Start a Python web service")
 async def execute_web_service(
     request: CodeExecutionRequest,
-    db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
     """Execute Python code and detect if it's a web framework (Streamlit,
@@ -51,6 +54,7 @@ async def execute_web_service(
     snippets; use this endpoint (or `POST /services`) for web apps.
     """
     start_time = time.time()
+    started_at = datetime.utcnow()
     try:
         if not request.code:
             raise HTTPException(status_code=400, detail="Code is required")
@@ -60,7 +64,7 @@ async def execute_web_service(
 
         # Get environment variables scoped to the caller
         env_manager = get_env_manager()
-        env_vars = env_manager.get_all_variables(owner_user_id=user.id)
+        env_vars = await env_manager.get_all_variables_async(owner_user_id=user.id)
 
         # `execute_code` is sync and blocking (talks to the worker over
         # HTTP with `requests`). Dispatch it to a threadpool so the
@@ -77,45 +81,44 @@ async def execute_web_service(
 
         # Log the execution
         container_id = result.get("container_id")
-        log = ExecutionLog(
-            job_id=request.job_id if hasattr(request, 'job_id') else None,
+        log_values = dict(
+            job_id=request.job_id,
             owner_user_id=user.id,
             code=request.code,
             output=result.get("output"),
             error=result.get("error"),
             container_id=container_id,
             execution_time=time.time() - start_time,
-            started_at=datetime.utcnow(),
+            started_at=started_at,
             status="success" if result.get("success") else "error"
         )
-        db.add(log)
-        db.commit()
 
         # Cap-induced failure surfaces as HTTP 429 / 503 so clients can
         # back off and retry rather than treating it as a 500.
         if result.get("http_status"):
+            _persist_log(log_values)
             raise HTTPException(
                 status_code=result["http_status"],
                 detail=result.get("error") or "capacity exceeded",
             )
 
+        _persist_log(log_values)
         return result
 
     except Exception as e:
         error_msg = str(e) if str(e) else f"Unknown error: {type(e).__name__}"
 
         try:
-            log = ExecutionLog(
-                job_id=getattr(request, 'job_id', None) if 'request' in locals() else None,
+            log_values = dict(
+                job_id=request.job_id,
                 owner_user_id=user.id,
-                code=getattr(request, 'code', None) if 'request' in locals() else None,
+                code=request.code,
                 error=error_msg,
                 execution_time=time.time() - start_time,
-                started_at=datetime.utcnow(),
+                started_at=started_at,
                 status="error"
             )
-            db.add(log)
-            db.commit()
+            _persist_log(log_values)
         except Exception as log_error:
             print(f"Failed to log error: {log_error}")
             print(f"Original error: {error_msg}")
@@ -125,7 +128,7 @@ async def execute_web_service(
 @router.post("/execute", summary="Run code in the selected runtime")
 async def execute_code(
     request: CodeExecutionRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Execute a snippet in an isolated Docker container.
@@ -159,10 +162,13 @@ async def execute_code(
     Returns `400` if the language isn't registered; `500` on other failures.
     """
     start_time = time.time()
+    started_at = datetime.utcnow()
     try:
         # If code is not provided in request but we have a job_id, get code from the job
-        if not request.code and hasattr(request, 'job_id'):
-            job = db.query(ScheduledJob).filter(ScheduledJob.id == request.job_id).first()
+        if not request.code and request.job_id is not None:
+            job = await db.get(ScheduledJob, request.job_id)
+            # Don't hold the pooled connection through the execution.
+            await db.close()
             if job and (user.is_admin or job.owner_user_id == user.id):
                 request.code = job.code
             else:
@@ -173,80 +179,107 @@ async def execute_code(
 
         if request.container_id:
             # Verify container exists
-            if request.container_id not in get_code_executor().containers.values():
+            if request.container_id not in get_code_executor().containers_by_id:
                 raise HTTPException(status_code=404, detail="Container not found")
 
-            # Execute in existing container
-            try:
-                container = docker_client.containers.get(request.container_id)
-            except docker.errors.NotFound:
-                raise HTTPException(status_code=404, detail="Container not found in Docker")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error accessing container: {str(e)}")
+            # Execute in existing container. Everything below addresses it
+            # by id; there's no need to inspect it into a Container first.
+            container_id = request.container_id
 
             # Get environment variables scoped to the caller
             env_manager = get_env_manager()
-            env_vars = env_manager.get_all_variables(owner_user_id=user.id)
+            env_vars = await env_manager.get_all_variables_async(owner_user_id=user.id)
 
-            # Encode the code in base64
-            encoded_code = base64.b64encode(request.code.encode()).decode()
+            # The program itself is piped to `python3 -` on the exec's
+            # stdin below; no per-run file to write and delete afterwards.
+            # code.py only keeps the latest submission around for
+            # GET /containers/{id}.
+            code_bytes = request.code.encode()
+            try:
+                await run_docker(
+                    docker_client.api.put_archive,
+                    container_id,
+                    "/tmp",
+                    tar_archive({"code.py": code_bytes}),
+                )
+            except docker.errors.NotFound:
+                raise HTTPException(status_code=404, detail="Container not found in Docker")
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error copying code into container: {str(e)}")
 
             # Execute with streaming output and timeout handling
             output_buffer = []
             error_buffer = []
             success = False
             timed_out = False
-
-            import threading
-            import signal
+            timeout_seconds = request.timeout or 30
 
             def collect_output():
                 nonlocal success, timed_out
                 try:
-                    # Execute without streaming first to get exit code properly
-                    result = container.exec_run(
-                        f"python -c 'import base64; exec(base64.b64decode(\"{encoded_code}\").decode())'",
+                    # The deadline is enforced inside the container by
+                    # coreutils `timeout`, so the program is SIGKILLed on
+                    # time even if this thread or the API goes away.
+                    # Stream the exec so a program that prints without bound
+                    # can't balloon the API's memory: stop keeping output
+                    # once the combined output reaches MAX_OUTPUT_BYTES.
+                    started = time.monotonic()
+                    exec_id = docker_client.api.exec_create(
+                        container_id,
+                        ["timeout", "-s", "KILL", str(timeout_seconds), "python3", "-"],
                         environment=env_vars,
-                        stream=False,  # Don't stream to get proper exit code
-                        demux=True    # Separate stdout and stderr
-                    )
-
-                    # Process the output
-                    if result.output:
-                        stdout_data, stderr_data = result.output
-                        if stdout_data:
-                            output_buffer.append(stdout_data.decode('utf-8', errors='replace'))
-                        if stderr_data:
-                            error_buffer.append(stderr_data.decode('utf-8', errors='replace'))
-
-                    # Now we can reliably check the exit code
-                    success = result.exit_code == 0
+                        stdin=True,
+                    )["Id"]
+                    sock = docker_client.api.exec_start(exec_id, socket=True)
+                    stdout_buf = bytearray()
+                    stderr_buf = bytearray()
+                    truncated = False
+                    try:
+                        # python reads the whole program before running
+                        # it, so writing it all up front can't deadlock
+                        # against the output side.
+                        raw = getattr(sock, "_sock", sock)
+                        raw.sendall(code_bytes)
+                        raw.shutdown(socket.SHUT_WR)
+                        for stream_id, chunk in frames_iter(sock, tty=False):
+                            if truncated:
+                                # Keep draining so the program isn't blocked
+                                # on a full pipe, but drop what it writes.
+                                continue
+                            if stream_id == STDERR:
+                                stderr_buf += chunk
+                            else:
+                                stdout_buf += chunk
+                            if len(stdout_buf) + len(stderr_buf) >= MAX_OUTPUT_BYTES:
+                                truncated = True
+                    finally:
+                        sock.close()
+
+                    if stdout_buf:
+                        output_buffer.append(stdout_buf[:MAX_OUTPUT_BYTES].decode('utf-8', errors='replace'))
+                    if stderr_buf:
+                        error_buffer.append(stderr_buf[:MAX_OUTPUT_BYTES].decode('utf-8', errors='replace'))
+                    if truncated:
+                        output_buffer.append(f"\n--- Output truncated at {MAX_OUTPUT_BYTES} bytes ---")
+
+                    exit_code = docker_client.api.exec_inspect(exec_id).get("ExitCode")
+                    success = exit_code == 0 and not truncated
+                    if exit_code == TIMEOUT_KILLED_EXIT_CODE and time.monotonic() - started >= timeout_seconds:
+                        timed_out = True
 
                 except Exception as e:
                     error_buffer.append(f"Execution error: {str(e)}")
                     success = False
 
-            # Start output collection in a separate thread
-            output_thread = threading.Thread(target=collect_output)
-            output_thread.daemon = True
-            output_thread.start()
-
-            # Wait for completion or timeout
-            timeout_seconds = request.timeout or 30
-            output_thread.join(timeout_seconds)
-
-            if output_thread.is_alive():
-                # Thread is still running, so we timed out
+            # Run the exec on the threadpool, queued behind the exec cap.
+            # The in-container timeout does the killing; wait_for only
+            # stops this request waiting on a stream that hasn't closed
+            # shortly after the deadline.
+            exec_task = await start_docker_exec(collect_output)
+            try:
+                await asyncio.wait_for(asyncio.shield(exec_task), timeout_seconds + EXEC_DEADLINE_GRACE)
+            except asyncio.TimeoutError:
                 timed_out = True
-                # Try to stop the execution in the container
-                try:
-                    # Kill the process in the container
-                    container.exec_run("pkill -f python", detach=True)
-                except:
-                    pass
-
-                # Give it a moment to clean up
-                output_thread.join(1)
 
             # Combine output
             combined_output = ''.join(output_buffer) if output_buffer else None
@@ -264,26 +297,25 @@ async def execute_code(
                 success = False
 
             # Log the execution
-            log = ExecutionLog(
-                job_id=request.job_id if hasattr(request, 'job_id') else None,
+            log_values = dict(
+                job_id=request.job_id,
                 owner_user_id=user.id,
                 code=request.code,
                 output=combined_output,
                 error=combined_error,
                 container_id=request.container_id,
                 execution_time=time.time() - start_time,
-                started_at=datetime.utcnow(),
-                status="success" if success and not timed_out else "error"
+                started_at=started_at,
+                status="timeout" if timed_out else ("success" if success else "error")
             )
-            db.add(log)
-            db.commit()
+            _persist_log(log_values)
 
             return {
                 "success": success and not timed_out,
                 "output": combined_output,
                 "error": combined_error,
                 "container_id": request.container_id,
-                "container_name": container_names.get(request.container_id, "Unnamed"),
+                "container_name": await run_in_threadpool(container_registry.name_for, request.container_id),
                 "timed_out": timed_out
             }
         else:
@@ -305,7 +337,7 @@ async def execute_code(
 
             # Get environment variables scoped to the caller
             env_manager = get_env_manager()
-            env_vars = env_manager.get_all_variables(owner_user_id=user.id)
+            env_vars = await env_manager.get_all_variables_async(owner_user_id=user.id)
 
             # Offload the blocking executor call so concurrent /execute
             # requests don't serialize on the asyncio event loop.
@@ -321,35 +353,42 @@ async def execute_code(
 
             # Log the execution
             container_id = result.get("container_id")
-            log = ExecutionLog(
-                job_id=request.job_id if hasattr(request, 'job_id') else None,
+            log_values = dict(
+                job_id=request.job_id,
                 owner_user_id=user.id,
                 code=request.code,
                 output=result.get("output"),
                 error=result.get("error"),
                 container_id=container_id,
                 execution_time=time.time() - start_time,
-                started_at=datetime.utcnow(),
+                started_at=started_at,
                 status="success" if result.get("success") else "error"
             )
-            db.add(log)
-            db.commit()
 
             # Cap-induced failure surfaces as HTTP 429 / 503 so clients
             # can back off and retry rather than treating it as a 500.
             if result.get("http_status"):
+                _persist_log(log_values)
                 raise HTTPException(
                     status_code=result["http_status"],
                     detail=result.get("error") or "capacity exceeded",
                 )
 
+            _persist_log(log_values)
+
+            # Only legacy containers can carry a name; worker containers
+            # never do, so skip the lookup for them.
+            container_name = container_registry.UNNAMED
+            if container_id in get_code_executor().containers_by_id:
+                container_name = await run_in_threadpool(container_registry.name_for, container_id)
+
             # Return the result from CodeExecutor with additional info
             response = {
                 "success": result.get("success"),
                 "output": result.get("output"),
                 "error": result.get("error"),
                 "container_id": container_id,
-                "container_name": container_names.get(container_id, "Unnamed")
+                "container_name": container_name
             }
 
             # Include web service info if available
@@ -370,17 +409,16 @@ async def execute_code(
 
         # Log the error with safe attribute access
         try:
-            log = ExecutionLog(
-                job_id=getattr(request, 'job_id', None) if 'request' in locals() else None,
+            log_values = dict(
+                job_id=request.job_id,
                 owner_user_id=user.id,
-                code=getattr(request, 'code', None) if 'request' in locals() else None,
+                code=request.code,
                 error=error_msg,
                 execution_time=time.time() - start_time,
-                started_at=datetime.utcnow(),
+                started_at=started_at,
                 status="error"
             )
-            db.add(log)
-            db.commit()
+            _persist_log(log_values)
         except Exception as log_error:
             # If logging fails, at least print the error
             print(f"Failed to log error: {log_error}")
@@ -414,34 +452,61 @@ async def list_languages():
     return {"languages": names, "runtimes": runtimes}
 
 
+def _ports_from_list_entry(entry: dict) -> dict:
+    """Reshape the list API's `Ports` array into `container.ports` form."""
+    ports = {}
+    for p in entry.get("Ports") or []:
+        key = f"{p.get('PrivatePort')}/{p.get('Type', 'tcp')}"
+        if "PublicPort" not in p:
+            ports.setdefault(key, None)
+            continue
+        if ports.get(key) is None:
+            ports[key] = []
+        ports[key].append({"HostIp": p.get("IP", ""), "HostPort": str(p["PublicPort"])})
+    return ports
+
+
+def _describe_containers(executor) -> list:
+    """Describe every tracked container from a single list call."""
+    tracked = list(executor.containers.items())
+    listed = docker_client.api.containers(
+        all=True, filters={"id": [cid for _, cid in tracked]}
+    ) if tracked else []
+    by_id = {c["Id"]: c for c in listed}
+
+    containers_info = []
+    for package_hash, container_id in tracked:
+        entry = by_id.get(container_id)
+        if entry is None:
+            containers_info.append({
+                "package_hash": package_hash,
+                "container_id": container_id,
+                "error": f"No such container: {container_id}"
+            })
+            continue
+        containers_info.append({
+            "package_hash": package_hash,
+            "container_id": container_id,
+            "container_short_id": container_id[:8],
+            "status": entry.get("State"),
+            "image": entry.get("Image") or "unknown",
+            "ports": _ports_from_list_entry(entry),
+            "is_web_service": container_id in executor.web_service_containers
+        })
+    return containers_info
+
+
 @router.get("/debug/containers")
 async def debug_containers():
     """
     Debug endpoint to list all containers and web services.
     """
     try:
-        containers_info = []
-        for package_hash, container_id in get_code_executor().containers.items():
-            try:
-                container = docker_client.containers.get(container_id)
-                containers_info.append({
-                    "package_hash": package_hash,
-                    "container_id": container_id,
-                    "container_short_id": container_id[:8],
-                    "status": container.status,
-                    "image": container.image.tags[0] if container.image.tags else "unknown",
-                    "ports": container.ports,
-                    "is_web_service": container_id in get_code_executor().web_service_containers
-                })
-            except Exception as e:
-                containers_info.append({
-                    "package_hash": package_hash,
-                    "container_id": container_id,
-                    "error": str(e)
-                })
+        executor = get_code_executor()
+        containers_info = await run_docker(_describe_containers, executor)
 
         web_services_info = []
-        for container_id, service_info in get_code_executor().web_service_containers.items():
+        for container_id, service_info in executor.web_service_containers.items():
             web_services_info.append({
                 "container_id": container_id,
                 "container_short_id": container_id[:8],
@@ -454,49 +519,65 @@ async def debug_containers():
         return {
             "containers": containers_info,
             "web_services": web_services_info,
-            "total_containers": len(get_code_executor().containers),
-            "total_web_services": len(get_code_executor().web_service_containers)
+            "total_containers": len(executor.containers),
+            "total_web_services": len(executor.web_service_containers)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Debug error: {str(e)}")
 
+def _read_container_logs(container_id: str, is_web_service: bool):
+    """Fetch the container log tail and, for web services, /tmp/service.log."""
+    # Get container logs
+    logs = docker_client.api.logs(container_id, tail=50).decode('utf-8', errors='replace')
+
+    # If it's a web service, also try to get the service log
+    service_log = ""
+    if is_web_service:
+        try:
+            # Only the tail: a long-running service's log grows without
+            # bound, and cat would pull all of it through the daemon and
+            # into memory on every call.
+            exit_code, output = exec_output(
+                container_id, ["tail", "-c", str(MAX_OUTPUT_BYTES), "/tmp/service.log"]
+            )
+            if exit_code == 0:
+                service_log = output.decode('utf-8', errors='replace')
+        except Exception as e:
+            service_log = f"Error reading service log: {e}"
+    return logs, service_log
+
+
 @router.get("/debug/container/{container_id}/logs")
 async def get_container_logs(container_id: str):
     """
     Get logs from a specific container to debug service issues.
     """
     try:
-        # Find the full container ID
-        full_container_id = None
-        for stored_id in get_code_executor().containers.values():
-            if stored_id.startswith(container_id) or stored_id == container_id:
-                full_container_id = stored_id
-                break
+        executor = get_code_executor()
+        # Full ids hit the reverse index directly; only a short id
+        # needs the prefix scan.
+        if container_id in executor.containers_by_id:
+            full_container_id = container_id
+        else:
+            full_container_id = next(
+                (cid for cid in list(executor.containers_by_id) if cid.startswith(container_id)),
+                None,
+            )
 
         if not full_container_id:
             raise HTTPException(status_code=404, detail="Container not found")
 
-        container = docker_client.containers.get(full_container_id)
-
-        # Get container logs
-        logs = container.logs(tail=50).decode('utf-8', errors='replace')
-
-        # If it's a web service, also try to get the service log
-        service_log = ""
-        if full_container_id in get_code_executor().web_service_containers:
-            try:
-                result = container.exec_run("cat /tmp/service.log", demux=False)
-                if result.exit_code == 0:
-                    service_log = result.output.decode('utf-8', errors='replace')
-            except Exception as e:
-                service_log = f"Error reading service log: {e}"
+        is_web_service = full_container_id in executor.web_service_containers
+        logs, service_log = await run_docker(
+            _read_container_logs, full_container_id, is_web_service
+        )
 
         return {
             "container_id": full_container_id,
             "container_short_id": full_container_id[:8],
             "container_logs": logs,
             "service_log": service_log,
-            "is_web_service": full_container_id in get_code_executor().web_service_containers
+            "is_web_service": is_web_service
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting logs: {str(e)}")
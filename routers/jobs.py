@@ -1,12 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 from models.schemas import ScheduledJobRequest, ScheduledJobResponse
 from models import ScheduledJob, User
-from database import get_db
-from scheduler import scheduler
+from database import get_db, get_async_db
+from scheduler import get_scheduler
 from auth import current_user
+from services.code_executor_service import schedule_prebuild
 import languages as lang_registry
 
 router = APIRouter(prefix="/jobs", tags=["scheduled-jobs"])
@@ -25,22 +28,6 @@ def _validate_language(name: str) -> str:
         )
 
 
-def _job_to_response(job: ScheduledJob) -> dict:
-    return {
-        "id": job.id,
-        "name": job.name,
-        "code": job.code,
-        "cron_expression": job.cron_expression,
-        "packages": job.packages,
-        "container_id": job.container_id,
-        "created_at": job.created_at.isoformat(),
-        "last_run": job.last_run.isoformat() if job.last_run else None,
-        "is_active": bool(job.is_active),
-        "timeout": job.timeout,
-        "language": getattr(job, "language", None) or "python",
-    }
-
-
 def _scoped(db: Session, user: User):
     """Return a query filtered to rows the user can see.
 
@@ -52,10 +39,18 @@ def _scoped(db: Session, user: User):
     return q
 
 
+def _scoped_select(user: User):
+    """`_scoped` for AsyncSession callers."""
+    stmt = select(ScheduledJob)
+    if not user.is_admin:
+        stmt = stmt.where(ScheduledJob.owner_user_id == user.id)
+    return stmt
+
+
 @router.post("", response_model=ScheduledJobResponse)
 async def create_scheduled_job(
     request: ScheduledJobRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Create a new scheduled job."""
@@ -74,88 +69,101 @@ async def create_scheduled_job(
             owner_user_id=user.id,
         )
         db.add(db_job)
-        db.commit()
-        db.refresh(db_job)
+        await db.commit()
+        await db.refresh(db_job)
 
-        # The scheduler will pick up the new job through load_existing_jobs
-        scheduler.load_existing_jobs()
+        # Register just this job; load_existing_jobs is for startup.
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            scheduler.schedule_job(db_job)
+        schedule_prebuild(request.packages, language)
 
-        return _job_to_response(db_job)
+        return db_job
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("", response_model=List[ScheduledJobResponse])
 async def list_scheduled_jobs(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """List scheduled jobs owned by the caller (admins see all)."""
-    jobs = _scoped(db, user).all()
-    return [_job_to_response(job) for job in jobs]
+    # Rows go straight to the response model (from_attributes): FastAPI
+    # validates them once, where a model built here would be dumped back
+    # to a dict and validated a second time.
+    return (await db.execute(_scoped_select(user))).scalars().all()
 
 
 @router.get("/{job_id}", response_model=ScheduledJobResponse)
 async def get_scheduled_job(
     job_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Get a specific scheduled job."""
-    job = _scoped(db, user).filter(ScheduledJob.id == job_id).first()
-    if not job:
+    job = await db.get(ScheduledJob, job_id)
+    if not job or not (user.is_admin or job.owner_user_id == user.id):
         raise HTTPException(status_code=404, detail="Job not found")
-    return _job_to_response(job)
+    return job
 
 
 @router.put("/{job_id}", response_model=ScheduledJobResponse)
-async def update_scheduled_job(
+def update_scheduled_job(
     job_id: int,
     request: ScheduledJobRequest,
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
-    """Update a scheduled job."""
+    """Update a scheduled job.
+
+    The row is written here; the schedule only changes if this process
+    runs the scheduler (see scheduler.get_scheduler).
+    """
     language = _validate_language(request.language)
-    # Verify ownership before letting the scheduler update anything.
-    existing = _scoped(db, user).filter(ScheduledJob.id == job_id).first()
-    if not existing:
+    job = _scoped(db, user).filter(ScheduledJob.id == job_id).first()
+    if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     try:
-        job = scheduler.update_job(
-            job_id,
-            name=request.name,
-            code=request.code,
-            cron_expression=request.cron_expression,
-            container_id=request.container_id,
-            packages=','.join(request.packages) if request.packages else None,
-            timeout=request.timeout,
-            language=language,
-        )
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
-        return _job_to_response(job)
-    except HTTPException:
-        raise
+        job.name = request.name
+        job.code = request.code
+        job.cron_expression = request.cron_expression
+        job.container_id = request.container_id
+        job.packages = ','.join(request.packages) if request.packages else None
+        job.timeout = request.timeout
+        job.language = language
+        db.commit()
+        db.refresh(job)
+
+        scheduler = get_scheduler()
+        if scheduler is not None and job.is_active:
+            scheduler.schedule_job(job)
+        return job
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/{job_id}")
-async def delete_scheduled_job(
+def delete_scheduled_job(
     job_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(current_user),
 ):
     """Delete a scheduled job."""
-    existing = _scoped(db, user).filter(ScheduledJob.id == job_id).first()
-    if not existing:
+    job = _scoped(db, user).filter(ScheduledJob.id == job_id).first()
+    if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     try:
-        scheduler.delete_job(job_id)
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            scheduler.unschedule_job(job.id)
+        db.delete(job)
+        db.commit()
         return {"message": "Job deleted successfully"}
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
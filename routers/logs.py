@@ -1,79 +1,112 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import datetime
 from models.schemas import ExecutionLogResponse
 from models import ExecutionLog, User
-from database import get_db
+from database import get_async_db
 from auth import current_user
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
 
-def _scoped(db: Session, user: User):
-    q = db.query(ExecutionLog)
+# Small per-row columns, enough for a listing.
+_SUMMARY_COLUMNS = (
+    ExecutionLog.id,
+    ExecutionLog.job_id,
+    ExecutionLog.webhook_job_id,
+    ExecutionLog.container_id,
+    ExecutionLog.execution_time,
+    ExecutionLog.started_at,
+    ExecutionLog.status,
+)
+# The unbounded text bodies; several KB to a MB per row.
+_BODY_COLUMNS = (
+    ExecutionLog.code,
+    ExecutionLog.output,
+    ExecutionLog.error,
+    ExecutionLog.request_data,
+    ExecutionLog.response_data,
+)
+
+
+def _scoped(user: User, include_bodies: bool = True):
+    columns = _SUMMARY_COLUMNS + _BODY_COLUMNS if include_bodies else _SUMMARY_COLUMNS
+    stmt = select(*columns)
     if not user.is_admin:
-        q = q.filter(ExecutionLog.owner_user_id == user.id)
-    return q
+        stmt = stmt.where(ExecutionLog.owner_user_id == user.id)
+    return stmt
 
 
 @router.get("", response_model=List[ExecutionLogResponse])
 async def get_execution_logs(
     job_id: Optional[int] = None,
     webhook_job_id: Optional[int] = None,
-    limit: int = 100,
-    offset: int = 0,
-    db: Session = Depends(get_db),
+    # The Logs page computes its stats panel from the latest 1000 rows.
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    after_started_at: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    include_bodies: bool = True,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
-    """Get execution logs the caller owns (admins see all)."""
-    query = _scoped(db, user)
+    """Get execution logs the caller owns (admins see all), newest first.
+
+    For deep paging pass the `id` of the last row seen as `after_id` (and
+    optionally its `started_at` as `after_started_at`); each page is then
+    an index seek rather than an OFFSET scan. `offset` still works for
+    shallow pages. An `after_id` alone that names no visible log (e.g.
+    one deleted since) is a 404; passing `after_started_at` as well
+    keeps paging past a deleted row.
+
+    `include_bodies=false` leaves out code, output, error and the
+    webhook request/response data, which dominate the page size; fetch
+    `GET /logs/{id}` for a single row's bodies.
+    """
+    # Plain column rows, not ORM instances: a read-only list doesn't need
+    # the identity map or attribute instrumentation.
+    stmt = _scoped(user, include_bodies)
     if job_id is not None:
-        query = query.filter(ExecutionLog.job_id == job_id)
+        stmt = stmt.where(ExecutionLog.job_id == job_id)
     if webhook_job_id is not None:
-        query = query.filter(ExecutionLog.webhook_job_id == webhook_job_id)
-    logs = query.order_by(ExecutionLog.started_at.desc()).offset(offset).limit(limit).all()
+        stmt = stmt.where(ExecutionLog.webhook_job_id == webhook_job_id)
+    if after_id is not None:
+        if after_started_at is None:
+            # Look up the cursor row's started_at (a primary-key read) so
+            # clients only need to keep the id. A cursor that matched
+            # nothing would otherwise read as the end of the logs.
+            cursor = select(ExecutionLog.started_at).where(ExecutionLog.id == after_id)
+            if not user.is_admin:
+                cursor = cursor.where(ExecutionLog.owner_user_id == user.id)
+            after_started_at = (await db.execute(cursor)).scalar()
+            if after_started_at is None:
+                raise HTTPException(status_code=404, detail="after_id log not found")
+        stmt = stmt.where(
+            tuple_(ExecutionLog.started_at, ExecutionLog.id) < tuple_(after_started_at, after_id)
+        )
+    elif after_started_at is not None:
+        stmt = stmt.where(ExecutionLog.started_at < after_started_at)
+    stmt = stmt.order_by(ExecutionLog.started_at.desc(), ExecutionLog.id.desc())
+    if offset:
+        stmt = stmt.offset(offset)
+    rows = await db.execute(stmt.limit(limit))
 
-    return [
-        {
-            "id": log.id,
-            "job_id": log.job_id,
-            "webhook_job_id": log.webhook_job_id,
-            "code": log.code,
-            "output": log.output,
-            "error": log.error,
-            "container_id": log.container_id,
-            "execution_time": log.execution_time,
-            "started_at": log.started_at.isoformat() if log.started_at else None,
-            "status": log.status,
-            "request_data": log.request_data,
-            "response_data": log.response_data,
-        }
-        for log in logs
-    ]
+    # Validated once by the response model; see routers/jobs.py.
+    return rows.all()
 
 
 @router.get("/{log_id}", response_model=ExecutionLogResponse)
 async def get_execution_log(
     log_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Get a specific execution log."""
-    log = _scoped(db, user).filter(ExecutionLog.id == log_id).first()
-    if not log:
+    result = await db.execute(_scoped(user).where(ExecutionLog.id == log_id))
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Log not found")
 
-    return {
-        "id": log.id,
-        "job_id": log.job_id,
-        "webhook_job_id": log.webhook_job_id,
-        "code": log.code,
-        "output": log.output,
-        "error": log.error,
-        "container_id": log.container_id,
-        "execution_time": log.execution_time,
-        "started_at": log.started_at.isoformat() if log.started_at else None,
-        "status": log.status,
-        "request_data": log.request_data,
-        "response_data": log.response_data,
-    }
+    return row
@@ -77,6 +77,12 @@ def get_executor():
     return get_code_executor()
 
 
+# Short id -> full container id of a live web service; entries whose
+# container is gone are dropped on their next lookup.
+_resolved_ids: Dict[str, str] = {}
+_RESOLVED_IDS_MAX = 1024
+
+
 def find_service_info(container_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
     """
     Find service info and full container ID by short container ID.
@@ -87,12 +93,24 @@ def find_service_info(container_id: str) -> Tuple[Optional[Dict[str, Any]], Opti
     Returns:
         Tuple of (service_info, full_container_id) or (None, None) if not found
     """
-    executor = get_executor()
-    
-    for cid, info in executor.web_service_containers.items():
+    services = get_executor().web_service_containers
+
+    # Every proxied request (and every asset a page pulls in) resolves
+    # the same short id, so remember which container it matched.
+    cid = _resolved_ids.get(container_id)
+    if cid is not None:
+        info = services.get(cid)
+        if info is not None:
+            return info, cid
+        _resolved_ids.pop(container_id, None)
+
+    for cid, info in list(services.items()):
         if cid.startswith(container_id):
+            if len(_resolved_ids) >= _RESOLVED_IDS_MAX:
+                _resolved_ids.clear()
+            _resolved_ids[container_id] = cid
             return info, cid
-    
+
     return None, None
 
 
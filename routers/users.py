@@ -13,9 +13,11 @@ from datetime import datetime
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from database import get_async_db
 from db_models import ApiKey, User, SYSTEM_USER_ID
 from models.schemas import (
     ApiKeyCreateRequest,
@@ -31,26 +33,6 @@ from auth import current_user, generate_token, hash_password, require_admin
 router = APIRouter(tags=["users"])
 
 
-def _user_response(user: User) -> UserResponse:
-    return UserResponse(
-        id=user.id,
-        email=user.email,
-        is_admin=bool(user.is_admin),
-        disabled=bool(user.disabled),
-        created_at=user.created_at.isoformat() if user.created_at else "",
-    )
-
-
-def _key_response(key: ApiKey) -> ApiKeyResponse:
-    return ApiKeyResponse(
-        id=key.id,
-        prefix=key.prefix,
-        label=key.label,
-        last_used_at=key.last_used_at.isoformat() if key.last_used_at else None,
-        created_at=key.created_at.isoformat() if key.created_at else "",
-    )
-
-
 # ---------------------------------------------------------------------
 # /users/me/keys — caller-owned API keys
 # ---------------------------------------------------------------------
@@ -63,23 +45,22 @@ def _key_response(key: ApiKey) -> ApiKeyResponse:
 )
 async def list_my_keys(
     user: User = Depends(current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if user.id == SYSTEM_USER_ID:
         # The system user exists as a backing identity for anonymous
         # requests; its keys (if any) aren't meaningful to clients.
         return []
-    keys = (
-        db.query(ApiKey)
-        .filter(
+    # Rows go straight to the response model; see routers/jobs.py.
+    return (await db.execute(
+        select(ApiKey)
+        .where(
             ApiKey.user_id == user.id,
             ApiKey.kind == "api",
             ApiKey.revoked_at.is_(None),
         )
         .order_by(ApiKey.created_at.desc())
-        .all()
-    )
-    return [_key_response(k) for k in keys]
+    )).scalars().all()
 
 
 @router.post(
@@ -90,7 +71,7 @@ async def list_my_keys(
 async def create_my_key(
     body: ApiKeyCreateRequest,
     user: User = Depends(current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if user.id == SYSTEM_USER_ID:
         raise HTTPException(
@@ -107,8 +88,8 @@ async def create_my_key(
         kind="api",
     )
     db.add(key)
-    db.commit()
-    db.refresh(key)
+    await db.commit()
+    await db.refresh(key)
     return ApiKeyCreateResponse(
         id=key.id,
         token=plaintext,
@@ -125,20 +106,18 @@ async def create_my_key(
 async def revoke_my_key(
     key_id: int,
     user: User = Depends(current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    key = (
-        db.query(ApiKey)
-        .filter(ApiKey.id == key_id, ApiKey.user_id == user.id)
-        .first()
-    )
+    key = (await db.execute(
+        select(ApiKey).where(ApiKey.id == key_id, ApiKey.user_id == user.id)
+    )).scalars().first()
     if key is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="key not found"
         )
     if key.revoked_at is None:
         key.revoked_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
     return {"ok": True}
 
 
@@ -154,10 +133,9 @@ async def revoke_my_key(
 )
 async def list_users(
     _: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    users = db.query(User).order_by(User.id.asc()).all()
-    return [_user_response(u) for u in users]
+    return (await db.execute(select(User).order_by(User.id.asc()))).scalars().all()
 
 
 @router.post(
@@ -169,9 +147,11 @@ async def list_users(
 async def create_user(
     body: UserCreateRequest,
     _: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    existing = db.query(User).filter(User.email == body.email).first()
+    existing = (await db.execute(
+        select(User).where(User.email == body.email)
+    )).scalars().first()
     if existing is not None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -179,14 +159,14 @@ async def create_user(
         )
     user = User(
         email=body.email,
-        password_hash=hash_password(body.password),
+        password_hash=await run_in_threadpool(hash_password, body.password),
         is_admin=1 if body.is_admin else 0,
         disabled=0,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    return _user_response(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
 
 
 @router.patch(
@@ -198,22 +178,22 @@ async def update_user(
     user_id: int,
     body: UserUpdateRequest,
     _: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if user_id == SYSTEM_USER_ID:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="cannot modify the system user",
         )
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="user not found"
         )
     if body.email is not None:
-        clash = db.query(User).filter(
-            User.email == body.email, User.id != user_id
-        ).first()
+        clash = (await db.execute(
+            select(User).where(User.email == body.email, User.id != user_id)
+        )).scalars().first()
         if clash is not None:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -221,14 +201,14 @@ async def update_user(
             )
         user.email = body.email
     if body.password:
-        user.password_hash = hash_password(body.password)
+        user.password_hash = await run_in_threadpool(hash_password, body.password)
     if body.is_admin is not None:
         user.is_admin = 1 if body.is_admin else 0
     if body.disabled is not None:
         user.disabled = 1 if body.disabled else 0
-    db.commit()
-    db.refresh(user)
-    return _user_response(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
 
 
 @router.delete(
@@ -238,14 +218,14 @@ async def update_user(
 async def delete_user(
     user_id: int,
     _: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if user_id == SYSTEM_USER_ID:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="cannot delete the system user",
         )
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="user not found"
@@ -253,9 +233,11 @@ async def delete_user(
     # Revoke their keys rather than cascading deletes; preserves audit
     # trail and keeps owner_user_id FKs on historical rows valid.
     now = datetime.utcnow()
-    db.query(ApiKey).filter(
-        ApiKey.user_id == user_id, ApiKey.revoked_at.is_(None)
-    ).update({ApiKey.revoked_at: now})
-    db.delete(user)
-    db.commit()
+    await db.execute(
+        update(ApiKey)
+        .where(ApiKey.user_id == user_id, ApiKey.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    await db.delete(user)
+    await db.commit()
     return {"ok": True}
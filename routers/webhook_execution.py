@@ -1,70 +1,121 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 import time
-import base64
 import json
+import orjson
 from datetime import datetime
-from models import WebhookJob, ExecutionLog, SYSTEM_USER_ID
-from database import get_db
+from urllib.parse import parse_qsl
+from models import SYSTEM_USER_ID
+from database import get_async_db
 from services.code_executor_service import get_code_executor
-from env_manager import EnvironmentManager
-import os
+from services import log_writer, webhook_cache
+from env_manager import get_env_manager
+from settings import env_int
 
 router = APIRouter(prefix="/webhook", tags=["webhook-execution"])
 
-def get_env_manager():
-    """Get environment manager instance."""
-    from models import SessionLocal
-    db = SessionLocal()
+# Largest request body a webhook accepts. The body travels to the worker
+# inside its /exec request, which the worker refuses over 10 MiB, so the
+# default leaves room for JSON escaping and the user's own code.
+MAX_WEBHOOK_BODY = env_int("SUPAKILN_MAX_WEBHOOK_BODY", 4 << 20)
+
+async def _read_body(request: Request) -> bytes:
+    """The request body, or 413 if it is over MAX_WEBHOOK_BODY.
+
+    A declared Content-Length is checked before anything is read; chunked
+    bodies are counted as they stream in and cut off at the cap instead
+    of being buffered whole first.
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_WEBHOOK_BODY:
+        raise HTTPException(status_code=413, detail=f"Request body exceeds {MAX_WEBHOOK_BODY} bytes")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_WEBHOOK_BODY:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {MAX_WEBHOOK_BODY} bytes")
+    return bytes(body)
+
+
+def _dumps(value) -> str:
+    """JSON text for `value`, via orjson unless it can't encode it.
+
+    orjson refuses integers past 64 bits, which request bodies parsed by
+    the stdlib may contain; those take the slower path.
+    """
     try:
-        # Try to load existing key
-        if os.path.exists('.env_key'):
-            with open('.env_key', 'rb') as key_file:
-                key = key_file.read()
-        else:
-            key = None
-        env_manager = EnvironmentManager(db, key)
-        return env_manager
-    finally:
-        db.close()
+        return orjson.dumps(value).decode()
+    except TypeError:
+        return json.dumps(value)
+
+
+def _last_json_object(output: str):
+    """The last line of `output` that parses as a JSON object, or None.
+
+    Walks back from the end with rfind instead of splitting the whole
+    output, so the usual case (the response is the final line) costs the
+    same however much the program logged before it.
+    """
+    end = len(output)
+    while end > 0:
+        start = output.rfind("\n", 0, end) + 1
+        line = output[start:end].strip()
+        if line.startswith("{") and line.endswith("}"):
+            try:
+                return orjson.loads(line)
+            except orjson.JSONDecodeError:
+                pass
+            # NaN/Infinity, as Python's json.dumps writes them.
+            try:
+                return json.loads(line)
+            except json.JSONDecodeError:
+                pass
+        end = start - 1
+    return None
+
 
 # Dynamic webhook execution endpoint
 @router.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def execute_webhook(path: str, request: Request, db: Session = Depends(get_db)):
+async def execute_webhook(path: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Dynamic endpoint that executes webhook jobs based on the path.
     Supports all HTTP methods and passes request data to the code.
     """
     start_time = time.time()
+    started_at = datetime.utcnow()
     endpoint = f"/{path}"
     
     try:
-        # Find the webhook job
-        job = db.query(WebhookJob).filter(
-            WebhookJob.endpoint == endpoint,
-            WebhookJob.is_active == 1
-        ).first()
+        # Find the webhook job (cached; edits invalidate it)
+        job = await webhook_cache.lookup(db, endpoint)
         
         if not job:
             raise HTTPException(status_code=404, detail=f"Webhook endpoint '{endpoint}' not found")
+        # Nothing else here needs the session (the log writer does the
+        # writes), so hand its connection back before the user code runs
+        # rather than holding it for the whole execution.
+        await db.close()
         
         # Get request data
         request_method = request.method
         request_headers = dict(request.headers)
         request_query_params = dict(request.query_params)
         
-        # Get request body
+        # Get request body: read once under the size cap, then parsed
+        # by content type.
         request_body = None
+        if request_method in ["POST", "PUT", "PATCH"]:
+            raw_body = await _read_body(request)
         try:
             if request_method in ["POST", "PUT", "PATCH"]:
                 content_type = request_headers.get("content-type", "")
                 if "application/json" in content_type:
-                    request_body = await request.json()
+                    request_body = json.loads(raw_body)
                 elif "application/x-www-form-urlencoded" in content_type:
-                    form_data = await request.form()
-                    request_body = dict(form_data)
+                    request_body = dict(parse_qsl(raw_body.decode("latin-1"), keep_blank_values=True))
                 else:
-                    request_body = (await request.body()).decode()
+                    request_body = raw_body.decode()
         except Exception as e:
             print(f"Error parsing request body: {e}")
             request_body = None
@@ -78,67 +129,37 @@ async def execute_webhook(path: str, request: Request, db: Session = Depends(get
             "endpoint": endpoint
         }
         
-        # Resolve language (backfill to python for rows predating the
-        # `language` column).
-        language = (getattr(job, "language", None) or "python")
-
-        # Build the code that will run in the worker. For Python we keep
-        # the historical contract: user code sees a `request_data` local
-        # and writes back into `response_data`. For other languages, we
-        # pass request data as SUPAKILN_REQUEST_DATA (JSON) and the user
-        # code is responsible for parsing it + printing a JSON response
-        # to stdout.
-        request_data_json = json.dumps(request_data)
-        if language == "python":
-            request_data_b64 = base64.b64encode(request_data_json.encode()).decode()
-            wrapper_code = (
-                "import json\n"
-                "import sys\n"
-                "import base64\n"
-                "from datetime import datetime\n"
-                "\n"
-                f'request_data = json.loads(base64.b64decode("{request_data_b64}").decode())\n'
-                'response_data = {"message": "Webhook executed successfully", '
-                '"timestamp": datetime.now().isoformat()}\n'
-                "\n"
-                "try:\n"
-                + "\n".join("    " + line for line in job.code.split("\n"))
-                + "\n"
-                "except Exception as e:\n"
-                '    response_data = {"error": str(e), "timestamp": datetime.now().isoformat()}\n'
-                '    print(f"Error in webhook code: {e}", file=sys.stderr)\n'
-                "\n"
-                "print(json.dumps(response_data))\n"
-            )
-            code_to_run = wrapper_code
-        else:
-            # No auto-wrapping for non-Python; user emits JSON to stdout.
-            code_to_run = job.code
-
-        # Packages from the stored comma-separated string.
-        packages: list = []
-        if job.packages and job.packages.strip():
-            packages = [pkg.strip() for pkg in job.packages.split(",") if pkg.strip()]
+        language = job.language
+
+        # The program sent to the worker (for Python, the user code inside
+        # its `request_data` / `response_data` wrapper) is built once per
+        # job by webhook_cache. The request data goes in as JSON on stdin
+        # for every language, and as SUPAKILN_REQUEST_DATA for non-Python.
+        request_data_json = _dumps(request_data)
 
         owner_user_id = job.owner_user_id or SYSTEM_USER_ID
 
         # Environment variables: owner's encrypted secrets + request
         # data for non-Python languages.
         env_manager = get_env_manager()
-        env_vars = dict(env_manager.get_all_variables(owner_user_id=owner_user_id))
+        env_vars = await env_manager.get_all_variables_async(owner_user_id=owner_user_id)
         if language != "python":
             env_vars["SUPAKILN_REQUEST_DATA"] = request_data_json
 
         # -1 means "no timeout"; treat as a very large number of seconds.
         timeout_s = 60 * 60 * 24 if job.timeout == -1 else int(job.timeout)
 
-        exec_result = get_code_executor().execute_code(
-            code=code_to_run,
-            packages=packages,
+        # Same offload as /execute: the executor blocks on Docker and the
+        # worker's HTTP round trip.
+        exec_result = await run_in_threadpool(
+            get_code_executor().execute_code,
+            code=job.program,
+            packages=list(job.packages),
             timeout=timeout_s,
             env_vars=env_vars,
             language=language,
             user_id=owner_user_id,
+            stdin=request_data_json,
         )
 
         success = bool(exec_result.get("success"))
@@ -147,16 +168,7 @@ async def execute_webhook(path: str, request: Request, db: Session = Depends(get
         container_id = exec_result.get("container_id")
 
         # Parse the last JSON-shaped line of stdout as the response body.
-        response_data = None
-        if output.strip():
-            for line in reversed(output.strip().splitlines()):
-                line = line.strip()
-                if line.startswith("{") and line.endswith("}"):
-                    try:
-                        response_data = json.loads(line)
-                        break
-                    except json.JSONDecodeError:
-                        continue
+        response_data = _last_json_object(output)
         if response_data is None:
             response_data = {
                 "success": success,
@@ -164,26 +176,25 @@ async def execute_webhook(path: str, request: Request, db: Session = Depends(get
                 "error": error_output or None,
             }
 
-        # Update job last triggered time
-        job.last_triggered = datetime.utcnow()
-        db.commit()
+        # Stamp last_triggered in the log writer's next batch instead of
+        # a commit of its own on the request path.
+        log_writer.record_webhook_trigger(job.id, started_at)
 
-        # Log the execution
-        log = ExecutionLog(
+        # Log the execution; output and response_data hold the same text.
+        response_json = _dumps(response_data) if success else None
+        log_writer.submit(dict(
             webhook_job_id=job.id,
             owner_user_id=owner_user_id,
             code=job.code,
-            output=json.dumps(response_data) if success else None,
+            output=response_json,
             error=error_output if not success else None,
             container_id=container_id,
             execution_time=time.time() - start_time,
-            started_at=datetime.utcnow(),
+            started_at=started_at,
             status="success" if success else "error",
             request_data=request_data_json,
-            response_data=json.dumps(response_data) if success else None,
-        )
-        db.add(log)
-        db.commit()
+            response_data=response_json,
+        ))
 
         if success:
             return response_data
@@ -196,17 +207,15 @@ async def execute_webhook(path: str, request: Request, db: Session = Depends(get
         raise
     except Exception as e:
         # Log the error
-        log = ExecutionLog(
+        log_writer.submit(dict(
             webhook_job_id=job.id if 'job' in locals() else None,
             owner_user_id=(job.owner_user_id if 'job' in locals() and job else SYSTEM_USER_ID),
             code=job.code if 'job' in locals() else "",
             error=str(e),
             execution_time=time.time() - start_time,
-            started_at=datetime.utcnow(),
+            started_at=started_at,
             status="error",
-            request_data=json.dumps(request_data) if 'request_data' in locals() else None
-        )
-        db.add(log)
-        db.commit()
+            request_data=_dumps(request_data) if 'request_data' in locals() else None
+        ))
         
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
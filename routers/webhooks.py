@@ -1,11 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from models.schemas import WebhookJobRequest, WebhookJobResponse
 from models import WebhookJob, User
-from database import get_db
+from database import get_async_db
 from auth import current_user
+from services.code_executor_service import schedule_prebuild
+from services import webhook_cache
 import languages as lang_registry
 
 router = APIRouter(prefix="/webhook-jobs", tags=["webhook-jobs"])
@@ -23,34 +26,24 @@ def _validate_language(name):
         )
 
 
-def _job_to_response(job: WebhookJob) -> dict:
-    return {
-        "id": job.id,
-        "name": job.name,
-        "endpoint": job.endpoint,
-        "code": job.code,
-        "packages": job.packages,
-        "container_id": job.container_id,
-        "created_at": job.created_at.isoformat(),
-        "last_triggered": job.last_triggered.isoformat() if job.last_triggered else None,
-        "is_active": bool(job.is_active),
-        "timeout": job.timeout,
-        "description": job.description,
-        "language": getattr(job, "language", None) or "python",
-    }
-
-
-def _scoped(db: Session, user: User):
-    q = db.query(WebhookJob)
+def _scoped(user: User):
+    stmt = select(WebhookJob)
     if not user.is_admin:
-        q = q.filter(WebhookJob.owner_user_id == user.id)
-    return q
+        stmt = stmt.where(WebhookJob.owner_user_id == user.id)
+    return stmt
+
+
+async def _get_owned(db: AsyncSession, user: User, job_id: int):
+    job = await db.get(WebhookJob, job_id)
+    if job is None or not (user.is_admin or job.owner_user_id == user.id):
+        return None
+    return job
 
 
 @router.post("", response_model=WebhookJobResponse)
 async def create_webhook_job(
     request: WebhookJobRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Create a new webhook job."""
@@ -59,11 +52,6 @@ async def create_webhook_job(
         if not request.endpoint.startswith('/'):
             request.endpoint = '/' + request.endpoint
 
-        # endpoint is GLOBAL-unique by design — URL routing needs it.
-        existing = db.query(WebhookJob).filter(WebhookJob.endpoint == request.endpoint).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Endpoint already exists")
-
         db_job = WebhookJob(
             name=request.name,
             endpoint=request.endpoint,
@@ -73,68 +61,77 @@ async def create_webhook_job(
             timeout=request.timeout,
             description=request.description,
             language=language,
-            created_at=datetime.now(),
             is_active=True,
             owner_user_id=user.id,
         )
         db.add(db_job)
-        db.commit()
-        db.refresh(db_job)
-        return _job_to_response(db_job)
+        await db.commit()
+        webhook_cache.invalidate()
+        await db.refresh(db_job)
+        schedule_prebuild(request.packages, language)
+        return db_job
     except HTTPException:
         raise
+    except IntegrityError:
+        # endpoint is GLOBAL-unique by design (URL routing needs it),
+        # enforced by the column's UNIQUE constraint.
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Endpoint already exists")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("", response_model=List[WebhookJobResponse])
 async def list_webhook_jobs(
-    db: Session = Depends(get_db),
+    limit: int = Query(500, ge=1, le=500),
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
-    """List webhook jobs owned by the caller (admins see all)."""
-    jobs = _scoped(db, user).all()
-    return [_job_to_response(job) for job in jobs]
+    """List webhook jobs owned by the caller (admins see all), oldest first.
+
+    Capped at `limit` rows (default and maximum 500). A full page means
+    there may be more: pass its last `id` as `after_id` for the next one.
+    """
+    stmt = _scoped(user)
+    if after_id is not None:
+        stmt = stmt.where(WebhookJob.id > after_id)
+    stmt = stmt.order_by(WebhookJob.id).limit(limit)
+    # Validated once by the response model; see routers/jobs.py.
+    return (await db.execute(stmt)).scalars().all()
 
 
 @router.get("/{job_id}", response_model=WebhookJobResponse)
 async def get_webhook_job(
     job_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Get a specific webhook job."""
-    job = _scoped(db, user).filter(WebhookJob.id == job_id).first()
+    job = await _get_owned(db, user, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Webhook job not found")
-    return _job_to_response(job)
+    return job
 
 
 @router.put("/{job_id}", response_model=WebhookJobResponse)
 async def update_webhook_job(
     job_id: int,
     request: WebhookJobRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Update a webhook job."""
     language = _validate_language(request.language)
     try:
-        job = _scoped(db, user).filter(WebhookJob.id == job_id).first()
+        job = await _get_owned(db, user, job_id)
         if not job:
             raise HTTPException(status_code=404, detail="Webhook job not found")
 
         if not request.endpoint.startswith('/'):
             request.endpoint = '/' + request.endpoint
 
-        existing = db.query(WebhookJob).filter(
-            WebhookJob.endpoint == request.endpoint,
-            WebhookJob.id != job_id,
-        ).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Endpoint already exists")
-
         job.name = request.name
         job.endpoint = request.endpoint
         job.code = request.code
@@ -144,31 +141,39 @@ async def update_webhook_job(
         job.description = request.description
         job.language = language
 
-        db.commit()
-        db.refresh(job)
-        return _job_to_response(job)
+        await db.commit()
+        webhook_cache.invalidate()
+        await db.refresh(job)
+        schedule_prebuild(request.packages, language)
+        return job
     except HTTPException:
         raise
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Endpoint already exists")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/{job_id}")
 async def delete_webhook_job(
     job_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(current_user),
 ):
     """Delete a webhook job."""
     try:
-        job = _scoped(db, user).filter(WebhookJob.id == job_id).first()
+        job = await _get_owned(db, user, job_id)
         if not job:
             raise HTTPException(status_code=404, detail="Webhook job not found")
 
-        db.delete(job)
-        db.commit()
+        await db.delete(job)
+        await db.commit()
+        webhook_cache.invalidate()
         return {"message": "Webhook job deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -9,10 +9,12 @@ anyone's).
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone
 from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 
 from db_models import User
 from services.code_executor_service import get_code_executor
@@ -88,7 +90,8 @@ async def stop_worker(
     if not user.is_admin and meta.get("user_id") != user.id:
         raise HTTPException(status_code=404, detail="worker not tracked")
 
-    executor.stop_worker(container_id)
+    # Eviction shells out to `docker rm -f`; keep it off the event loop.
+    await run_in_threadpool(executor.stop_worker, container_id)
     return {"stopped": container_id}
 
 
@@ -103,16 +106,18 @@ async def reset_workers(
     """
     executor = get_code_executor()
     if user.is_admin:
-        killed = executor.reset_workers()
+        killed = await run_in_threadpool(executor.reset_workers)
     else:
-        # Reap only the caller's workers.
+        # Reap only the caller's workers. Each eviction is a blocking
+        # `docker rm -f`, so run them on the threadpool side by side.
         targets = [
             (cid, meta["cache_key"])
             for cid, meta in list(executor.worker_meta.items())
             if meta.get("user_id") == user.id
         ]
-        killed = 0
-        for cid, cache_key in targets:
-            executor._evict_worker(cache_key, cid)
-            killed += 1
+        await asyncio.gather(*(
+            run_in_threadpool(executor._evict_worker, cache_key, cid)
+            for cid, cache_key in targets
+        ))
+        killed = len(targets)
     return {"killed": killed}
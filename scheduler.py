@@ -2,21 +2,37 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime
+from typing import Optional
+import asyncio
+import os
 import time
 import logging
-from models import SessionLocal, ScheduledJob, ExecutionLog, SYSTEM_USER_ID
-from code_executor import CodeExecutor
+from models import SessionLocal, ScheduledJob, SYSTEM_USER_ID
+from services.code_executor_service import get_code_executor
+from services import log_writer
 
 logger = logging.getLogger(__name__)
 
+# Set SUPAKILN_RUN_SCHEDULER=0 on every replica but one when running
+# several API processes against one database, so each cron job fires once.
+RUN_SCHEDULER = os.environ.get("SUPAKILN_RUN_SCHEDULER", "1") != "0"
+
 class JobScheduler:
-    def __init__(self):
-        self.scheduler = AsyncIOScheduler()
-        self.executor = CodeExecutor()
+    def __init__(self, event_loop=None):
+        self.scheduler = AsyncIOScheduler(event_loop=event_loop)
         self.scheduler.start()
         self._initialized = False
         # Don't load existing jobs immediately - wait for explicit initialization
 
+    @property
+    def executor(self):
+        """The process-wide CodeExecutor shared with the routers.
+
+        Scheduled jobs reuse the same worker cache as /execute, and the
+        reapers and shutdown see every container the process owns.
+        """
+        return get_code_executor()
+
     def initialize(self):
         """Initialize the scheduler after database migration is complete."""
         if not self._initialized:
@@ -205,24 +221,28 @@ class JobScheduler:
         )
 
     def load_existing_jobs(self):
-        """Load all active jobs from the database and schedule them."""
+        """Load all active jobs from the database and schedule them.
+
+        Startup only; create/update register their one job through
+        schedule_job. Only the two columns scheduling needs are read.
+        """
         db = SessionLocal()
         try:
-            jobs = db.query(ScheduledJob).filter(ScheduledJob.is_active == 1).all()
+            jobs = db.query(ScheduledJob).with_entities(
+                ScheduledJob.id, ScheduledJob.cron_expression
+            ).filter(ScheduledJob.is_active == 1)
             for job in jobs:
                 self.schedule_job(job)
         finally:
             db.close()
 
     def schedule_job(self, job):
-        """Schedule a new job or update an existing one."""
+        """Schedule a new job or update an existing one.
+
+        `job` needs `id` and `cron_expression`. replace_existing swaps
+        out a previous schedule for the same job in one call.
+        """
         job_id = f"job_{job.id}"
-        
-        # Remove existing job if it exists
-        if self.scheduler.get_job(job_id):
-            self.scheduler.remove_job(job_id)
-        
-        # Add new job
         self.scheduler.add_job(
             self.execute_job,
             CronTrigger.from_crontab(job.cron_expression),
@@ -231,80 +251,83 @@ class JobScheduler:
             replace_existing=True
         )
 
+    def unschedule_job(self, job_id):
+        """Drop a job's schedule, if it has one."""
+        apscheduler_id = f"job_{job_id}"
+        if self.scheduler.get_job(apscheduler_id):
+            self.scheduler.remove_job(apscheduler_id)
+
     async def execute_job(self, job_id):
         """Execute a scheduled job and log its results.
 
         The job runs in its owner's worker container, and the owner's
         encrypted env vars are injected. The system user runs
-        owner-less jobs (legacy rows).
+        owner-less jobs (legacy rows). Everything here blocks (the
+        database, Docker, the worker round trip), so it runs on a worker
+        thread rather than the event loop.
         """
+        await asyncio.to_thread(self._run_job, job_id)
+
+    def _run_job(self, job_id):
         db = SessionLocal()
         try:
-            job = db.query(ScheduledJob).filter(ScheduledJob.id == job_id).first()
-            if not job or not job.is_active:
-                return
-
-            start_time = time.time()
-            owner_user_id = job.owner_user_id or SYSTEM_USER_ID
-
-            # Pull the owner's env vars. Imported lazily to avoid a
-            # circular import at module load time.
-            from env_manager import EnvironmentManager
-            import os
-            key = None
-            if os.path.exists('.env_key'):
-                with open('.env_key', 'rb') as f:
-                    key = f.read()
-            env_vars = EnvironmentManager(db, key).get_all_variables(
-                owner_user_id=owner_user_id
+            job = db.get(ScheduledJob, job_id)
+        finally:
+            # The loaded row is all we need; don't hold a connection for
+            # the length of the run.
+            db.close()
+        if not job or not job.is_active:
+            return
+
+        start_time = time.time()
+        owner_user_id = job.owner_user_id or SYSTEM_USER_ID
+
+        # Pull the owner's env vars. Imported lazily to avoid a
+        # circular import at module load time.
+        from env_manager import get_env_manager
+        env_vars = get_env_manager().get_all_variables(
+            owner_user_id=owner_user_id
+        )
+
+        # Execute the code
+        try:
+            result = self.executor.execute_code(
+                code=job.code,
+                packages=job.packages.split(',') if job.packages else [],
+                timeout=getattr(job, 'timeout', 30),
+                language=getattr(job, 'language', None) or 'python',
+                env_vars=env_vars,
+                user_id=owner_user_id,
             )
 
-            # Execute the code
-            try:
-                result = self.executor.execute_code(
-                    code=job.code,
-                    packages=job.packages.split(',') if job.packages else [],
-                    timeout=getattr(job, 'timeout', 30),
-                    language=getattr(job, 'language', None) or 'python',
-                    env_vars=env_vars,
-                    user_id=owner_user_id,
-                )
-
-                execution_time = time.time() - start_time
-
-                # Log the execution
-                log = ExecutionLog(
-                    job_id=job.id,
-                    owner_user_id=owner_user_id,
-                    code=job.code,
-                    output=result.get('output'),
-                    error=result.get('error'),
-                    container_id=result.get('container_id'),
-                    execution_time=execution_time,
-                    status='success' if result.get('success') else 'error'
-                )
-
-                db.add(log)
-                job.last_run = datetime.utcnow()
-                db.commit()
+            execution_time = time.time() - start_time
 
-            except Exception as e:
-                execution_time = time.time() - start_time
-                log = ExecutionLog(
-                    job_id=job.id,
-                    owner_user_id=owner_user_id,
-                    code=job.code,
-                    error=str(e),
-                    container_id=None,
-                    execution_time=execution_time,
-                    status='error'
-                )
-                db.add(log)
-                job.last_run = datetime.utcnow()
-                db.commit()
+            # Log the execution
+            log_writer.submit(dict(
+                job_id=job.id,
+                owner_user_id=owner_user_id,
+                code=job.code,
+                output=result.get('output'),
+                error=result.get('error'),
+                container_id=result.get('container_id'),
+                execution_time=execution_time,
+                status='success' if result.get('success') else 'error'
+            ))
+
+        except Exception as e:
+            execution_time = time.time() - start_time
+            log_writer.submit(dict(
+                job_id=job.id,
+                owner_user_id=owner_user_id,
+                code=job.code,
+                error=str(e),
+                container_id=None,
+                execution_time=execution_time,
+                status='error'
+            ))
 
-        finally:
-            db.close()
+        # Written with the log row's batch rather than committed here.
+        log_writer.record_job_run(job.id, datetime.utcnow())
 
     def add_job(
         self,
@@ -343,7 +366,7 @@ class JobScheduler:
         """Update an existing job."""
         db = SessionLocal()
         try:
-            job = db.query(ScheduledJob).filter(ScheduledJob.id == job_id).first()
+            job = db.get(ScheduledJob, job_id)
             if not job:
                 return None
                 
@@ -364,15 +387,33 @@ class JobScheduler:
         """Delete a scheduled job."""
         db = SessionLocal()
         try:
-            job = db.query(ScheduledJob).filter(ScheduledJob.id == job_id).first()
+            job = db.get(ScheduledJob, job_id)
             if job:
-                job_id = f"job_{job.id}"
-                if self.scheduler.get_job(job_id):
-                    self.scheduler.remove_job(job_id)
+                self.unschedule_job(job.id)
                 db.delete(job)
                 db.commit()
         finally:
             db.close()
 
-# Create global scheduler instance
-scheduler = JobScheduler() 
\ No newline at end of file
+# Global scheduler instance, created by start_scheduler() during lifespan
+# startup so importing this module neither starts APScheduler outside the
+# event loop nor touches Docker.
+_scheduler_instance = None
+
+
+def start_scheduler(event_loop) -> JobScheduler:
+    """Create the singleton JobScheduler bound to the server's event loop."""
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        _scheduler_instance = JobScheduler(event_loop=event_loop)
+    return _scheduler_instance
+
+
+def get_scheduler() -> Optional[JobScheduler]:
+    """Get the singleton JobScheduler, or None if this process has none.
+
+    None means SUPAKILN_RUN_SCHEDULER=0 or startup has not reached the
+    scheduler yet; callers skip scheduling and leave the row for the
+    scheduling process to load.
+    """
+    return _scheduler_instance
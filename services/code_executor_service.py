@@ -1,12 +1,24 @@
-from code_executor import CodeExecutor
+import asyncio
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from code_executor import CodeExecutor
 
 # Singleton instance shared across all routers
 _executor_instance = None
 
-def get_code_executor() -> CodeExecutor:
-    """Get the singleton CodeExecutor instance."""
+# Running prebuilds; the loop only keeps weak references to tasks.
+_prebuild_tasks = set()
+
+def get_code_executor() -> "CodeExecutor":
+    """Get the singleton CodeExecutor instance.
+
+    code_executor (and with it the Docker client) is imported on first
+    use rather than at module import time.
+    """
     global _executor_instance
     if _executor_instance is None:
+        from code_executor import CodeExecutor
         _executor_instance = CodeExecutor()
     return _executor_instance
 
@@ -15,4 +27,24 @@ def cleanup_code_executor():
     global _executor_instance
     if _executor_instance is not None:
         _executor_instance.cleanup()
-        _executor_instance = None 
\ No newline at end of file
+        _executor_instance = None
+
+
+def schedule_prebuild(packages: Optional[List[str]], language: str = "python") -> None:
+    """Start building the image for a saved job's packages in the background.
+
+    Called from async handlers when a job's package set is stored, so the
+    first trigger finds the image built instead of paying for
+    `pip install` inside its own timeout. No-op without packages, which
+    run on the runtime's base image.
+    """
+    if not packages:
+        return
+    task = asyncio.create_task(asyncio.to_thread(_prebuild, list(packages), language))
+    _prebuild_tasks.add(task)
+    task.add_done_callback(_prebuild_tasks.discard)
+
+
+def _prebuild(packages: List[str], language: str) -> None:
+    # On the worker thread: the first get_code_executor() talks to Docker.
+    get_code_executor().prebuild_image(packages, language)
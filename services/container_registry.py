@@ -0,0 +1,87 @@
+"""Names and package lists of containers created through POST /containers.
+
+Backed by the named_containers table so every worker process (and a
+restarted one) agrees on them. Names never change once assigned, so
+name lookups are cached in-process by container id.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import NamedContainer, SessionLocal
+
+UNNAMED = "Unnamed"
+
+_name_cache: Dict[str, str] = {}
+
+
+class NameInUse(Exception):
+    """Another container already has the requested name."""
+
+
+def split_packages(packages: Optional[str]) -> List[str]:
+    return [pkg for pkg in (packages or "").split(",") if pkg]
+
+
+def name_in_use(db: Session, name: str) -> bool:
+    return db.query(NamedContainer.container_id).filter(NamedContainer.name == name).first() is not None
+
+
+def record(db: Session, container_id: str, name: str, packages: Iterable[str]) -> None:
+    """Store (or rename) the entry for `container_id`.
+
+    Raises NameInUse if `name` belongs to another container. The unique
+    index on name makes this the authoritative check: a name_in_use()
+    probe can't see a create racing in from another request or worker.
+    """
+    db.merge(NamedContainer(
+        container_id=container_id,
+        name=name,
+        packages=",".join(packages),
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise NameInUse(name)
+    _name_cache[container_id] = name
+
+
+def lookup(container_ids: List[str]) -> Dict[str, NamedContainer]:
+    """Return the stored entries for `container_ids`, keyed by id."""
+    if not container_ids:
+        return {}
+    with SessionLocal() as db:
+        rows = db.query(NamedContainer).filter(
+            NamedContainer.container_id.in_(container_ids)
+        ).all()
+    for row in rows:
+        _name_cache[row.container_id] = row.name
+    return {row.container_id: row for row in rows}
+
+
+def name_for(container_id: Optional[str]) -> str:
+    """Name of `container_id`, or "Unnamed"."""
+    if not container_id:
+        return UNNAMED
+    name = _name_cache.get(container_id)
+    if name is None:
+        entry = lookup([container_id]).get(container_id)
+        if entry is None:
+            return UNNAMED
+        name = entry.name
+    return name
+
+
+def forget(db: Session, container_id: str) -> None:
+    db.query(NamedContainer).filter(NamedContainer.container_id == container_id).delete()
+    db.commit()
+    _name_cache.pop(container_id, None)
+
+
+def forget_all(db: Session) -> None:
+    db.query(NamedContainer).delete()
+    db.commit()
+    _name_cache.clear()
@@ -1,5 +1,33 @@
+import asyncio
 import docker
+import io
 import os
+import tarfile
+import threading
+from typing import Dict
+from fastapi.concurrency import run_in_threadpool
+from settings import env_int
+
+# Ceiling on Docker API calls issued from request handlers at once.
+# Beyond this dockerd only queues them, and the queue shows up as tail
+# latency on every endpoint that touches Docker.
+DOCKER_API_CONCURRENCY = env_int("SUPAKILN_DOCKER_API_CONCURRENCY", 32)
+_docker_api_slots = asyncio.Semaphore(max(1, DOCKER_API_CONCURRENCY))
+
+# Separate ceiling on long-running execs streamed from request handlers.
+# Past it, executions queue here rather than piling exec sessions onto
+# dockerd, and a burst of them can't take the API slots above.
+DOCKER_EXEC_CONCURRENCY = env_int("SUPAKILN_DOCKER_EXEC_CONCURRENCY", 32)
+_docker_exec_slots = asyncio.Semaphore(max(1, DOCKER_EXEC_CONCURRENCY))
+
+# Keep-alive connections the client pools per daemon. docker-py reuses
+# connections already, but only up to max_pool_size (10 by default);
+# past that, each concurrent call opens a fresh connection and drops it
+# afterwards. Sized for both caps above plus the callers outside them
+# (event watchers, executor and service threads).
+DOCKER_POOL_SIZE = env_int(
+    "SUPAKILN_DOCKER_POOL_SIZE", DOCKER_API_CONCURRENCY + DOCKER_EXEC_CONCURRENCY + 16
+)
 
 def get_docker_client():
     """Get Docker client with proper error handling for DinD sidecar."""
@@ -10,7 +38,7 @@ def get_docker_client():
         if docker_host:
             print(f"Using DOCKER_HOST: {docker_host}")
             # Connect directly to the specified host
-            client = docker.DockerClient(base_url=docker_host)
+            client = docker.DockerClient(base_url=docker_host, max_pool_size=DOCKER_POOL_SIZE)
             client.ping()
             print("Successfully connected to Docker sidecar")
             return client
@@ -24,7 +52,7 @@ def get_docker_client():
         for host in sidecar_hosts:
             try:
                 print(f"Trying Docker sidecar: {host}")
-                client = docker.DockerClient(base_url=host)
+                client = docker.DockerClient(base_url=host, max_pool_size=DOCKER_POOL_SIZE)
                 client.ping()
                 print(f"Successfully connected to Docker via {host}")
                 return client
@@ -34,7 +62,7 @@ def get_docker_client():
             
         # Final fallback to from_env()
         print("Trying Docker connection via from_env()")
-        client = docker.from_env()
+        client = docker.from_env(max_pool_size=DOCKER_POOL_SIZE)
         client.ping()
         print("Successfully connected to Docker via from_env()")
         return client
@@ -47,11 +75,87 @@ def get_docker_client():
             f"Original error: {e}"
         )
 
-# Initialize Docker client once
-try:
-    docker_client = get_docker_client()
-    print("Docker client initialized successfully")
-except docker.errors.DockerException as e:
-    print(f"Error initializing Docker: {str(e)}")
-    print("Please ensure Docker is running and you have the necessary permissions.")
-    raise 
\ No newline at end of file
+async def run_docker(func, *args, **kwargs):
+    """Run a blocking Docker SDK call in the threadpool under the API cap.
+
+    For short API round trips (inspect, list, logs, put_archive). Don't
+    wrap a long-running exec with it or the run would hold a slot for
+    its whole duration.
+    """
+    async with _docker_api_slots:
+        return await run_in_threadpool(func, *args, **kwargs)
+
+async def start_docker_exec(func, *args, **kwargs) -> asyncio.Future:
+    """Start a long-running blocking exec on the threadpool under the exec cap.
+
+    Waits for a slot, then returns the running task. The slot is held
+    until the call itself returns, even if the caller stops waiting.
+    """
+    await _docker_exec_slots.acquire()
+    try:
+        task = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+    except BaseException:
+        _docker_exec_slots.release()
+        raise
+    task.add_done_callback(lambda _: _docker_exec_slots.release())
+    return task
+
+def tar_archive(files: Dict[str, bytes], mode: int = 0o644) -> bytes:
+    """Pack {name: content} into an uncompressed tar for `put_archive`.
+
+    Lets callers drop files into a container with a single API call
+    instead of piping them through a shell.
+    """
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+def exec_output(container_id: str, cmd, detach: bool = False, **kwargs):
+    """Run `cmd` in a container by id through the low-level API.
+
+    Unlike `containers.get(id).exec_run(...)` this skips the inspect
+    round trip that building a Container object costs. Returns
+    (exit_code, output bytes); with `detach` the exec id and b"" instead.
+    """
+    exec_id = docker_client.api.exec_create(container_id, cmd, **kwargs)["Id"]
+    output = docker_client.api.exec_start(exec_id, detach=detach)
+    if detach:
+        return exec_id, b""
+    return docker_client.api.exec_inspect(exec_id).get("ExitCode"), output
+
+class _LazyDockerClient:
+    """Module-level stand-in for the shared DockerClient.
+
+    Connecting pings the daemon, so doing it at import time made a slow or
+    missing dockerd crash the process before uvicorn could bind. The
+    connection is now made on first use and then reused by every caller.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def connect(self) -> docker.DockerClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        self._client = get_docker_client()
+                        print("Docker client initialized successfully")
+                    except docker.errors.DockerException as e:
+                        print(f"Error initializing Docker: {str(e)}")
+                        print("Please ensure Docker is running and you have the necessary permissions.")
+                        raise
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+
+# Shared Docker client, connected on first use
+docker_client = _LazyDockerClient()
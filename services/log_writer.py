@@ -0,0 +1,140 @@
+"""Batched ExecutionLog writer.
+
+Request handlers and the scheduler hand finished log rows to `submit()`
+instead of committing them on their own session. A daemon thread drains
+the queue and inserts what accumulates within LOG_BATCH_LINGER_S of the
+first row, up to LOG_BATCH_SIZE rows, in one transaction, so a burst of
+executions costs one commit per batch rather than one per run. Webhook
+`last_triggered` and scheduled job `last_run` stamps ride along in the
+same transaction, one UPDATE per table per batch.
+"""
+
+import queue
+import threading
+import time
+from itertools import groupby
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import bindparam, insert, update
+
+from models import ExecutionLog, ScheduledJob, SessionLocal, WebhookJob
+from settings import env_float, env_int
+
+LOG_BATCH_SIZE = env_int("SUPAKILN_LOG_BATCH_SIZE", 100)
+
+# How long the writer holds a batch open for more rows after the first
+# one arrives. Without it, steady traffic mostly produced one-row
+# batches: the queue is usually empty again by the time a row is taken.
+LOG_BATCH_LINGER_S = env_float("SUPAKILN_LOG_BATCH_LINGER_MS", 200) / 1000
+
+# A timestamp column update: (model, column name, row id, value).
+_Stamp = Tuple[type, str, int, datetime]
+
+# Items are log rows (dicts) or stamps; None is the stop marker put by
+# close().
+_queue: "queue.Queue[Optional[Union[dict, _Stamp]]]" = queue.Queue()
+_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+
+
+def submit(values: dict) -> None:
+    """Queue one execution_logs row (column name -> value) for writing."""
+    _ensure_started()
+    _queue.put(values)
+
+
+def record_webhook_trigger(webhook_job_id: int, triggered_at: datetime) -> None:
+    """Queue an update of the webhook job's last_triggered."""
+    _ensure_started()
+    _queue.put((WebhookJob, "last_triggered", webhook_job_id, triggered_at))
+
+
+def record_job_run(job_id: int, ran_at: datetime) -> None:
+    """Queue an update of the scheduled job's last_run."""
+    _ensure_started()
+    _queue.put((ScheduledJob, "last_run", job_id, ran_at))
+
+
+def close(timeout: float = 5.0) -> None:
+    """Write out everything queued so far and stop the writer thread."""
+    global _thread
+    with _thread_lock:
+        thread, _thread = _thread, None
+    if thread is not None:
+        _queue.put(None)
+        thread.join(timeout)
+
+
+def _ensure_started() -> None:
+    global _thread
+    if _thread is None:
+        with _thread_lock:
+            if _thread is None:
+                _thread = threading.Thread(
+                    target=_run, name="execution-log-writer", daemon=True
+                )
+                _thread.start()
+
+
+def _run() -> None:
+    while True:
+        item = _queue.get()
+        if item is None:
+            return
+        batch = [item]
+        stop = False
+        deadline = time.monotonic() + LOG_BATCH_LINGER_S
+        while len(batch) < LOG_BATCH_SIZE:
+            try:
+                item = _queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+        _write(batch)
+        if stop:
+            return
+
+
+def _write(batch: List[Union[dict, _Stamp]]) -> None:
+    rows = [item for item in batch if isinstance(item, dict)]
+    # Latest value per row, per (model, column).
+    stamps: Dict[Tuple[type, str], Dict[int, datetime]] = {}
+    for item in batch:
+        if isinstance(item, tuple):
+            model, column, row_id, at = item
+            latest = stamps.setdefault((model, column), {})
+            if row_id not in latest or at > latest[row_id]:
+                latest[row_id] = at
+
+    # An executemany needs the same columns in every row, and callers
+    # fill in different ones (webhook rows carry request/response data),
+    # so insert each shape separately inside the one transaction.
+    def shape(values: dict):
+        return tuple(sorted(values))
+
+    try:
+        with SessionLocal() as db:
+            for _, group in groupby(sorted(rows, key=shape), key=shape):
+                db.execute(insert(ExecutionLog), list(group))
+            for (model, column), latest in stamps.items():
+                # One executemany per table. A WHERE on id skips rows
+                # deleted since (a job removed mid-run), and the savepoint
+                # keeps a failed stamp from taking the log rows with it.
+                table = model.__table__
+                try:
+                    with db.begin_nested():
+                        db.execute(
+                            update(table)
+                            .where(table.c.id == bindparam("b_id"))
+                            .values({column: bindparam("b_at")}),
+                            [{"b_id": row_id, "b_at": at} for row_id, at in latest.items()],
+                        )
+                except Exception as e:
+                    print(f"Failed to update {table.name}.{column}: {e}")
+            db.commit()
+    except Exception as e:
+        print(f"Failed to write {len(rows)} execution log(s): {e}")
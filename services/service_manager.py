@@ -1,234 +1,325 @@
+import asyncio
 import threading
-import subprocess
 import time
-import base64
 from datetime import datetime
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import PersistentService
-from services.docker_client import docker_client
-from code_executor import CodeExecutor
-from env_manager import EnvironmentManager
-import os
-import docker
+from models import PersistentService, SessionLocal
+from services.docker_client import docker_client, exec_output, tar_archive
+from services.code_executor_service import get_code_executor
+from env_manager import get_env_manager
 
 class ServiceManager:
+    """Persistent services, each run as a task on the app's event loop.
+
+    A service is an exec in its container. Instead of one OS thread per
+    service, a task awaits the exec's exit; a single watcher thread
+    follows dockerd's exec_die/die events for every service and wakes
+    the matching task. Blocking work (DB, image builds, Docker calls)
+    goes to worker threads.
+    """
+
     def __init__(self):
         self.running_services = {}  # service_id -> process info
-        self.service_threads = {}  # service_id -> thread
-        
+        self.service_tasks = {}  # service_id -> future of the service's task
+        # Services stop_service is tearing down; their task's _finish
+        # must not overwrite the recorded "stopped" status. The lock
+        # orders the two status writes.
+        self._stopping = set()
+        self._stopping_lock = threading.Lock()
+        self._loop = None
+        # exec id -> (container id, future resolved when the exec may have exited)
+        self._exec_waiters = {}
+        self._watcher_lock = threading.Lock()
+        self._watcher_started = False
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Run service tasks on `loop`; called once at app startup."""
+        self._loop = loop
+
     def start_service(self, service_id: int, db) -> bool:
         """Start a persistent service."""
         try:
-            service = db.query(PersistentService).filter(PersistentService.id == service_id).first()
+            service = db.get(PersistentService, service_id)
             if not service:
                 return False
-                
+
             if service_id in self.running_services:
                 # Already running
                 return True
-                
+
+            if self._loop is None:
+                print(f"Cannot start service {service_id}: no event loop attached")
+                return False
+
+            self._stopping.discard(service_id)
+
             # Update status to starting
             service.status = "starting"
             db.commit()
-            
-            # Start service in background thread
-            thread = threading.Thread(target=self._run_service, args=(service_id, db.bind.url))
-            thread.daemon = True
-            thread.start()
-            
-            self.service_threads[service_id] = thread
+
+            # Start the service as a task on the app loop. Callers are on
+            # worker threads (handlers use the threadpool), hence the
+            # thread-safe hand-off.
+            self._ensure_watcher()
+            self.service_tasks[service_id] = asyncio.run_coroutine_threadsafe(
+                self._run_service(service_id), self._loop
+            )
             return True
-            
+
         except Exception as e:
             print(f"Error starting service {service_id}: {e}")
             return False
-    
+
     def stop_service(self, service_id: int, db) -> bool:
         """Stop a persistent service."""
         try:
-            service = db.query(PersistentService).filter(PersistentService.id == service_id).first()
+            service = db.get(PersistentService, service_id)
             if not service:
                 return False
-                
-            # Update status
-            service.status = "stopped"
-            service.process_id = None
-            db.commit()
-            
+
+            with self._stopping_lock:
+                self._stopping.add(service_id)
+
+                # Update status
+                service.status = "stopped"
+                service.process_id = None
+                db.commit()
+
+            # Cancel the task waiting on it before killing the process,
+            # so the exec_die wake-up does not reach _finish.
+            task = self.service_tasks.pop(service_id, None)
+            if task is not None:
+                task.cancel()
+
             # Stop the running process
             if service_id in self.running_services:
                 process_info = self.running_services[service_id]
                 container_id = process_info.get('container_id')
-                exec_id = process_info.get('exec_id')
-                
-                if container_id and exec_id:
+                script_path = process_info.get('script_path')
+
+                if container_id and script_path:
                     try:
-                        # Kill the exec process
-                        subprocess.run([
-                            "docker", "exec", container_id, "pkill", "-f", f"exec-{exec_id}"
-                        ], capture_output=True, env=os.environ.copy())
+                        # Kill the exec process by the script it runs, over
+                        # the shared client rather than a docker CLI fork.
+                        exec_output(container_id, ["pkill", "-f", script_path])
                     except Exception as e:
                         print(f"Error killing process in container: {e}")
-                
-                del self.running_services[service_id]
-            
-            # Remove thread
-            if service_id in self.service_threads:
-                del self.service_threads[service_id]
-                
+
+                self.running_services.pop(service_id, None)
+
             return True
-            
+
         except Exception as e:
             print(f"Error stopping service {service_id}: {e}")
             return False
-    
+
     def restart_service(self, service_id: int, db) -> bool:
         """Restart a persistent service."""
         self.stop_service(service_id, db)
         time.sleep(1)  # Brief pause
         return self.start_service(service_id, db)
-    
-    def _run_service(self, service_id: int, db_url: str):
-        """Run a service in the background (called from thread)."""
-        # Create new database session for this thread
-        engine = create_engine(str(db_url))
-        ThreadSessionLocal = sessionmaker(bind=engine)
-        db = ThreadSessionLocal()
-        
+
+    async def _run_service(self, service_id: int):
+        """Run a service until its process exits (a task on the app loop)."""
+        # Own session for this task, from the shared engine's pool. Only
+        # one worker thread uses it at a time.
+        db = SessionLocal()
+
         try:
-            service = db.query(PersistentService).filter(PersistentService.id == service_id).first()
-            if not service:
+            launched = await asyncio.to_thread(self._launch, service_id, db)
+            if launched is None:
                 return
-                
-            # Get or create container
-            container_id = service.container_id
-            executor = CodeExecutor()
-            
-            if not container_id or container_id not in executor.containers.values():
-                # Create container with packages
-                packages = []
-                if service.packages and service.packages.strip():
-                    packages = [pkg.strip() for pkg in service.packages.split(',') if pkg.strip()]
-                
-                package_hash = executor._get_package_hash(packages)
-                image_tag = executor._build_image(packages)
-                
-                if package_hash not in executor.containers:
-                    # Get network mode from environment variable (defaults to 'none' for security)
-                    container_network_mode = os.environ.get('CONTAINER_NETWORK_MODE', 'none')
-                    
-                    container = docker_client.containers.run(
-                        image_tag,
-                        detach=True,
-                        tty=True,
-                        labels={"managed-by": "supakiln"},
-                        mem_limit="512m",
-                        cpu_period=100000,
-                        cpu_quota=50000,
-                        user="1000:1000",
-                        network_mode=container_network_mode,  # Configurable network mode
-                        cap_drop=["ALL"],  # Remove all capabilities
-                        pids_limit=100  # Limit number of processes (keep reasonable limit)
-                    )
-                    executor.containers[package_hash] = container.id
-                
-                container_id = executor.containers[package_hash]
-                service.container_id = container_id
-            
-            # Get environment variables scoped to the service's owner
-            # (legacy rows without an owner fall back to the system user).
-            from models import SessionLocal, SYSTEM_USER_ID
-            owner_user_id = service.owner_user_id or SYSTEM_USER_ID
-            env_db = SessionLocal()
-            try:
-                # Try to load existing key
-                if os.path.exists('.env_key'):
-                    with open('.env_key', 'rb') as key_file:
-                        key = key_file.read()
-                else:
-                    key = None
-                env_manager = EnvironmentManager(env_db, key)
-                env_vars = env_manager.get_all_variables(owner_user_id=owner_user_id)
-            finally:
-                env_db.close()
-            
-            # Prepare the code
-            encoded_code = base64.b64encode(service.code.encode()).decode()
-            
-            # Update service status
-            service.status = "running"
-            service.started_at = datetime.utcnow()
-            db.commit()
-            
-            # Execute the service (no timeout - runs indefinitely)
-            container = docker_client.containers.get(container_id)
-            result = container.exec_run(
-                f"python -c 'import base64; exec(base64.b64decode(\"{encoded_code}\").decode())'",
-                environment=env_vars,
-                detach=True
-            )
-            
-            # Store process info
-            self.running_services[service_id] = {
-                'container_id': container_id,
-                'exec_id': result.id,
-                'started_at': datetime.utcnow()
-            }
-            
-            service.process_id = result.id
-            db.commit()
-            
+            container_id, exec_id = launched
+
             # Wait for the process to complete (or run indefinitely)
+            exit_code = None
             try:
-                # This will block until the process exits
-                exit_code = result.exit_code
-                if exit_code is None:
-                    # Process is still running, we need to wait
-                    # For now, we'll just monitor it
-                    while service_id in self.running_services:
-                        time.sleep(5)  # Check every 5 seconds
-                        # Check if container is still running
-                        try:
-                            container.reload()
-                            if container.status != 'running':
-                                break
-                        except Exception:
-                            break
-                            
+                exit_code = await self._wait_exec(container_id, exec_id)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 print(f"Service {service_id} execution error: {e}")
-                
+
             # Service stopped or errored
-            if service_id in self.running_services:
-                del self.running_services[service_id]
-                
+            self.running_services.pop(service_id, None)
+
+            if await asyncio.to_thread(self._finish, service_id, db, exit_code):
+                await asyncio.sleep(5)  # Brief pause before restart
+                await asyncio.to_thread(self.start_service, service_id, db)
+
+        except asyncio.CancelledError:
+            # stop_service cancelled us and has already recorded the
+            # service's status.
+            raise
+        except Exception as e:
+            print(f"Error running service {service_id}: {e}")
+            # Update service status to error
+            await asyncio.to_thread(self._mark_error, service_id, db)
+        finally:
+            db.close()
+
+    def _launch(self, service_id: int, db):
+        """Start the service's process; returns (container_id, exec_id)."""
+        service = db.get(PersistentService, service_id)
+        if not service:
+            return None
+
+        # Get or create container
+        container_id = service.container_id
+        executor = get_code_executor()
+
+        if not container_id or container_id not in executor.containers_by_id:
+            # Create container with packages
+            packages = []
+            if service.packages and service.packages.strip():
+                packages = [pkg.strip() for pkg in service.packages.split(',') if pkg.strip()]
+
+            container_id, _ = executor.package_container(packages)
+            service.container_id = container_id
+
+        # Get environment variables scoped to the service's owner
+        # (legacy rows without an owner fall back to the system user).
+        from models import SYSTEM_USER_ID
+        owner_user_id = service.owner_user_id or SYSTEM_USER_ID
+        env_vars = get_env_manager().get_all_variables(owner_user_id=owner_user_id)
+
+        # Drop the code into /tmp with one put_archive call and run it
+        # as a plain script: no base64 round trip, no shell quoting.
+        script_path = f"/tmp/service_{service_id}.py"
+        docker_client.api.put_archive(
+            container_id,
+            "/tmp",
+            tar_archive({f"service_{service_id}.py": service.code.encode()}),
+        )
+
+        # Update service status
+        service.status = "running"
+        service.started_at = datetime.utcnow()
+        db.commit()
+
+        # Execute the service (no timeout - runs indefinitely)
+        exec_id, _ = exec_output(
+            container_id,
+            ["python", script_path],
+            detach=True,
+            environment=env_vars,
+        )
+
+        # Store process info
+        self.running_services[service_id] = {
+            'container_id': container_id,
+            'exec_id': exec_id,
+            'script_path': script_path,
+            'started_at': datetime.utcnow()
+        }
+
+        service.process_id = exec_id
+        db.commit()
+        return container_id, exec_id
+
+    def _finish(self, service_id: int, db, exit_code) -> bool:
+        """Record how the service ended; True if it should be restarted."""
+        with self._stopping_lock:
+            if service_id in self._stopping:
+                # stop_service got here first (the cancel can lose the
+                # race with a wake-up already past _wait_exec).
+                return False
+            service = db.get(PersistentService, service_id)
+            if not service:
+                return False
+
             # Update service status
             service.status = "stopped" if exit_code == 0 else "error"
             service.process_id = None
             db.commit()
-            
+
             # Handle restart policy
             if service.restart_policy == "always" and service.is_active:
                 print(f"Restarting service {service_id} due to restart policy")
                 service.last_restart = datetime.utcnow()
                 db.commit()
-                time.sleep(5)  # Brief pause before restart
-                self.start_service(service_id, db)
-                
-        except Exception as e:
-            print(f"Error running service {service_id}: {e}")
-            # Update service status to error
-            try:
-                service = db.query(PersistentService).filter(PersistentService.id == service_id).first()
-                if service:
-                    service.status = "error"
-                    service.process_id = None
-                    db.commit()
-            except Exception:
-                pass
+                return True
+            return False
+
+    def _mark_error(self, service_id: int, db) -> None:
+        try:
+            db.rollback()
+            service = db.get(PersistentService, service_id)
+            if service:
+                service.status = "error"
+                service.process_id = None
+                db.commit()
+        except Exception:
+            pass
+
+    async def _wait_exec(self, container_id: str, exec_id: str):
+        """Wait for `exec_id` to exit and return its exit code.
+
+        A wake-up only means the exec may have exited (its event, its
+        container's die, or a reconnect of the event stream), so the
+        state is re-checked each time. Checking after registering also
+        catches an exit whose event came before the waiter existed.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                future = loop.create_future()
+                self._exec_waiters[exec_id] = (container_id, future)
+                state = await asyncio.to_thread(docker_client.api.exec_inspect, exec_id)
+                if not state.get("Running"):
+                    return state.get("ExitCode")
+                await future
         finally:
-            db.close()
+            self._exec_waiters.pop(exec_id, None)
+
+    def _ensure_watcher(self) -> None:
+        if self._watcher_started:
+            return
+        with self._watcher_lock:
+            if not self._watcher_started:
+                threading.Thread(
+                    target=self._watch_exec_events, name="service-exec-events", daemon=True
+                ).start()
+                self._watcher_started = True
+
+    def _wake(self, exec_ids) -> None:
+        """Resolve the waiters for `exec_ids` on their loop (from any thread)."""
+        for exec_id in exec_ids:
+            waiter = self._exec_waiters.get(exec_id)
+            if waiter is not None:
+                future = waiter[1]
+                future.get_loop().call_soon_threadsafe(
+                    lambda f=future: f.done() or f.set_result(None)
+                )
+
+    def _watch_exec_events(self) -> None:
+        """Follow exec_die/die events and wake the services they end."""
+        backoff = 1
+        while True:
+            try:
+                events = docker_client.events(
+                    decode=True,
+                    filters={"type": "container", "event": ["exec_die", "die"]},
+                )
+                backoff = 1
+                # Anything that exited while the stream was down was
+                # missed; let those waiters re-check their exec.
+                self._wake(list(self._exec_waiters))
+                for event in events:
+                    if event.get("Action") == "die":
+                        container_id = event.get("id") or event.get("Actor", {}).get("ID")
+                        self._wake([
+                            exec_id
+                            for exec_id, (cid, _) in list(self._exec_waiters.items())
+                            if cid == container_id
+                        ])
+                    else:
+                        exec_id = event.get("Actor", {}).get("Attributes", {}).get("execID")
+                        if exec_id:
+                            self._wake([exec_id])
+            except Exception as e:
+                print(f"Service exec event stream interrupted: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
 
 # Global service manager instance
-service_manager = ServiceManager() 
\ No newline at end of file
+service_manager = ServiceManager()
@@ -0,0 +1,144 @@
+"""Cached webhook endpoint -> job lookups for `execute_webhook`.
+
+Every inbound webhook call used to query webhook_jobs by endpoint before
+any user code ran, although the rows only change when someone edits a
+webhook. Resolved jobs are kept here, most recently used last, as
+immutable snapshots of the columns the execution path reads, along with
+the program to run, so a Python job is wrapped once rather than per call.
+
+Endpoints with no active job are remembered too, in a separate map so
+a scan of random webhook paths can't push real jobs out of the first.
+
+Create/update/delete in routers/webhooks.py call `invalidate()`; the TTL
+bounds how long a change made through another worker process goes
+unseen. Only touched from the event loop, so no lock is needed.
+"""
+
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import WebhookJob
+from settings import env_float
+
+WEBHOOK_CACHE_TTL = env_float("SUPAKILN_WEBHOOK_CACHE_TTL", 60.0)
+WEBHOOK_CACHE_MAX = 512
+WEBHOOK_MISS_CACHE_MAX = 1024
+
+# The Python webhook wrapper around the (indented) user code. The request
+# data arrives as JSON on the program's stdin. `base64` stays imported
+# because existing webhook code may rely on the wrapper's globals.
+_PY_WRAPPER_HEAD = (
+    "import json\n"
+    "import sys\n"
+    "import base64\n"
+    "from datetime import datetime\n"
+    "\n"
+    "request_data = json.load(sys.stdin)\n"
+    'response_data = {"message": "Webhook executed successfully", '
+    '"timestamp": datetime.now().isoformat()}\n'
+    "\n"
+    "try:\n"
+)
+_PY_WRAPPER_TAIL = (
+    "\n"
+    "except Exception as e:\n"
+    '    response_data = {"error": str(e), "timestamp": datetime.now().isoformat()}\n'
+    '    print(f"Error in webhook code: {e}", file=sys.stderr)\n'
+    "\n"
+    "print(json.dumps(response_data))\n"
+)
+
+
+class WebhookTarget(NamedTuple):
+    """What running a webhook needs from its job row."""
+
+    id: int
+    code: str
+    # What the worker runs: `code` wrapped for Python, as-is otherwise
+    # (non-Python code reads the request and prints its JSON response
+    # itself).
+    program: str
+    packages: Tuple[str, ...]
+    language: str
+    timeout: int
+    owner_user_id: Optional[int]
+
+
+_COLUMNS = (
+    WebhookJob.id,
+    WebhookJob.code,
+    WebhookJob.packages,
+    WebhookJob.language,
+    WebhookJob.timeout,
+    WebhookJob.owner_user_id,
+)
+
+_cache: "OrderedDict[str, Tuple[float, WebhookTarget]]" = OrderedDict()
+# endpoint -> when it was found to have no active job
+_misses: "OrderedDict[str, float]" = OrderedDict()
+# Bumped on every invalidation so a lookup that raced with a write
+# doesn't put the pre-write row back.
+_generation = 0
+
+
+def invalidate() -> None:
+    """Forget every cached endpoint (a write may have renamed one)."""
+    global _generation
+    _generation += 1
+    _cache.clear()
+    _misses.clear()
+
+
+async def lookup(db: AsyncSession, endpoint: str) -> Optional[WebhookTarget]:
+    """The active job serving `endpoint`, or None."""
+    cached = _cache.get(endpoint)
+    if cached is not None and time.monotonic() - cached[0] < WEBHOOK_CACHE_TTL:
+        _cache.move_to_end(endpoint)
+        return cached[1]
+    missed_at = _misses.get(endpoint)
+    if missed_at is not None and time.monotonic() - missed_at < WEBHOOK_CACHE_TTL:
+        return None
+
+    generation = _generation
+    row = (await db.execute(
+        select(*_COLUMNS).where(
+            WebhookJob.endpoint == endpoint,
+            WebhookJob.is_active == 1,
+        )
+    )).first()
+    if row is None:
+        if generation == _generation:
+            _misses[endpoint] = time.monotonic()
+            _misses.move_to_end(endpoint)
+            while len(_misses) > WEBHOOK_MISS_CACHE_MAX:
+                _misses.popitem(last=False)
+        return None
+
+    job_id, code, packages, language, timeout, owner_user_id = row
+    # Backfill to python for rows predating the `language` column.
+    language = language or "python"
+    if language == "python":
+        program = _PY_WRAPPER_HEAD + "    " + code.replace("\n", "\n    ") + _PY_WRAPPER_TAIL
+    else:
+        program = code
+    target = WebhookTarget(
+        id=job_id,
+        code=code,
+        program=program,
+        packages=tuple(
+            pkg.strip() for pkg in (packages or "").split(",") if pkg.strip()
+        ),
+        language=language,
+        timeout=timeout,
+        owner_user_id=owner_user_id,
+    )
+    if generation == _generation:
+        _cache[endpoint] = (time.monotonic(), target)
+        _cache.move_to_end(endpoint)
+        while len(_cache) > WEBHOOK_CACHE_MAX:
+            _cache.popitem(last=False)
+    return target
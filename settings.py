@@ -0,0 +1,21 @@
+"""Numeric SUPAKILN_* settings read from the environment.
+
+A malformed value falls back to the default instead of failing the
+import of whichever module reads it.
+"""
+
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
@@ -0,0 +1,123 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import cors
+from cors import PrecomputedCORSMiddleware
+
+ALLOWED = "https://app.example.com"
+
+
+def _homepage(request):
+    return PlainTextResponse("ok", headers={"x-app": "1"})
+
+
+@pytest.fixture
+def middleware():
+    app = Starlette(routes=[Route("/", _homepage, methods=["GET", "POST"])])
+    return PrecomputedCORSMiddleware(
+        app,
+        allow_origins=[ALLOWED],
+        allow_origin_regex=r"http://localhost:\d+",
+        max_age=300,
+    )
+
+
+@pytest.fixture
+def client(middleware):
+    return TestClient(middleware)
+
+
+def _preflight(client, origin, headers=None):
+    return client.options("/", headers={
+        "Origin": origin,
+        "Access-Control-Request-Method": "POST",
+        **(headers or {}),
+    })
+
+
+def test_allowed_preflight(client):
+    response = _preflight(client, ALLOWED, {"Access-Control-Request-Headers": "x-token"})
+    assert response.status_code == 204
+    assert response.headers["access-control-allow-origin"] == ALLOWED
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["access-control-allow-headers"] == "x-token"
+    assert response.headers["access-control-max-age"] == "300"
+    assert "POST" in response.headers["access-control-allow-methods"]
+    assert response.headers["vary"] == "Origin"
+    assert response.content == b""
+
+
+def test_disallowed_preflight(client):
+    response = _preflight(client, "https://evil.example.com")
+    assert response.status_code == 400
+    assert response.text == "Disallowed CORS origin"
+    assert "access-control-allow-origin" not in response.headers
+
+
+def test_simple_request_echoes_origin(client):
+    response = client.get("/", headers={"Origin": ALLOWED})
+    assert response.status_code == 200
+    assert response.text == "ok"
+    assert response.headers["x-app"] == "1"
+    # Credentialed requests can't use "*": the origin itself goes back.
+    assert response.headers["access-control-allow-origin"] == ALLOWED
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert response.headers["vary"] == "Origin"
+
+
+def test_disallowed_origin_gets_no_cors_headers(client):
+    response = client.get("/", headers={"Origin": "https://evil.example.com"})
+    assert response.status_code == 200
+    assert "access-control-allow-origin" not in response.headers
+
+
+def test_request_without_origin_passes_through(client):
+    response = client.get("/")
+    assert response.text == "ok"
+    assert "access-control-allow-origin" not in response.headers
+    assert "vary" not in response.headers
+
+
+def test_options_without_request_method_reaches_app(client):
+    # Not a preflight: the app answers (here, 405 for an unrouted method).
+    response = client.options("/", headers={"Origin": ALLOWED})
+    assert response.status_code == 405
+    assert response.headers["access-control-allow-origin"] == ALLOWED
+
+
+def test_regex_origin(client):
+    assert _preflight(client, "http://localhost:5173").status_code == 204
+    response = client.get("/", headers={"Origin": "http://localhost:3000"})
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+    # fullmatch: a prefix match is not enough.
+    assert _preflight(client, "http://localhost:3000.evil.com").status_code == 400
+
+
+def test_regex_verdicts_cached(middleware, client, monkeypatch):
+    client.get("/", headers={"Origin": "http://localhost:3000"})
+    client.get("/", headers={"Origin": "https://evil.example.com"})
+    assert middleware._regex_verdicts == {
+        b"http://localhost:3000": True,
+        b"https://evil.example.com": False,
+    }
+
+    class _NoRegex:
+        def fullmatch(self, origin):
+            raise AssertionError("cached origin re-matched")
+
+    monkeypatch.setattr(middleware, "allow_origin_regex", _NoRegex())
+    assert middleware.is_allowed_origin(b"http://localhost:3000")
+    assert not middleware.is_allowed_origin(b"https://evil.example.com")
+    # Listed origins never touch the regex or the cache.
+    assert middleware.is_allowed_origin(ALLOWED.encode())
+    assert ALLOWED.encode() not in middleware._regex_verdicts
+
+
+def test_regex_verdict_cache_bounded(middleware, monkeypatch):
+    monkeypatch.setattr(cors, "ORIGIN_CACHE_MAX", 2)
+    for port in (1, 2, 3):
+        middleware.is_allowed_origin(b"http://localhost:%d" % port)
+    assert list(middleware._regex_verdicts) == [b"http://localhost:3"]
@@ -0,0 +1,125 @@
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from cryptography.fernet import Fernet
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import env_manager
+from env_manager import EnvironmentManager
+from models import Base
+
+ALICE, BOB = 2, 3
+
+
+@pytest.fixture(autouse=True)
+def session_factory(monkeypatch):
+    """Point the manager at a throwaway in-memory database, shared
+    across threads so get_all_variables_async's worker sees it too."""
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(env_manager, "SessionLocal", sessionmaker(bind=engine))
+    env_manager._variables_cache.clear()
+    yield
+    env_manager._variables_cache.clear()
+    engine.dispose()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(env_manager, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def manager():
+    return EnvironmentManager(encryption_key=Fernet.generate_key())
+
+
+def test_owners_see_only_their_variables(manager):
+    manager.set_variable("SECRET_KEY", "alice-secret", owner_user_id=ALICE)
+    manager.set_variable("SECRET_KEY", "bob-secret", owner_user_id=BOB)
+    manager.set_variable("ONLY_BOB", "1", owner_user_id=BOB)
+
+    assert manager.get_all_variables(ALICE) == {"SECRET_KEY": "alice-secret"}
+    assert manager.get_all_variables(BOB) == {"SECRET_KEY": "bob-secret", "ONLY_BOB": "1"}
+    # And again from the cache.
+    assert manager.cached_variables(ALICE) == {"SECRET_KEY": "alice-secret"}
+    assert manager.get_all_variables(BOB) == {"SECRET_KEY": "bob-secret", "ONLY_BOB": "1"}
+
+
+def test_set_and_delete_invalidate_only_the_owner(manager):
+    manager.set_variable("A", "1", owner_user_id=ALICE)
+    manager.set_variable("B", "1", owner_user_id=BOB)
+    manager.get_all_variables(ALICE)
+    manager.get_all_variables(BOB)
+
+    manager.set_variable("A", "2", owner_user_id=ALICE)
+    assert manager.cached_variables(ALICE) is None
+    assert manager.cached_variables(BOB) == {"B": "1"}
+    assert manager.get_all_variables(ALICE) == {"A": "2"}
+
+    assert manager.delete_variable("A", owner_user_id=ALICE)
+    assert manager.cached_variables(ALICE) is None
+    assert manager.get_all_variables(ALICE) == {}
+
+
+def test_callers_get_copies(manager):
+    manager.set_variable("A", "1", owner_user_id=ALICE)
+    manager.get_all_variables(ALICE)["A"] = "changed"
+    manager.cached_variables(ALICE)["B"] = "added"
+    manager.get_all_variables(ALICE).clear()
+    assert manager.get_all_variables(ALICE) == {"A": "1"}
+
+
+def test_entries_expire_after_ttl(manager, clock):
+    manager.set_variable("A", "1", owner_user_id=ALICE)
+    manager.get_all_variables(ALICE)
+    clock.value += env_manager.ENV_CACHE_TTL - 1
+    assert manager.cached_variables(ALICE) == {"A": "1"}
+    clock.value += 2
+    assert manager.cached_variables(ALICE) is None
+
+
+def test_owners_beyond_the_cap_evicted(manager, monkeypatch):
+    monkeypatch.setattr(env_manager, "ENV_CACHE_MAX_USERS", 2)
+    for owner in (ALICE, BOB, 4):
+        manager.get_all_variables(owner)
+    assert list(env_manager._variables_cache) == [BOB, 4]
+
+
+def test_write_during_read_not_cached():
+    """A read that raced a set/delete must not store its stale values."""
+
+    class RacingManager(EnvironmentManager):
+        @contextmanager
+        def _session(self):
+            with super()._session() as db:
+                yield db
+            env_manager._invalidate_variables(BOB)
+
+    manager = RacingManager(encryption_key=Fernet.generate_key())
+    manager.set_variable("A", "1", owner_user_id=ALICE)
+    assert manager.get_all_variables(ALICE) == {"A": "1"}
+    assert manager.cached_variables(ALICE) is None
+
+
+def test_get_all_variables_async(manager, monkeypatch):
+    manager.set_variable("A", "1", owner_user_id=ALICE)
+    assert asyncio.run(manager.get_all_variables_async(ALICE)) == {"A": "1"}
+
+    # A hit is answered without leaving the loop.
+    async def no_thread(*args):
+        raise AssertionError("cache hit went to a thread")
+
+    monkeypatch.setattr(env_manager.asyncio, "to_thread", no_thread)
+    variables = asyncio.run(manager.get_all_variables_async(ALICE))
+    assert variables == {"A": "1"}
+    variables["A"] = "changed"
+    assert manager.cached_variables(ALICE) == {"A": "1"}
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, ExecutionLog, ScheduledJob, WebhookJob
+from services import log_writer
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    """Point the log writer at a throwaway in-memory database."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(log_writer, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def _log(job_id=None, webhook_job_id=None):
+    return dict(
+        job_id=job_id,
+        webhook_job_id=webhook_job_id,
+        owner_user_id=1,
+        code="print(1)",
+        execution_time=0.1,
+        started_at=datetime.utcnow(),
+        status="success",
+    )
+
+
+def test_stamp_for_missing_row_keeps_logs(session_factory):
+    """A job deleted mid-run must not cost the batch its log rows."""
+    at = datetime.utcnow()
+    log_writer._write([
+        (WebhookJob, "last_triggered", 999, at),
+        (ScheduledJob, "last_run", 998, at),
+        _log(webhook_job_id=999),
+        _log(job_id=998),
+    ])
+
+    with session_factory() as db:
+        assert len(db.execute(select(ExecutionLog)).all()) == 2
+
+
+def test_stamps_keep_latest_time(session_factory):
+    with session_factory() as db:
+        db.add(WebhookJob(id=1, name="hook", endpoint="/hook", code="pass"))
+        db.commit()
+
+    early, late = datetime(2024, 1, 1), datetime(2024, 1, 2)
+    log_writer._write([
+        (WebhookJob, "last_triggered", 1, late),
+        (WebhookJob, "last_triggered", 1, early),
+        _log(webhook_job_id=1),
+    ])
+
+    with session_factory() as db:
+        assert db.get(WebhookJob, 1).last_triggered == late
+        assert len(db.execute(select(ExecutionLog)).all()) == 1
@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from auth import current_user
+from database import get_async_db
+from models import Base, ExecutionLog, User
+from routers import logs
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+OWNER, OTHER = 1, 2
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """A throwaway SQLite file: sync for setup, async for the router."""
+    url = f"sqlite:///{tmp_path / 'logs.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def user():
+    return User(id=OWNER, email="owner@example.com", is_admin=0)
+
+
+@pytest.fixture
+def client(session_factory, tmp_path, user):
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'logs.db'}", poolclass=NullPool
+    )
+
+    async def _db():
+        async with AsyncSession(async_engine) as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(logs.router)
+    app.dependency_overrides[get_async_db] = _db
+    app.dependency_overrides[current_user] = lambda: user
+    with TestClient(app) as client:
+        yield client
+
+
+def _add_logs(session_factory, *started_offsets, owner=OWNER):
+    """One log per offset (seconds after T0); returns their ids."""
+    with session_factory() as db:
+        rows = [
+            ExecutionLog(
+                owner_user_id=owner,
+                code=f"print({i})",
+                output=f"{i}\n",
+                execution_time=0.1,
+                started_at=T0 + timedelta(seconds=offset),
+                status="success",
+            )
+            for i, offset in enumerate(started_offsets)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+
+
+def _ids(response):
+    assert response.status_code == 200, response.text
+    return [row["id"] for row in response.json()]
+
+
+def test_after_id_pages_newest_first(client, session_factory):
+    ids = _add_logs(session_factory, 0, 1, 2, 3, 4)
+    first = _ids(client.get("/logs", params={"limit": 2}))
+    assert first == [ids[4], ids[3]]
+    second = _ids(client.get("/logs", params={"limit": 2, "after_id": first[-1]}))
+    assert second == [ids[2], ids[1]]
+    third = _ids(client.get("/logs", params={"limit": 2, "after_id": second[-1]}))
+    assert third == [ids[0]]
+
+
+def test_after_id_with_after_started_at(client, session_factory):
+    ids = _add_logs(session_factory, 0, 1, 2)
+    page = _ids(client.get("/logs", params={
+        "after_id": ids[2],
+        "after_started_at": (T0 + timedelta(seconds=2)).isoformat(),
+    }))
+    assert page == [ids[1], ids[0]]
+
+
+def test_ties_on_started_at_broken_by_id(client, session_factory):
+    ids = _add_logs(session_factory, 0, 5, 5, 5, 9)
+    seen = []
+    after_id = None
+    while True:
+        params = {"limit": 2}
+        if after_id is not None:
+            params["after_id"] = after_id
+        page = _ids(client.get("/logs", params=params))
+        seen += page
+        if len(page) < 2:
+            break
+        after_id = page[-1]
+    assert seen == [ids[4], ids[3], ids[2], ids[1], ids[0]]
+
+
+def test_unknown_after_id_is_404(client, session_factory):
+    ids = _add_logs(session_factory, 0, 1)
+    assert client.get("/logs", params={"after_id": 999}).status_code == 404
+
+    with session_factory() as db:
+        db.execute(delete(ExecutionLog).where(ExecutionLog.id == ids[1]))
+        db.commit()
+    assert client.get("/logs", params={"after_id": ids[1]}).status_code == 404
+    # With its started_at the deleted cursor still pages on.
+    page = _ids(client.get("/logs", params={
+        "after_id": ids[1],
+        "after_started_at": (T0 + timedelta(seconds=1)).isoformat(),
+    }))
+    assert page == [ids[0]]
+
+
+def test_other_owners_cursor_is_404(client, session_factory):
+    (theirs,) = _add_logs(session_factory, 5, owner=OTHER)
+    _add_logs(session_factory, 0)
+    assert client.get("/logs", params={"after_id": theirs}).status_code == 404
+
+
+def test_listing_scoped_to_owner(client, session_factory):
+    mine = _add_logs(session_factory, 0)
+    _add_logs(session_factory, 1, owner=OTHER)
+    assert _ids(client.get("/logs")) == mine
+
+
+def test_include_bodies_false_returns_nulls(client, session_factory):
+    _add_logs(session_factory, 0)
+    (full,) = client.get("/logs").json()
+    assert full["code"] == "print(0)" and full["output"] == "0\n"
+    (summary,) = client.get("/logs", params={"include_bodies": "false"}).json()
+    for field in ("code", "output", "error", "request_data", "response_data"):
+        assert summary[field] is None
+    assert summary["status"] == "success"
+    assert summary["id"] == full["id"]
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+import migrate_database
+
+
+@pytest.fixture
+def v13_db(tmp_path, monkeypatch):
+    """A version-13 database file where migrate_database() looks for it."""
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect("code_executor.db")
+    cursor = conn.cursor()
+    migrate_database.create_complete_schema(cursor)
+    # Back out what v14 and v15 added.
+    for index in (
+        "idx_persistent_services_owner_name",
+        "idx_webhook_jobs_owner",
+        "idx_persistent_services_owner",
+    ):
+        cursor.execute(f"DROP INDEX {index}")
+    cursor.execute("UPDATE schema_info SET value = '13' WHERE key = 'version'")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _add_service(conn, name, owner):
+    cursor = conn.execute(
+        "INSERT INTO persistent_services (name, code, owner_user_id) VALUES (?, 'pass', ?)",
+        (name, owner),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def _indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_upgrade_from_v13_renames_duplicate_service_names(v13_db):
+    first = _add_service(v13_db, "api", 1)
+    second = _add_service(v13_db, "api", 1)
+    third = _add_service(v13_db, "api", 1)
+    other_owner = _add_service(v13_db, "api", 2)
+    unowned = [_add_service(v13_db, "legacy", None) for _ in range(2)]
+    assert "idx_persistent_services_owner_name" not in _indexes(v13_db)
+
+    migrate_database.migrate_database()
+
+    names = dict(v13_db.execute("SELECT id, name FROM persistent_services"))
+    assert names == {
+        first: "api",
+        second: f"api ({second})",
+        third: f"api ({third})",
+        other_owner: "api",
+        unowned[0]: "legacy",
+        unowned[1]: f"legacy ({unowned[1]})",
+    }
+    version = v13_db.execute("SELECT value FROM schema_info WHERE key = 'version'").fetchone()
+    assert version == (str(migrate_database.SCHEMA_VERSION),)
+
+
+def test_upgrade_from_v13_adds_indexes(v13_db):
+    _add_service(v13_db, "api", 1)
+
+    migrate_database.migrate_database()
+
+    assert {
+        "idx_persistent_services_owner_name",
+        "idx_webhook_jobs_owner",
+        "idx_persistent_services_owner",
+    } <= _indexes(v13_db)
+    with pytest.raises(sqlite3.IntegrityError):
+        _add_service(v13_db, "api", 1)
+    # Unique per owner, not globally.
+    _add_service(v13_db, "api", 2)
+
+
+def test_fresh_schema_matches_upgraded_indexes(tmp_path, monkeypatch, v13_db):
+    migrate_database.migrate_database()
+    upgraded = _indexes(v13_db)
+
+    fresh_dir = tmp_path / "fresh"
+    fresh_dir.mkdir()
+    monkeypatch.chdir(fresh_dir)
+    migrate_database.migrate_database()
+    with sqlite3.connect("code_executor.db") as fresh:
+        assert _indexes(fresh) == upgraded
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from models import Base, WebhookJob
+from services import webhook_cache
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """A clean cache and a clock the tests move by hand."""
+    webhook_cache.invalidate()
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(webhook_cache, "time", SimpleNamespace(monotonic=lambda: now.value))
+    yield now
+    webhook_cache.invalidate()
+
+
+def _with_db(body):
+    """Run `body(db)` against a throwaway in-memory database."""
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as db:
+                await body(db)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def _add(db, endpoint, code="pass", **columns):
+    job = WebhookJob(name=endpoint, endpoint=endpoint, code=code, **columns)
+    db.add(job)
+    await db.commit()
+    return job.id
+
+
+async def _set_code(db, endpoint, code):
+    await db.execute(update(WebhookJob).where(WebhookJob.endpoint == endpoint).values(code=code))
+    await db.commit()
+
+
+def test_hit_served_until_invalidated():
+    async def body(db):
+        await _add(db, "/a", code="old", packages="requests, numpy,")
+        target = await webhook_cache.lookup(db, "/a")
+        assert target.code == "old"
+        assert target.packages == ("requests", "numpy")
+        assert target.language == "python"
+
+        await _set_code(db, "/a", "new")
+        assert (await webhook_cache.lookup(db, "/a")).code == "old"
+        webhook_cache.invalidate()
+        assert (await webhook_cache.lookup(db, "/a")).code == "new"
+
+    _with_db(body)
+
+
+def test_entries_expire_after_ttl(clock):
+    async def body(db):
+        await _add(db, "/a", code="old")
+        await webhook_cache.lookup(db, "/a")
+        await _set_code(db, "/a", "new")
+
+        clock.value += webhook_cache.WEBHOOK_CACHE_TTL - 1
+        assert (await webhook_cache.lookup(db, "/a")).code == "old"
+        clock.value += 2
+        assert (await webhook_cache.lookup(db, "/a")).code == "new"
+
+    _with_db(body)
+
+
+def test_least_recently_used_evicted(monkeypatch):
+    monkeypatch.setattr(webhook_cache, "WEBHOOK_CACHE_MAX", 2)
+
+    async def body(db):
+        for endpoint in ("/a", "/b", "/c"):
+            await _add(db, endpoint)
+        await webhook_cache.lookup(db, "/a")
+        await webhook_cache.lookup(db, "/b")
+        await webhook_cache.lookup(db, "/a")
+        await webhook_cache.lookup(db, "/c")
+        assert list(webhook_cache._cache) == ["/a", "/c"]
+
+    _with_db(body)
+
+
+def test_misses_remembered_separately(monkeypatch, clock):
+    monkeypatch.setattr(webhook_cache, "WEBHOOK_MISS_CACHE_MAX", 2)
+
+    async def body(db):
+        await _add(db, "/live")
+        await _add(db, "/off", is_active=0)
+        await webhook_cache.lookup(db, "/live")
+        for endpoint in ("/off", "/x", "/y"):
+            assert await webhook_cache.lookup(db, endpoint) is None
+        # Misses evict each other, never a real job.
+        assert list(webhook_cache._misses) == ["/x", "/y"]
+        assert list(webhook_cache._cache) == ["/live"]
+
+        # A job created behind the cache's back shows after the TTL.
+        await _add(db, "/y")
+        assert await webhook_cache.lookup(db, "/y") is None
+        clock.value += webhook_cache.WEBHOOK_CACHE_TTL + 1
+        assert (await webhook_cache.lookup(db, "/y")) is not None
+
+    _with_db(body)
+
+
+def test_write_during_lookup_not_cached():
+    """A lookup that raced an invalidation must not store its stale row."""
+    async def body(db):
+        await _add(db, "/a")
+        execute = db.execute
+
+        async def racing_execute(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            webhook_cache.invalidate()
+            return result
+
+        db.execute = racing_execute
+        assert await webhook_cache.lookup(db, "/a") is not None
+        assert await webhook_cache.lookup(db, "/missing") is None
+        assert not webhook_cache._cache
+        assert not webhook_cache._misses
+
+    _with_db(body)
+
+
+def test_python_program_wraps_code():
+    async def body(db):
+        await _add(db, "/py", code='x = request_data["x"]\nresponse_data = {"double": x * 2}')
+        await _add(db, "/js", code="console.log('{}')", language="javascript")
+
+        js = await webhook_cache.lookup(db, "/js")
+        assert js.program == js.code
+
+        py = await webhook_cache.lookup(db, "/py")
+        assert py.program.startswith(webhook_cache._PY_WRAPPER_HEAD)
+        assert py.program.endswith(webhook_cache._PY_WRAPPER_TAIL)
+        out = subprocess.run(
+            [sys.executable, "-c", py.program],
+            input=json.dumps({"x": 21}),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        assert json.loads(out) == {"double": 42}
+
+    _with_db(body)
+
+
+def test_python_wrapper_reports_errors():
+    async def body(db):
+        await _add(db, "/py", code="raise ValueError('bad input')")
+        program = (await webhook_cache.lookup(db, "/py")).program
+        proc = subprocess.run(
+            [sys.executable, "-c", program],
+            input="{}",
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert json.loads(proc.stdout)["error"] == "bad input"
+        assert "Error in webhook code: bad input" in proc.stderr
+
+    _with_db(body)
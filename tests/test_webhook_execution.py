@@ -0,0 +1,68 @@
+import math
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from routers import webhook_execution
+from routers.webhook_execution import _last_json_object, _read_body
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(webhook_execution, "MAX_WEBHOOK_BODY", 16)
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"length": len(await _read_body(request))}
+
+    return TestClient(app)
+
+
+def _chunks(*parts):
+    # A generator body goes out chunked, with no Content-Length.
+    yield from parts
+
+
+def test_body_under_the_cap(client):
+    assert client.post("/echo", content=b"x" * 16).json() == {"length": 16}
+    assert client.post("/echo", content=_chunks(b"x" * 8, b"x" * 8)).json() == {"length": 16}
+
+
+def test_declared_length_over_the_cap_is_413(client):
+    response = client.post("/echo", content=b"x" * 17)
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body exceeds 16 bytes"}
+
+
+def test_chunked_body_over_the_cap_is_413(client):
+    response = client.post("/echo", content=_chunks(b"x" * 10, b"x" * 10))
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Request body exceeds 16 bytes"}
+
+
+@pytest.mark.parametrize("output, expected", [
+    ('starting\n{"ok": true}\n', {"ok": True}),
+    ('{"ok": true}', {"ok": True}),
+    ('{"first": 1}\n{"last": 2}\n', {"last": 2}),
+    # The response need not be the last line.
+    ('{"ok": true}\ntrailing log line\n\n', {"ok": True}),
+    # A line that only looks like an object is skipped.
+    ('{"ok": true}\n{not json}\n', {"ok": True}),
+    ('{"ok": true}\n[1, 2]\n', {"ok": True}),
+    ('log\r\n{"ok": true}\r\nmore\r\n', {"ok": True}),
+    ("  {\"ok\": true}  \n", {"ok": True}),
+    ("no json here\n", None),
+    ("", None),
+    ("\n\n", None),
+])
+def test_last_json_object(output, expected):
+    assert _last_json_object(output) == expected
+
+
+def test_last_json_object_nan_falls_back_to_json():
+    # orjson rejects NaN/Infinity; Python's json.dumps writes them.
+    value = _last_json_object('{"x": NaN, "y": Infinity}\n')
+    assert math.isnan(value["x"])
+    assert value["y"] == math.inf
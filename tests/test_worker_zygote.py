@@ -0,0 +1,141 @@
+import os
+import sys
+
+import pytest
+
+from workers import worker
+
+
+@pytest.fixture(scope="module")
+def zygote():
+    z = worker._PythonZygote()
+    yield z
+    z._close()
+
+
+def _program(tmp_path, source, name="prog.py"):
+    path = tmp_path / name
+    path.write_text(source)
+    return str(path)
+
+
+def _run(zygote, path, timeout_s=10.0, in_fd=None):
+    result = zygote.run(path, dict(os.environ), timeout_s, in_fd)
+    assert result is not None
+    return result
+
+
+def test_stdout_and_stderr(zygote, tmp_path):
+    path = _program(tmp_path, "import sys\nprint('out')\nprint('err', file=sys.stderr)\n")
+    result = _run(zygote, path)
+    assert result["exit_code"] == 0
+    assert result["stdout"] == "out\n"
+    assert result["stderr"] == "err\n"
+    assert not result["timed_out"] and not result["truncated"]
+
+
+def test_stdin(zygote, tmp_path):
+    path = _program(tmp_path, "import sys\nprint(sys.stdin.read().upper())\n")
+    in_fd = worker._stdin_fd("hello")
+    try:
+        result = _run(zygote, path, in_fd=in_fd)
+    finally:
+        os.close(in_fd)
+    assert result["stdout"] == "HELLO\n"
+
+
+def test_no_stdin_reads_empty(zygote, tmp_path):
+    path = _program(tmp_path, "import sys\nprint(repr(sys.stdin.read()))\n")
+    assert _run(zygote, path)["stdout"] == "''\n"
+
+
+@pytest.mark.parametrize("source, exit_code, stderr", [
+    ("raise SystemExit\n", 0, ""),
+    ("raise SystemExit(3)\n", 3, ""),
+    ("import sys\nsys.exit('bye')\n", 1, "bye\n"),
+])
+def test_system_exit(zygote, tmp_path, source, exit_code, stderr):
+    result = _run(zygote, _program(tmp_path, source))
+    assert result["exit_code"] == exit_code
+    assert result["stderr"] == stderr
+
+
+def test_syntax_error(zygote, tmp_path):
+    path = _program(tmp_path, "def broken(:\n")
+    result = _run(zygote, path)
+    assert result["exit_code"] == 1
+    assert "SyntaxError" in result["stderr"]
+    assert path in result["stderr"]
+
+
+def test_timeout_kills_the_run(zygote, tmp_path):
+    path = _program(tmp_path, "import time\nprint('start', flush=True)\ntime.sleep(60)\n")
+    result = _run(zygote, path, timeout_s=0.5)
+    assert result["timed_out"]
+    assert result["exit_code"] == -1
+    assert result["stdout"] == "start\n"
+    assert "timed out" in result["stderr"]
+
+
+def test_output_cap_sets_truncated(zygote, tmp_path, monkeypatch):
+    monkeypatch.setattr(worker, "MAX_OUTPUT_BYTES", 100)
+    path = _program(tmp_path, "print('x' * 1000)\n")
+    result = _run(zygote, path)
+    assert result["truncated"]
+    assert result["stdout"].startswith("x" * 100 + "\n--- Output truncated at 100 bytes")
+
+
+def test_cached_code_reports_new_filename(zygote, tmp_path):
+    """A repeat of the same source runs from the cache under its own name."""
+    source = "def fail():\n    raise ValueError('boom')\nfail()\n"
+    first = _program(tmp_path, source, "first.py")
+    second = _program(tmp_path, source, "second.py")
+    assert first in _run(zygote, first)["stderr"]
+    stderr = _run(zygote, second)["stderr"]
+    assert second in stderr
+    assert first not in stderr
+    assert "ValueError: boom" in stderr
+
+
+def test_with_filename_rewrites_nested_code():
+    code = compile("def f():\n    return lambda: 1\n", "old.py", "exec")
+    renamed = worker._with_filename(code, "new.py")
+    func = next(c for c in renamed.co_consts if hasattr(c, "co_filename"))
+    inner = next(c for c in func.co_consts if hasattr(c, "co_filename"))
+    assert renamed.co_filename == func.co_filename == inner.co_filename == "new.py"
+
+
+def test_python_env_falls_back_to_popen(monkeypatch):
+    class _NoZygote:
+        pid = None
+
+        def run(self, *args):
+            raise AssertionError("PYTHON* env must not use the zygote")
+
+    monkeypatch.setattr(worker, "_zygote", _NoZygote())
+    # Outside a container this would kill every process of our uid and
+    # empty /tmp.
+    monkeypatch.setattr(worker, "_reap_leftover_state", lambda *a, **k: None)
+    monkeypatch.setattr(worker, "RUN_CMD_TEMPLATE", f"{sys.executable} {{file}}")
+    result = worker._run_code(
+        "import os\nprint(os.environ['PYTHONIOENCODING'])\n",
+        {"PYTHONIOENCODING": "latin-1"},
+        10000,
+    )
+    assert result["exit_code"] == 0
+    assert result["stdout"] == "latin-1\n"
+
+
+def test_preload_imports_only_stdlib(monkeypatch):
+    tried = set()
+    monkeypatch.setattr(worker, "_zygote_preload_tried", tried)
+    code = compile(
+        "import colorsys\nimport this\nimport not_a_real_module\n"
+        "def f():\n    import xml.dom.minidom\n",
+        "prog.py",
+        "exec",
+    )
+    worker._preload_imports(code)
+    assert tried == {"colorsys", "xml.dom.minidom"}
+    assert "colorsys" in sys.modules
+    assert "not_a_real_module" not in sys.modules
@@ -19,6 +19,9 @@ The worker is language-agnostic: it is configured per-image via env vars.
   SUPAKILN_WORKER_TOKEN  required bearer secret; caller must send it as
                          `X-Supakiln-Token`. Blocks sibling containers
                          (no auth previously → cross-worker RCE).
+  SUPAKILN_WARM_PYTHON   "0" disables the warm Python zygote (see below);
+                         only consulted when SUPAKILN_RUN_CMD is
+                         "python3 {file}".
 
 Wire contract:
   GET  /health  -> 200 {"status": "ok", "cooked": bool,
@@ -28,9 +31,13 @@ Wire contract:
                   pressure crosses SUPAKILN_COOKED_THRESHOLD_PCT (90 by
                   default) — the backend reaper uses this to evict
                   containers that are one fork away from wedging.
-  POST /exec    -> body: {"code": str, "env": {str: str}, "timeout_ms": int}
+  POST /exec    -> body: {"code": str, "env": {str: str}, "timeout_ms": int,
+                        "stdin": str (optional, fed to the program's stdin)}
                   headers: X-Supakiln-Token: <secret>
-                  resp: {"exit_code": int, "stdout": str, "stderr": str, "timed_out": bool}
+                  resp: {"exit_code": int, "stdout": str, "stderr": str, "timed_out": bool,
+                         "truncated": bool}
+                  stdout+stderr are capped at SUPAKILN_MAX_OUTPUT_BYTES
+                  (1 MiB); `truncated` says the cap was hit.
                   503  -> {"error": str, "cooked": true} when the container
                           is exhausted (e.g. pid-bomb hit --pids-limit, so
                           Popen fails with EAGAIN before we can spawn).
@@ -39,19 +46,34 @@ Wire contract:
 
 from __future__ import annotations
 
+import atexit
+import builtins
+import dis
 import errno
+import hashlib
 import hmac
 import json
 import os
+import selectors
 import shlex
 import signal
+import socket
 import subprocess
+import sys
 import tempfile
+import threading
+import time
+import traceback
+import types
+from collections import OrderedDict
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 
 DEFAULT_PORT = 9999
 MAX_BODY_BYTES = 10 * 1024 * 1024  # 10 MiB guard against runaway payloads
+# stdout+stderr kept per /exec; the rest is read and dropped so a program
+# printing without bound can't balloon the worker (or the API) memory.
+MAX_OUTPUT_BYTES = int(os.environ.get("SUPAKILN_MAX_OUTPUT_BYTES", str(1 << 20)))
 
 RUN_CMD_TEMPLATE = os.environ.get("SUPAKILN_RUN_CMD", "python3 {file}")
 FILE_EXT = os.environ.get("SUPAKILN_FILE_EXT", ".py")
@@ -145,7 +167,9 @@ def _is_cooked(pressure: dict) -> bool:
     return False
 
 
-def _reap_leftover_state(own_pid: int, own_script_path: str | None) -> None:
+def _reap_leftover_state(
+    own_pid: int, own_script_path: str | None, spare_pids: tuple = ()
+) -> None:
     """Kill straggler processes and wipe scratch dirs between /exec calls.
 
     Runs in the worker's finally after every execution — successful,
@@ -153,7 +177,8 @@ def _reap_leftover_state(own_pid: int, own_script_path: str | None) -> None:
     inside its container (or very close to it). Everything else owned
     by this uid is user code that may have forked, backgrounded, or
     otherwise outlived the request. Kill it so state never leaks into
-    the next call.
+    the next call. `spare_pids` are our own helpers (the warm Python
+    zygote) and are left alone.
 
     Scratch wipe also bounds tmpfs usage: a misbehaving run can't fill
     /tmp permanently because the next call clears it.
@@ -164,7 +189,7 @@ def _reap_leftover_state(own_pid: int, own_script_path: str | None) -> None:
             if not entry.isdigit():
                 continue
             pid = int(entry)
-            if pid == own_pid:
+            if pid == own_pid or pid in spare_pids:
                 continue
             try:
                 with open(f"/proc/{pid}/status", "r") as f:
@@ -222,9 +247,491 @@ class WorkerCookedError(Exception):
         self.origin = origin
 
 
-def _run_code(code: str, env: dict, timeout_ms: int) -> dict:
+# --- Warm Python zygote -----------------------------------------------------
+#
+# Spawning `python3 {file}` per /exec pays full interpreter start-up
+# (tens of ms, more with site-packages) on every call. When this image
+# runs Python, a long-lived zygote interpreter forks per call instead:
+#
+#   worker --(SOCK_SEQPACKET: JSON {file, env} + stdout/stderr/status[/stdin] fds)--> zygote
+#   zygote  --fork--> supervisor --fork--> runner (setsid, exec()s the file)
+#
+# The supervisor writes "P <pid>" once the runner exists and "X <code>"
+# when it exits ("E <errno>" if a fork failed), so the worker can killpg
+# the runner's session on timeout exactly like the Popen path. The zygote
+# never waits on anything itself, so concurrent calls don't queue.
+# It also compiles the program before forking and keeps recent code
+# objects, so a program run again (a webhook's wrapped code, a scheduled
+# job) is not re-parsed in every runner, and imports the standard-library
+# modules the program imports, so later runners inherit them loaded.
+# Requests the zygote can't serve the same way (PYTHON* overrides, a dead
+# zygote, oversized env) fall back to Popen.
+
+_RUN_ARGV = shlex.split(RUN_CMD_TEMPLATE)
+WARM_PYTHON = (
+    os.environ.get("SUPAKILN_WARM_PYTHON", "1") != "0"
+    and len(_RUN_ARGV) == 2
+    and _RUN_ARGV[0] in ("python", "python3")
+    and _RUN_ARGV[1] == "{file}"
+)
+# Largest request message the zygote accepts (code travels as a file path,
+# so this only bounds the env dict).
+_ZYGOTE_MAX_MSG = 1024 * 1024
+# Compiled programs the zygote keeps, by source digest. Larger sources
+# are compiled by the runner each time rather than held in memory.
+_ZYGOTE_CODE_CACHE_MAX = 64
+_ZYGOTE_CODE_CACHE_MAX_SOURCE = 256 * 1024
+_zygote_code_cache: OrderedDict[bytes, types.CodeType] = OrderedDict()
+# Only the standard library is preloaded: third-party packages may start
+# threads or open connections at import, which a fork would not carry
+# over. These few have visible side effects at import time.
+_ZYGOTE_PRELOAD_SKIP = frozenset({
+    "__hello__", "__phello__", "antigravity", "idlelib", "this", "tkinter", "turtle",
+})
+_zygote_preload_tried: set[str] = set()
+
+
+def _user_exit_status(exc: SystemExit) -> int:
+    """Map SystemExit the way the interpreter does at shutdown."""
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _with_filename(code: types.CodeType, path: str) -> types.CodeType:
+    """`code` with every nested code object reporting `path` as its file."""
+    consts = tuple(
+        _with_filename(c, path) if isinstance(c, types.CodeType) else c
+        for c in code.co_consts
+    )
+    return code.replace(co_filename=path, co_consts=consts)
+
+
+def _compile_cached(path: str) -> types.CodeType | None:
+    """Compile `path` in the zygote, reusing the code object for a repeat.
+
+    None leaves compiling to the runner: the file is unreadable or too
+    large to keep, or it doesn't compile, in which case the runner
+    reports the error just as `python3 file` would.
+    """
+    try:
+        with open(path, "rb") as f:
+            source = f.read(_ZYGOTE_CODE_CACHE_MAX_SOURCE + 1)
+    except OSError:
+        return None
+    if len(source) > _ZYGOTE_CODE_CACHE_MAX_SOURCE:
+        return None
+    key = hashlib.sha256(source).digest()
+    code = _zygote_code_cache.get(key)
+    if code is not None:
+        _zygote_code_cache.move_to_end(key)
+        # Temp file names differ per call; tracebacks should show this one.
+        return _with_filename(code, path)
+    try:
+        code = compile(source, path, "exec")
+    except Exception:
+        return None
+    _preload_imports(code)
+    _zygote_code_cache[key] = code
+    while len(_zygote_code_cache) > _ZYGOTE_CODE_CACHE_MAX:
+        _zygote_code_cache.popitem(last=False)
+    return code
+
+
+def _imported_modules(code: types.CodeType):
+    """Yield the module names `code` (and any nested code) imports."""
+    for instr in dis.get_instructions(code):
+        if instr.opname == "IMPORT_NAME":
+            yield instr.argval
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield from _imported_modules(const)
+
+
+def _preload_imports(code: types.CodeType) -> None:
+    """Import, in the zygote, the stdlib modules `code` imports.
+
+    Each name is tried once; a failure is left for the runner to hit.
+    """
+    stdlib = getattr(sys, "stdlib_module_names", frozenset())
+    for name in _imported_modules(code):
+        top = name.partition(".")[0]
+        if name in _zygote_preload_tried or top not in stdlib or top in _ZYGOTE_PRELOAD_SKIP:
+            continue
+        _zygote_preload_tried.add(name)
+        try:
+            __import__(name)
+        except Exception:
+            pass
+
+
+def _run_as_main(path: str, code: types.CodeType | None = None) -> int:
+    """exec() `path` (or its precompiled `code`) as __main__; return the exit status."""
+    main = types.ModuleType("__main__")
+    main.__file__ = path
+    main.__builtins__ = builtins
+    sys.modules["__main__"] = main
+    try:
+        if code is None:
+            with open(path, "rb") as f:
+                source = f.read()
+            code = compile(source, path, "exec")
+        exec(code, main.__dict__)
+        status = 0
+    except SystemExit as e:
+        status = _user_exit_status(e)
+    except BaseException as e:
+        # Drop this frame so the traceback reads like `python3 file`'s.
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    # Interpreter shutdown: join non-daemon threads, then atexit hooks.
+    for t in threading.enumerate():
+        if t is not threading.main_thread() and not t.daemon:
+            t.join()
+    atexit._run_exitfuncs()
+    return status
+
+
+def _zygote_runner(
+    path: str,
+    code: types.CodeType | None,
+    env: dict,
+    out_fd: int,
+    err_fd: int,
+    in_fd: int | None,
+) -> None:
+    """Become the user's program: new session, fresh fds/env, then run."""
+    status = 1
+    try:
+        os.setsid()
+        if in_fd is None:
+            in_fd = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(in_fd, 0)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+        os.chdir("/tmp")
+        os.environ.clear()
+        os.environ.update(env)
+        # Fresh stdio objects, as a pipe-started interpreter would have.
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, errors="backslashreplace", closefd=False)
+        sys.argv = [path]
+        sys.path[0] = os.path.dirname(path)
+        status = _run_as_main(path, code)
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(status)
+
+
+def _zygote_supervise(
+    request: dict,
+    code: types.CodeType | None,
+    out_fd: int,
+    err_fd: int,
+    status_fd: int,
+    in_fd: int | None,
+) -> None:
+    """Fork the runner, report its pid, wait, report its exit code."""
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        try:
+            pid = os.fork()
+        except OSError as e:
+            os.write(status_fd, f"E {e.errno}\n".encode())
+            return
+        if pid == 0:
+            _zygote_runner(request["file"], code, request["env"], out_fd, err_fd, in_fd)
+        os.close(out_fd)
+        os.close(err_fd)
+        if in_fd is not None:
+            os.close(in_fd)
+        os.write(status_fd, f"P {pid}\n".encode())
+        _, wait_status = os.waitpid(pid, 0)
+        os.write(status_fd, f"X {os.waitstatus_to_exitcode(wait_status)}\n".encode())
+    finally:
+        os._exit(0)
+
+
+def _zygote_main(fd: int) -> None:
+    """Zygote loop: one fork per request until the worker hangs up."""
+    sock = socket.socket(fileno=fd)
+    # Supervisors exit on their own; let the kernel reap them.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        msg, fds, flags, _ = socket.recv_fds(sock, _ZYGOTE_MAX_MSG, 4)
+        if not msg and not fds:
+            return
+        if flags & socket.MSG_TRUNC or len(fds) not in (3, 4):
+            # Closing the fds gives the worker EOF with no status.
+            for f in fds:
+                os.close(f)
+            continue
+        out_fd, err_fd, status_fd = fds[:3]
+        in_fd = fds[3] if len(fds) == 4 else None
+        request = json.loads(msg)
+        code = _compile_cached(request["file"])
+        try:
+            pid = os.fork()
+        except OSError as e:
+            os.write(status_fd, f"E {e.errno}\n".encode())
+            pid = -1
+        if pid == 0:
+            sock.close()
+            _zygote_supervise(request, code, out_fd, err_fd, status_fd, in_fd)
+        for f in fds:
+            os.close(f)
+
+
+def _kill_session(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # Runner hasn't reached setsid() yet (or is already gone).
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    except PermissionError:
+        pass
+
+
+class _PythonZygote:
+    """Worker-side handle on the zygote process; respawns it if it dies."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._proc: subprocess.Popen | None = None
+        self._sock: socket.socket | None = None
+
+    @property
+    def pid(self) -> int | None:
+        return self._proc.pid if self._proc is not None else None
+
+    def ensure_started(self) -> socket.socket:
+        """Return the control socket, (re)spawning the zygote if needed."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._close()
+                parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+                env = os.environ.copy()
+                env.pop("SUPAKILN_WORKER_TOKEN", None)
+                try:
+                    self._proc = subprocess.Popen(
+                        [sys.executable, os.path.abspath(__file__),
+                         "--zygote", str(child.fileno())],
+                        pass_fds=[child.fileno()],
+                        stdin=subprocess.DEVNULL,
+                        env=env,
+                        cwd="/tmp",
+                    )
+                except OSError:
+                    parent.close()
+                    raise
+                finally:
+                    child.close()
+                self._sock = parent
+            return self._sock
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=1.0)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            self._proc = None
+
+    def run(self, path: str, env: dict, timeout_s: float, in_fd: int | None = None) -> dict | None:
+        """Run `path` in a forked interpreter; None means use Popen instead.
+
+        `in_fd`, if given, becomes the program's stdin; the caller keeps
+        ownership of it.
+
+        Raises WorkerCookedError when a fork fails for lack of resources.
+        """
+        payload = json.dumps({"file": path, "env": env}).encode("utf-8")
+        if len(payload) > _ZYGOTE_MAX_MSG:
+            return None
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        status_r, status_w = os.pipe()
+        try:
+            try:
+                sock = self.ensure_started()
+                fds = [out_w, err_w, status_w]
+                if in_fd is not None:
+                    fds.append(in_fd)
+                socket.send_fds(sock, [payload], fds)
+            except OSError:
+                with self._lock:
+                    self._close()
+                for f in (out_r, err_r, status_r):
+                    os.close(f)
+                return None
+        finally:
+            for f in (out_w, err_w, status_w):
+                os.close(f)
+        return _collect_forked(out_r, err_r, status_r, timeout_s)
+
+
+def _collect_forked(out_r: int, err_r: int, status_r: int, timeout_s: float) -> dict:
+    """Drain a zygote run's pipes under the deadline; mirrors the Popen path."""
+    status_buf = bytearray()
+
+    def _status() -> dict:
+        fields = {}
+        for line in status_buf.decode().splitlines():
+            kind, _, value = line.partition(" ")
+            fields[kind] = int(value)
+        return fields
+
+    def _on_timeout() -> None:
+        pid = _status().get("P")
+        if pid is not None:
+            _kill_session(pid)
+
+    try:
+        stdout, stderr, timed_out, truncated = _drain_output(
+            out_r, err_r, timeout_s, _on_timeout, extra=(status_r, status_buf)
+        )
+    finally:
+        status = _status()
+        # Same as the Popen path: the session may hold daemons the
+        # program left behind.
+        if "P" in status:
+            _kill_session(status["P"])
+        for f in (out_r, err_r, status_r):
+            os.close(f)
+
+    if "E" in status:
+        err = status["E"]
+        if err in _COOKED_ERRNOS:
+            raise WorkerCookedError(
+                f"fork failed (errno={err} {os.strerror(err)})", origin="popen"
+            )
+        raise OSError(err, os.strerror(err))
+    return _exec_result(status.get("X", -1), stdout, stderr, timed_out, truncated, timeout_s)
+
+
+def _drain_output(
+    out_fd: int,
+    err_fd: int,
+    timeout_s: float,
+    on_timeout,
+    extra: tuple | None = None,
+) -> tuple:
+    """Read a run's stdout/stderr until EOF or the deadline.
+
+    Keeps at most MAX_OUTPUT_BYTES of stdout+stderr combined; past that,
+    output is still read (so the program never blocks on a full pipe)
+    but dropped. At the deadline `on_timeout()` kills the run and the
+    pipes get two more seconds to drain. `extra` is an optional
+    (fd, bytearray) read alongside, uncapped. Returns
+    (stdout, stderr, timed_out, truncated).
+    """
+    stdout, stderr = bytearray(), bytearray()
+    bufs = {out_fd: stdout, err_fd: stderr}
+    if extra is not None:
+        bufs[extra[0]] = extra[1]
+    sel = selectors.DefaultSelector()
+    for f in bufs:
+        sel.register(f, selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout_s
+    timed_out = False
+    truncated = False
+    try:
+        while sel.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                if timed_out:
+                    # Drain grace is over; something still holds a pipe.
+                    break
+                timed_out = True
+                on_timeout()
+                deadline = time.monotonic() + 2.0
+                continue
+            for key, _ in sel.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    sel.unregister(key.fd)
+                    continue
+                buf = bufs[key.fd]
+                if buf is stdout or buf is stderr:
+                    room = MAX_OUTPUT_BYTES - len(stdout) - len(stderr)
+                    if len(chunk) > room:
+                        truncated = True
+                        chunk = chunk[:max(room, 0)]
+                buf += chunk
+    finally:
+        sel.close()
+    return bytes(stdout), bytes(stderr), timed_out, truncated
+
+
+def _exec_result(
+    exit_code: int,
+    stdout: bytes,
+    stderr: bytes,
+    timed_out: bool,
+    truncated: bool,
+    timeout_s: float,
+) -> dict:
+    """Build the /exec response body, decoding each stream once."""
+    out = stdout.decode("utf-8", "replace")
+    err = stderr.decode("utf-8", "replace")
+    if truncated:
+        out += f"\n--- Output truncated at {MAX_OUTPUT_BYTES} bytes ---"
+    if timed_out:
+        exit_code = -1
+        err += f"\n--- Execution timed out after {timeout_s:.3f}s ---"
+    return {
+        "exit_code": exit_code,
+        "stdout": out,
+        "stderr": err,
+        "timed_out": timed_out,
+        "truncated": truncated,
+    }
+
+
+_zygote: _PythonZygote | None = _PythonZygote() if WARM_PYTHON else None
+
+
+def _stdin_fd(data: str) -> int:
+    """A read fd positioned at the start of `data`, for a program's stdin.
+
+    Backed by an unlinked file on /tmp rather than a pipe, so a payload
+    larger than the pipe buffer needs no writer thread feeding it.
+    """
+    try:
+        with tempfile.TemporaryFile(dir="/tmp") as f:
+            f.write(data.encode("utf-8"))
+            f.seek(0)
+            return os.dup(f.fileno())
+    except OSError as e:
+        if e.errno in _COOKED_ERRNOS:
+            raise WorkerCookedError(
+                f"stdin write failed (errno={e.errno} {os.strerror(e.errno)})",
+                origin="tempfile",
+            ) from e
+        raise
+
+
+def _run_code(code: str, env: dict, timeout_ms: int, stdin: str | None = None) -> dict:
     """Write code to a temp file and exec it via RUN_CMD_TEMPLATE.
 
+    `stdin`, if given, is what the program reads on its standard input.
     Raises WorkerCookedError if the container is resource-exhausted.
     """
     # Re-ensure runtime cache dirs exist. They're created at worker
@@ -261,7 +768,18 @@ def _run_code(code: str, env: dict, timeout_ms: int) -> dict:
     proc_env.update({str(k): str(v) for k, v in (env or {}).items()})
 
     proc: subprocess.Popen | None = None
+    in_fd: int | None = None
     try:
+        if stdin is not None:
+            in_fd = _stdin_fd(stdin)
+        # Warm path: fork from the zygote instead of starting an
+        # interpreter. PYTHON* variables only take effect at interpreter
+        # start-up, so callers setting any get a fresh process.
+        if _zygote is not None and not any(str(k).startswith("PYTHON") for k in (env or {})):
+            result = _zygote.run(fname, proc_env, timeout_s, in_fd)
+            if result is not None:
+                return result
+
         # start_new_session makes the child the leader of a new process
         # group. On timeout / normal exit we kill the whole group via
         # killpg, which catches `cmd &` background subprocesses that
@@ -269,6 +787,7 @@ def _run_code(code: str, env: dict, timeout_ms: int) -> dict:
         try:
             proc = subprocess.Popen(
                 _build_command(fname),
+                stdin=in_fd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 env=proc_env,
@@ -285,32 +804,31 @@ def _run_code(code: str, env: dict, timeout_ms: int) -> dict:
                     origin="popen",
                 ) from e
             raise
-        try:
-            stdout, stderr = proc.communicate(timeout=timeout_s)
-            return {
-                "exit_code": proc.returncode,
-                "stdout": (stdout or b"").decode("utf-8", "replace"),
-                "stderr": (stderr or b"").decode("utf-8", "replace"),
-                "timed_out": False,
-            }
-        except subprocess.TimeoutExpired:
+
+        def _kill_group() -> None:
             try:
                 os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
             except (ProcessLookupError, PermissionError):
                 pass
-            # Drain whatever the child emitted before we killed it.
+
+        started = time.monotonic()
+        stdout, stderr, timed_out, truncated = _drain_output(
+            proc.stdout.fileno(), proc.stderr.fileno(), timeout_s, _kill_group
+        )
+        if not timed_out:
+            # Output closed; the program itself may still be running.
             try:
-                stdout, stderr = proc.communicate(timeout=2.0)
+                proc.wait(timeout=max(0.001, timeout_s - (time.monotonic() - started)))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                _kill_group()
+        if timed_out:
+            try:
+                proc.wait(timeout=2.0)
             except subprocess.TimeoutExpired:
                 proc.kill()
-                stdout, stderr = proc.communicate()
-            return {
-                "exit_code": -1,
-                "stdout": (stdout or b"").decode("utf-8", "replace"),
-                "stderr": (stderr or b"").decode("utf-8", "replace")
-                         + f"\n--- Execution timed out after {timeout_s:.3f}s ---",
-                "timed_out": True,
-            }
+                proc.wait()
+        return _exec_result(proc.returncode, stdout, stderr, timed_out, truncated, timeout_s)
     finally:
         # Make sure the process group is gone even on success; user code
         # may have forked daemons that we need to reap.
@@ -319,6 +837,11 @@ def _run_code(code: str, env: dict, timeout_ms: int) -> dict:
                 os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
             except (ProcessLookupError, PermissionError):
                 pass
+            for stream in (proc.stdout, proc.stderr):
+                if stream is not None:
+                    stream.close()
+        if in_fd is not None:
+            os.close(in_fd)
         if fname is not None:
             try:
                 os.remove(fname)
@@ -326,7 +849,11 @@ def _run_code(code: str, env: dict, timeout_ms: int) -> dict:
                 pass
         # Final scrub: kill lingering uid-1000 processes the user may
         # have nohup'd outside the process group, and wipe scratch dirs.
-        _reap_leftover_state(own_pid=os.getpid(), own_script_path=None)
+        _reap_leftover_state(
+            own_pid=os.getpid(),
+            own_script_path=None,
+            spare_pids=(_zygote.pid,) if _zygote is not None else (),
+        )
 
 
 class Handler(BaseHTTPRequestHandler):
@@ -395,10 +922,14 @@ class Handler(BaseHTTPRequestHandler):
         if not isinstance(env, dict):
             self._json(400, {"error": "`env` must be an object"})
             return
+        stdin = req.get("stdin")
+        if stdin is not None and not isinstance(stdin, str):
+            self._json(400, {"error": "`stdin` must be a string"})
+            return
         timeout_ms = int(req.get("timeout_ms", 30000))
 
         try:
-            result = _run_code(code, env, timeout_ms)
+            result = _run_code(code, env, timeout_ms, stdin)
         except WorkerCookedError as e:
             # Don't even try to recover — cooked containers cannot
             # reliably fork. Tell the backend explicitly so it evicts
@@ -456,6 +987,12 @@ def _ensure_runtime_dirs() -> None:
 
 def main() -> None:
     _ensure_runtime_dirs()
+    if _zygote is not None:
+        # Pay the zygote's start-up now rather than on the first /exec.
+        try:
+            _zygote.ensure_started()
+        except OSError as e:
+            print(f"[supakiln-worker] warm python disabled for now: {e}", flush=True)
     port = int(os.environ.get("SUPAKILN_WORKER_PORT", DEFAULT_PORT))
     bind = os.environ.get("SUPAKILN_WORKER_BIND", "0.0.0.0")
     server = ThreadingHTTPServer((bind, port), Handler)
@@ -467,4 +1004,7 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) == 3 and sys.argv[1] == "--zygote":
+        _zygote_main(int(sys.argv[2]))
+    else:
+        main()